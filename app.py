@@ -1,6 +1,11 @@
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, render_template, request, jsonify, session, Response, stream_with_context
 import os
 import sys
+import concurrent.futures
+import contextvars
+import json
+import queue
+import threading
 import groq
 import dotenv
 import time
@@ -10,7 +15,8 @@ import uuid
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
 # Now import from src directory
-import search_query, cse, utils, summarize_page_content
+import search_query, cse, utils, summarize_page_content, pipeline, http_client, jobs, singleflight, groq_scheduler
+import content_processor, host_health, metrics, knowledge_store, dedup
 
 # Load environment variables
 dotenv.load_dotenv()
@@ -26,7 +32,24 @@ CONFIG = {
     'engine_id': os.getenv("SEARCH_ENGINE_ID"),
     'google_cse_api': os.getenv("GOOGLE_CUSTOM_SEARCH_JSON_API_KEY"),
     'max_results': 5,
-    'num_pages': 3
+    # Summaries per search, and spare candidates fetched alongside them (0 turns hedging off)
+    'results_wanted': 3,
+    'hedge_extra': int(os.getenv("HEDGE_EXTRA", 2)),
+    # Further search hits fetched one at a time when failures or near-duplicates leave the quota short
+    'backfill_limit': int(os.getenv("BACKFILL_LIMIT", 5)),
+    'num_pages': 3,
+    # Worker pools for the fetch -> extract -> summarize pipeline
+    'fetch_workers': int(os.getenv("FETCH_WORKERS", 3)),
+    'extract_workers': int(os.getenv("EXTRACT_WORKERS", 2)),
+    'summarize_workers': int(os.getenv("SUMMARIZE_WORKERS", 2)),
+    'pipeline_queue_size': 8,
+    # 'threads' downloads inside the fetch stage; 'async' starts every download on the aiohttp ingest engine up front
+    'fetch_mode': os.getenv("FETCH_MODE", "threads"),
+    # Background job pool for POST /jobs
+    'job_workers': int(os.getenv("JOB_WORKERS", 2)),
+    'job_queue_size': int(os.getenv("JOB_QUEUE_SIZE", 20)),
+    # Answer from the local library when enough summarized documents were found by essentially the same query
+    'library_answers': bool(int(os.getenv("LIBRARY_ANSWERS", 0)))
 }
 
 # YouTube channels to search for relevant videos
@@ -115,8 +138,230 @@ def search_youtube_videos(query, max_videos=3):
         print(f"❌ YouTube search error: {e}")
         return []
 
-def process_query(user_query):
-    """Enhanced process_query with quota protection"""
+def emit_event(on_event, event, data):
+    """Forward a progress event to an optional listener without letting it break processing"""
+    if on_event is None:
+        return
+    try:
+        on_event(event, data)
+    except Exception as e:
+        print(f"⚠️ Event listener failed on '{event}': {e}")
+
+def remember_document(url, title, content, queries=(), summary=None):
+    """Keep an extracted document (and its summary, once there is one) in the local library"""
+    try:
+        if summary is None:
+            knowledge_store.library.save(url, title, content, *queries[:2])
+        else:
+            knowledge_store.library.save_summary(url, summary, *queries[:2])
+    except Exception as e:
+        print(f"⚠️ Could not store {url[:80]} in the library: {e}")
+
+def summarize_document(content, word_count, queries=()):
+    """Summarize extracted page text, using map-reduce when the content is large
+    
+    queries (original and optimized) steer which passages a direct summary sees.
+    """
+    if word_count > 2000:
+        # Map-reduce over the whole document for large content
+        return summarize_page_content.map_reduce_summarize(content, groq_client)
+    # Direct summarization for smaller content, pre-filtered to the most relevant passages
+    return summarize_page_content.summarize_html_content(content, groq_client, queries=queries)
+
+def process_results(candidates, on_event=None, queries=(), wanted=None, reserve=(), stats=None):
+    """Run (title, link) candidates through the staged fetch/extract/summarize pipeline.
+    
+    Returns the processed result dicts in candidate order, skipping any result
+    whose content could not be fetched or was too short. With `wanted` below
+    the number of candidates (hedged over-fetch), only the first `wanted`
+    documents to qualify are summarized, better-ranked ones preferred, and
+    the remaining fetches are cancelled. Of two documents whose text is
+    mostly the same (see dedup.near_duplicate) only one is summarized: the
+    better-ranked one, unless the other was already being summarized when
+    it qualified. A duplicate does not take a slot; whenever the candidates
+    left cannot fill the quota, the next `reserve` hit is fetched.
+    'document' and 'summary' events are emitted as each item clears those
+    stages. `stats`, if given, receives 'candidates_fetched' and
+    'duplicates_skipped'.
+    """
+    total = len(candidates)
+    wanted = min(wanted or total, total + len(reserve))
+    signatures = {}
+    gate = pipeline.FirstNGate(
+        list(range(1, total + 1)), wanted,
+        conflicts=lambda rank, other: dedup.near_duplicate(signatures.get(rank), signatures.get(other))
+    )
+    
+    # Every download starts now, so the fastest good sources decide the latency
+    fetch_pool = None
+    if CONFIG['fetch_mode'] != 'async':
+        fetch_pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(CONFIG['fetch_workers'], total), thread_name_prefix="fetch"
+        )
+    
+    def start_download(link):
+        if fetch_pool is None:
+            # The engine bounds per-host concurrency itself
+            return content_processor.engine.submit_download(link)
+        return fetch_pool.submit(contextvars.copy_context().run, utils.download_page, link)
+    
+    downloads = {num: start_download(link) for num, (title, link) in enumerate(candidates, start=1)}
+    
+    def candidate_feed():
+        yield from enumerate(candidates, start=1)
+        # Backfill: one more search hit each time the quota can no longer be met without it
+        for num, (title, link) in enumerate(reserve, start=total + 1):
+            if not gate.wait_for_shortfall():
+                return
+            print(f"➕ [{num}] Backfilling with the next search result")
+            gate.add(num)
+            downloads[num] = start_download(link)
+            yield num, (title, link)
+    # Resolves once `wanted` documents are admitted, releasing fetches that are still waiting
+    filled = concurrent.futures.Future()
+    
+    def reporting(stage_func):
+        # Every candidate that drops out must be reported, or better-ranked waiters never learn its fate
+        def run(item):
+            try:
+                value = stage_func(item)
+            except Exception:
+                gate.reject(item[0])
+                raise
+            if value is None:
+                gate.reject(item[0])
+            return value
+        return run
+    
+    def fetch_stage(item):
+        num, (title, link) = item
+        print(f"📥 [{num}/{total}] Fetching: {title}")
+        print(f"   URL: {link}")
+        download = downloads[num]
+        concurrent.futures.wait([download, filled], return_when=concurrent.futures.FIRST_COMPLETED)
+        if not download.done():
+            # Not needed any more; clean up whenever it finishes
+            download.cancel()
+            download.add_done_callback(discard_download)
+            return None
+        if download.cancelled() or download.exception() is not None:
+            return None
+        page = download.result()
+        if not page:
+            print(f"❌ [{num}/{total}] Failed to fetch")
+            return None
+        if gate.done.is_set():
+            utils.discard_page(page)
+            return None
+        return num, title, page
+    
+    def extract_stage(item):
+        num, title, page = item
+        content = utils.extract_page_content(page)
+        if not content or len(content.split()) <= 50:
+            print(f"❌ [{num}/{total}] Content too short or failed to fetch")
+            return None
+        print(f"✅ [{num}/{total}] Content fetched: {len(content.split())} words")
+        remember_document(page['url'], title, content, queries)
+        # Read by the gate's duplicate check, which only runs once this item reaches select
+        signatures[num] = dedup.shingles(content)
+        return num, title, page['url'], content, page.get('cached', False)
+    
+    def select_stage(item):
+        num, title, link, content, cached = item
+        if not gate.admit(num):
+            if num in gate.duplicates:
+                print(f"♊ [{num}/{total}] Near-duplicate of result {gate.duplicates[num]}, skipped")
+            else:
+                print(f"⏭️ [{num}/{total}] Not needed: {wanted} sources already qualified")
+            return None
+        if gate.done.is_set() and not filled.done():
+            filled.set_result(True)
+        emit_event(on_event, 'document', {
+            'index': num,
+            'title': title,
+            'url': link,
+            'word_count': len(content.split()),
+            'cached': cached
+        })
+        return item
+    
+    def drop(item):
+        # Release spooled PDFs of candidates skipped after the gate filled up
+        gate.reject(item[0])
+        if len(item) == 3 and isinstance(item[2], dict):
+            utils.discard_page(item[2])
+        elif item[0] in downloads:
+            downloads[item[0]].add_done_callback(discard_download)
+    
+    def discard_download(future):
+        if not future.cancelled() and future.exception() is None and future.result():
+            utils.discard_page(future.result())
+    
+    def summarize_stage(item):
+        num, title, link, content, cached = item
+        word_count = len(content.split())
+        # Final from here on: a better-ranked copy arriving during the Groq call would otherwise waste it
+        if not gate.commit(num):
+            print(f"♊ [{num}/{total}] Replaced by better-ranked copy {gate.duplicates.get(num)}, not summarized")
+            return None
+        
+        print(f"🔄 [{num}/{total}] Summarizing...")
+        try:
+            with metrics.span('summarize'):
+                summary_result = summarize_document(content, word_count, queries)
+            print(f"✅ [{num}/{total}] Summarization completed")
+        except Exception as summary_error:
+            print(f"⚠️ [{num}/{total}] Summarization failed: {summary_error}")
+            # Keep the result without a summary if summarization fails
+            summary_result = {'error': str(summary_error)}
+        remember_document(link, title, content, queries, summary=summary_result)
+        
+        processed = {
+            'title': title,
+            'url': link,
+            'content': content[:500] + "..." if len(content) > 500 else content,  # Truncate for response
+            'word_count': word_count,
+            'cached': cached,
+            'summary': summary_result
+        }
+        emit_event(on_event, 'summary', {'index': num, 'result': processed})
+        return processed
+    
+    processing_pipeline = pipeline.StagedPipeline([
+        # One waiter per candidate, so pages move on to extraction in the order they arrive
+        pipeline.Stage('fetch', reporting(fetch_stage), total),
+        pipeline.Stage('extract', reporting(extract_stage), CONFIG['extract_workers']),
+        # One worker per candidate: each may wait in the gate for better-ranked ones
+        pipeline.Stage('select', select_stage, total),
+        pipeline.Stage('summarize', summarize_stage, CONFIG['summarize_workers'], cancellable=False),
+    ], queue_size=CONFIG['pipeline_queue_size'])
+    
+    try:
+        outputs = processing_pipeline.run(candidate_feed(), cancel=gate.done, on_drop=drop)
+    finally:
+        if fetch_pool:
+            # Fetches that lost the race finish in the background
+            fetch_pool.shutdown(wait=False, cancel_futures=True)
+    if stats is not None:
+        stats['candidates_fetched'] = len(downloads)
+        stats['duplicates_skipped'] = len(gate.duplicates)
+    return [output for output in outputs if output is not None]
+
+def process_query(user_query, on_event=None):
+    """Enhanced process_query with quota protection
+    
+    on_event, if given, is called as on_event(event, data) as each stage
+    completes: 'query', 'search_results', 'document', 'summary', 'videos'.
+    result['stats']['timings'] breaks the request's time down by stage.
+    """
+    with metrics.track_request() as timings:
+        with metrics.span('request'):
+            result = _process_query(user_query, on_event)
+    result['stats']['timings'] = timings.snapshot()
+    return result
+
+def _process_query(user_query, on_event=None):
     result = {
         'original_query': user_query,
         'status': 'processing',
@@ -127,8 +372,15 @@ def process_query(user_query):
     }
     
     try:
+        # Step 0: Enough strong matches in the library answer the search without Google or Groq
+        if CONFIG['library_answers']:
+            with metrics.span('library_lookup'):
+                local_documents = knowledge_store.library.strong_matches(user_query, CONFIG['results_wanted'])
+            if len(local_documents) >= CONFIG['results_wanted']:
+                return answer_from_library(result, local_documents, on_event)
+        
         # Step 1: Optimize query
-        optimized_query, explanation, search_intent = search_query.build_search_query(
+        optimized_query, explanation, search_intent = search_query.cached_build_search_query(
             user_query, groq_client
         )
         
@@ -137,10 +389,19 @@ def process_query(user_query):
             'explanation': explanation,
             'search_intent': search_intent
         })
+        emit_event(on_event, 'query', {
+            'original_query': user_query,
+            'optimized_query': optimized_query,
+            'explanation': explanation,
+            'search_intent': search_intent
+        })
         
-        # Step 2: Check quota before searching
-        quota_status = cse.get_quota_status()
-        if quota_status['remaining'] < 1:
+        # Step 2: Reserve quota for the result pages that are not cached
+        pages_needed = cse.uncached_pages(optimized_query, CONFIG['num_pages'], CONFIG['engine_id'])
+        reservation = cse.quota_manager.reserve(pages_needed)
+        if pages_needed and reservation.granted < 1:
+            cse.quota_manager.release(reservation)
+            quota_status = cse.get_quota_status()
             result['quota_exceeded'] = True
             result['error'] = f"Daily API quota exceeded ({quota_status['daily_limit']} requests/day). Resets tomorrow."
             result['youtube_videos'] = []
@@ -148,9 +409,12 @@ def process_query(user_query):
             return result
         
         # Step 3: Search with enhanced error handling
+        cse_stats = {}
         try:
-            search_results = cse.cse(optimized_query, CONFIG['num_pages'], 
-                                   CONFIG['google_cse_api'], CONFIG['engine_id'])
+            with metrics.span('search'):
+                search_results = cse.cse(optimized_query, CONFIG['num_pages'], 
+                                       CONFIG['google_cse_api'], CONFIG['engine_id'],
+                                       reservation=reservation, stats=cse_stats)
         except Exception as e:
             if "quota" in str(e).lower() or "429" in str(e):
                 result['quota_exceeded'] = True
@@ -159,75 +423,32 @@ def process_query(user_query):
                 result['quota_status'] = cse.get_quota_status()
                 return result
             raise e
+        finally:
+            cse.quota_manager.release(reservation)
         
         if not search_results:
             result['error'] = "No search results found"
             return result
         
-        # Step 3: Process results sequentially
-        processed_results = []
-        max_results = min(3, len(search_results))  # Process top 3 results for efficiency
+        # Step 3: Process results through the fetch -> extract -> summarize pipeline
+        max_results = min(CONFIG['results_wanted'], len(search_results))
+        # Hosts that keep failing are moved behind healthy ones before the top results are picked
+        ranked_hits = host_health.tracker.prefer_healthy(list(search_results.values()), lambda hit: hit[1])
+        # Hedged over-fetch: a few spare candidates stand in for sources that fail or are too short
+        candidates = ranked_hits[:max_results + CONFIG['hedge_extra']]
+        reserve = ranked_hits[len(candidates):len(candidates) + CONFIG['backfill_limit']]
         
-        print(f"📄 Processing top {max_results} results...")
+        print(f"📄 Processing top {max_results} results from {len(candidates)} candidates...")
+        emit_event(on_event, 'search_results', {
+            'count': len(search_results),
+            'processing': max_results,
+            'hits': [{'title': title, 'url': link} for title, link in candidates]
+        })
         
-        for idx, (title, link) in list(search_results.items())[:max_results]:
-            result_num = len(processed_results) + 1
-            print(f"--- Processing Result {result_num}/{max_results} ---")
-            print(f"Title: {title}")
-            print(f"URL: {link}")
-            
-            try:
-                # Fetch content
-                print("📥 Fetching content...")
-                content = utils.fetch_page_content(link)
-                
-                if content and len(content.split()) > 50:
-                    word_count = len(content.split())
-                    print(f"✅ Content fetched: {word_count} words")
-                    
-                    # Summarize content
-                    print("🔄 Summarizing...")
-                    try:
-                        if word_count > 2000:
-                            # Use chunked summarization for large content
-                            summary_list = summarize_page_content.summary(content, 2, groq_client)
-                            summary_result = summarize_page_content.summarize_html_content(
-                                ' '.join(summary_list), groq_client
-                            )
-                        else:
-                            # Direct summarization for smaller content
-                            summary_result = summarize_page_content.summarize_html_content(
-                                content, groq_client
-                            )
-                        
-                        # Add to processed results
-                        processed_results.append({
-                            'title': title,
-                            'url': link,
-                            'content': content[:500] + "..." if len(content) > 500 else content,  # Truncate for response
-                            'word_count': word_count,
-                            'summary': summary_result
-                        })
-                        print(f"✅ Summarization completed")
-                        
-                    except Exception as summary_error:
-                        print(f"⚠️ Summarization failed: {summary_error}")
-                        # Add without summary if summarization fails
-                        processed_results.append({
-                            'title': title,
-                            'url': link,
-                            'content': content[:500] + "..." if len(content) > 500 else content,
-                            'word_count': word_count,
-                            'summary': {'error': str(summary_error)}
-                        })
-                        
-                else:
-                    print("❌ Content too short or failed to fetch")
-                    continue
-                    
-            except Exception as e:
-                print(f"❌ Error processing result: {e}")
-                continue
+        pipeline_stats = {}
+        with metrics.span('pipeline'):
+            processed_results = process_results(candidates, on_event, queries=(user_query, optimized_query),
+                                                wanted=max_results, reserve=reserve, stats=pipeline_stats)
         
         print(f"✅ Successfully processed {len(processed_results)} results")
         
@@ -235,16 +456,21 @@ def process_query(user_query):
         result['stats'] = {
             'search_results_found': len(search_results),
             'results_processed': len(processed_results),
-            'total_word_count': sum(r['word_count'] for r in processed_results)
+            'candidates_fetched': pipeline_stats['candidates_fetched'],
+            'duplicates_skipped': pipeline_stats['duplicates_skipped'],
+            'total_word_count': sum(r['word_count'] for r in processed_results),
+            'cse_pages': cse_stats.get('cse_pages', [])
         }
         
         # Step 4: YouTube search (only if main results exist and quota available)
         if processed_results and not result.get('quota_exceeded'):
             try:
                 print("🎥 Searching for related YouTube videos...")
-                youtube_videos = search_youtube_videos(user_query, max_videos=3)  # Reduced number
+                with metrics.span('youtube'):
+                    youtube_videos = search_youtube_videos(user_query, max_videos=3)  # Reduced number
                 result['youtube_videos'] = youtube_videos
                 result['stats']['youtube_videos_found'] = len(youtube_videos)
+                emit_event(on_event, 'videos', {'youtube_videos': youtube_videos})
                 
                 if youtube_videos:
                     print(f"✅ Found {len(youtube_videos)} YouTube videos")
@@ -267,33 +493,188 @@ def process_query(user_query):
     
     return result
 
+def answer_from_library(result, documents, on_event=None):
+    """Fill a process_query result from stored documents and summaries"""
+    print(f"📚 Answering from the library: {len(documents)} stored documents match")
+    result.update({
+        'optimized_query': documents[0].get('summary_optimized_query') or result['original_query'],
+        'explanation': 'Answered from previously fetched and summarized documents in the local library',
+        'search_intent': 'library',
+        'source': 'library',
+        'youtube_videos': []
+    })
+    emit_event(on_event, 'query', {key: result[key] for key in
+                                   ('original_query', 'optimized_query', 'explanation', 'search_intent')})
+    emit_event(on_event, 'search_results', {
+        'count': len(documents),
+        'processing': len(documents),
+        'hits': [{'title': document['title'], 'url': document['url']} for document in documents]
+    })
+    
+    for num, document in enumerate(documents, start=1):
+        content = document['content']
+        processed = {
+            'title': document['title'],
+            'url': document['url'],
+            'content': content[:500] + "..." if len(content) > 500 else content,
+            'word_count': document['word_count'],
+            'cached': True,
+            'summary': document['summary']
+        }
+        emit_event(on_event, 'document', {'index': num, 'title': document['title'], 'url': document['url'],
+                                          'word_count': document['word_count'], 'cached': True})
+        emit_event(on_event, 'summary', {'index': num, 'result': processed})
+        result['results'].append(processed)
+    
+    result['stats'] = {
+        'search_results_found': len(documents),
+        'results_processed': len(documents),
+        'candidates_fetched': 0,
+        'duplicates_skipped': 0,
+        'total_word_count': sum(document['word_count'] for document in documents),
+        'cse_pages': [],
+        'youtube_videos_found': 0
+    }
+    result['status'] = 'completed'
+    return result
+
+# Identical searches already in flight share one process_query run
+search_flights = singleflight.SingleFlight()
+
+def run_search(user_query, on_event=None):
+    """process_query, coalesced with any concurrent search for the same normalized query
+    
+    The shared run's Groq calls go at the most urgent priority of everyone
+    waiting on it, so an interactive search that joins a background job's
+    run is not queued behind other jobs.
+    """
+    priority = groq_scheduler.Priority(groq_scheduler.current_priority())
+    
+    def lead(emit):
+        with groq_scheduler.use_priority(priority):
+            return process_query(user_query, emit)
+    
+    return search_flights.do(
+        search_query.normalize_query(user_query),
+        lead,
+        on_event,
+        state=priority,
+        on_join=lambda running: groq_scheduler.scheduler.raise_priority(running, priority.value)
+    )
+
+def run_background_search(user_query, on_event=None):
+    """Job-pool searches yield Groq capacity to interactive /search requests"""
+    with groq_scheduler.use_priority(groq_scheduler.PRIORITY_BACKGROUND):
+        return run_search(user_query, on_event)
+
+# Background searches submitted through POST /jobs
+job_manager = jobs.JobManager(
+    run_background_search,
+    workers=CONFIG['job_workers'],
+    max_queue=CONFIG['job_queue_size']
+)
+
 @app.route('/')
 def index():
     """Main page"""
     return render_template('index.html')
 
+def validate_query(query):
+    """Return an error message for an unusable query, or None if it is fine"""
+    if not query:
+        return 'Query is required'
+    if len(query) > 500:
+        return 'Query too long (max 500 characters)'
+    return None
+
 @app.route('/search', methods=['POST'])
 def search():
     """Process search request"""
     data = request.get_json()
     query = data.get('query', '').strip()
     
-    if not query:
-        return jsonify({'error': 'Query is required'}), 400
-    
-    if len(query) > 500:
-        return jsonify({'error': 'Query too long (max 500 characters)'}), 400
+    error = validate_query(query)
+    if error:
+        return jsonify({'error': error}), 400
     
     # Generate session ID for tracking
     session_id = str(uuid.uuid4())
     session['current_search'] = session_id
     
     try:
-        result = process_query(query)
+        result = run_search(query)
         return jsonify(result)
     except Exception as e:
         return jsonify({'error': f'Processing failed: {str(e)}'}), 500
 
+@app.route('/search/stream')
+def search_stream():
+    """Process a search and stream each stage's output as Server-Sent Events"""
+    query = request.args.get('query', '').strip()
+    
+    error = validate_query(query)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    events = queue.Queue()
+    
+    def run():
+        try:
+            result = run_search(query, on_event=lambda event, data: events.put((event, data)))
+        except Exception as e:
+            result = {'original_query': query, 'status': 'error', 'error': f'Processing failed: {str(e)}'}
+        events.put(('complete', result))
+    
+    threading.Thread(target=run, name="search-stream", daemon=True).start()
+    
+    def generate():
+        while True:
+            try:
+                event, data = events.get(timeout=15)
+            except queue.Empty:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+            if event == 'complete':
+                break
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Queue a search and return its job id immediately"""
+    data = request.get_json(silent=True) or {}
+    query = data.get('query', '').strip()
+    
+    error = validate_query(query)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    try:
+        job = job_manager.submit(query)
+    except jobs.JobQueueFull as e:
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = '10'
+        return response, 429
+    
+    return jsonify({
+        'job_id': job['id'],
+        'status': job['status'],
+        'status_url': f"/jobs/{job['id']}"
+    }), 202
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    """Return a job's status, partial results so far and the final payload once done"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
 @app.route('/health')
 def health():
     """Health check endpoint"""
@@ -303,7 +684,20 @@ def health():
             'groq_api': bool(os.getenv("GROQ_API_KEY")),
             'google_cse_api': bool(os.getenv("GOOGLE_CUSTOM_SEARCH_JSON_API_KEY")),
             'search_engine_id': bool(os.getenv("SEARCH_ENGINE_ID"))
-        }
+        },
+        'caches': {
+            'query_optimization': search_query.query_cache.stats(),
+            'query_similarity': search_query.similar_queries.stats(),
+            'cse_pages': cse.page_cache.stats(),
+            'page_content': utils.content_cache.stats(),
+            'summaries': summarize_page_content.summary_cache.stats()
+        },
+        'http_pools': http_client.get_pool_stats(),
+        'ingest': content_processor.engine.stats(),
+        'library': knowledge_store.library.stats(),
+        'jobs': job_manager.stats(),
+        'coalescing': search_flights.stats(),
+        'groq': groq_scheduler.scheduler.stats()
     })
 
 @app.route('/quota')
@@ -322,6 +716,39 @@ def quota():
             'error': str(e)
         }), 500
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Stage latency histograms, error and retry counters in the Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/library/search')
+def library_search():
+    """Full-text search over stored documents and summaries; costs no CSE quota or Groq calls"""
+    query = request.args.get('q', '').strip()
+    error = validate_query(query)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    with metrics.span('library_search'):
+        documents = knowledge_store.library.search(query, limit=limit)
+    return jsonify({
+        'status': 'success',
+        'query': query,
+        'count': len(documents),
+        'results': documents
+    })
+
+@app.route('/hosts')
+def hosts():
+    """Per-host fetch latency, failure rates, adaptive timeouts and circuit breaker state"""
+    host_table = host_health.tracker.snapshot()
+    return jsonify({
+        'status': 'success',
+        'open_circuits': sorted(host for host, entry in host_table.items() if entry['state'] == 'open'),
+        'hosts': host_table
+    })
+
 if __name__ == '__main__':
     # Check required environment variables
     required_vars = ['GROQ_API_KEY', 'GOOGLE_CUSTOM_SEARCH_JSON_API_KEY', 'SEARCH_ENGINE_ID']
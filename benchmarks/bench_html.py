@@ -0,0 +1,93 @@
+"""Compare HTML text extractors on the saved-page corpus.
+
+For every page in benchmarks/corpus/html there is a .txt file with the
+page's main content. Each extractor is timed over the whole corpus and its
+output is scored against those files as word-level precision (how much of
+the output is article text rather than boilerplate) and recall (how much of
+the article survived).
+
+    python benchmarks/bench_html.py [--rounds 20]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+import html_extract
+import utils
+
+CORPUS_DIR = os.path.join(ROOT, 'benchmarks', 'corpus', 'html')
+_WORD = re.compile(r"\w+")
+
+def load_corpus():
+    pages = []
+    for name in sorted(os.listdir(CORPUS_DIR)):
+        if not name.endswith('.html'):
+            continue
+        with open(os.path.join(CORPUS_DIR, name), 'rb') as handle:
+            body = handle.read()
+        with open(os.path.join(CORPUS_DIR, name[:-5] + '.txt'), encoding='utf-8') as handle:
+            expected = handle.read()
+        pages.append((name, body, expected))
+    return pages
+
+def word_scores(output: str, expected: str):
+    got = Counter(word.lower() for word in _WORD.findall(output))
+    want = Counter(word.lower() for word in _WORD.findall(expected))
+    overlap = sum((got & want).values())
+    precision = overlap / sum(got.values()) if got else 0.0
+    recall = overlap / sum(want.values()) if want else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return precision, recall, f1
+
+def without_lxml(body):
+    saved = html_extract.HAVE_LXML
+    html_extract.HAVE_LXML = False
+    try:
+        return utils.process_html(body, 'text/html')
+    finally:
+        html_extract.HAVE_LXML = saved
+
+EXTRACTORS = [
+    # The original pipeline handed raw bytes straight to BeautifulSoup
+    ('bs4 (previous process_html)', utils.process_html_bs4),
+    ('readability + stdlib parser', without_lxml),
+]
+if html_extract.HAVE_LXML:
+    EXTRACTORS.append(('readability + lxml', lambda body: utils.process_html(body, 'text/html')))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=20, help='passes over the corpus per extractor')
+    parser.add_argument('--verbose', action='store_true', help='print per-page scores')
+    args = parser.parse_args()
+
+    pages = load_corpus()
+    total_bytes = sum(len(body) for _, body, _ in pages)
+    print(f"Corpus: {len(pages)} pages, {total_bytes / 1024:.0f} KiB, {args.rounds} rounds\n")
+    print(f"{'extractor':<30} {'pages/s':>9} {'MiB/s':>7} {'precision':>10} {'recall':>7} {'F1':>6}")
+
+    for label, extract in EXTRACTORS:
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            outputs = [extract(body) for _, body, _ in pages]
+        elapsed = time.perf_counter() - start
+
+        scores = [word_scores(output, expected) for output, (_, _, expected) in zip(outputs, pages)]
+        precision, recall, f1 = (sum(values) / len(values) for values in zip(*scores))
+        pages_per_second = len(pages) * args.rounds / elapsed
+        mib_per_second = total_bytes * args.rounds / elapsed / (1024 * 1024)
+        print(f"{label:<30} {pages_per_second:>9.1f} {mib_per_second:>7.2f} "
+              f"{precision:>10.3f} {recall:>7.3f} {f1:>6.3f}")
+
+        if args.verbose:
+            for (name, _, _), (p, r, f) in zip(pages, scores):
+                print(f"    {name:<26} precision={p:.3f} recall={r:.3f} f1={f:.3f}")
+
+if __name__ == '__main__':
+    main()
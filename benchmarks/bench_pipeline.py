@@ -0,0 +1,247 @@
+"""Stage-by-stage latency of the search pipeline, fully offline.
+
+Google CSE, Groq and the web are replaced by local fakes (see fixtures.py
+and fake_groq.py), so runs are repeatable and cost no quota. Each stage is
+timed on its own (query optimization, CSE pages, downloads, HTML and PDF
+extraction, summarization) and then process_query end to end: cold (all
+caches cleared), warm (same query again through the whole pipeline, with
+library answers off) and library (same query answered from the local
+library). Results go to a JSON file so two commits can be compared:
+
+    python benchmarks/bench_pipeline.py --rounds 5
+    python benchmarks/bench_pipeline.py --compare benchmarks/results/<older>.json
+
+Client-side pacing (CSE_REQUESTS_PER_SECOND, GROQ_LIMITS) is lifted unless
+set in the environment, so timings reflect the code rather than the sleeps;
+use --groq-rpm/--groq-tpm to have the fake API answer with 429s instead.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager, nullcontext, redirect_stdout
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, ROOT)
+
+# Must be in place before the app modules open their caches and read their limits
+os.environ['CACHE_DIR'] = tempfile.mkdtemp(prefix='bench-cache-')
+os.environ.setdefault('GROQ_API_KEY', 'offline-benchmark')
+os.environ.setdefault('GOOGLE_CUSTOM_SEARCH_JSON_API_KEY', 'offline-benchmark')
+os.environ.setdefault('SEARCH_ENGINE_ID', 'offline-benchmark')
+os.environ.setdefault('CSE_REQUESTS_PER_SECOND', '1000')
+os.environ.setdefault('CSE_BURST', '1000')
+os.environ.setdefault('CSE_DAILY_LIMIT', '1000000')
+os.environ.setdefault('GROQ_LIMITS', 'llama-3.1-8b-instant=100000:1000000000,'
+                                     'deepseek-r1-distill-llama-70b=100000:1000000000')
+
+import app
+import cse
+import knowledge_store
+import search_query
+import summarize_page_content
+import utils
+
+from fake_groq import FakeGroq
+from fixtures import FixtureServer, load_documents
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+QUERIES = [
+    "how is dissolved oxygen measured in river water",
+    "what causes the seasons on earth",
+    "history of the printing press in europe",
+]
+
+class Timings:
+    def __init__(self):
+        self.samples = {}
+
+    @contextmanager
+    def measure(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.setdefault(stage, []).append(time.perf_counter() - started)
+
+    def summary(self) -> dict:
+        stages = {}
+        for stage, values in self.samples.items():
+            ordered = sorted(values)
+            pick = lambda fraction: ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+            stages[stage] = {
+                'runs': len(ordered),
+                'mean_ms': round(sum(ordered) / len(ordered) * 1000, 2),
+                'p50_ms': round(pick(0.5) * 1000, 2),
+                'p95_ms': round(pick(0.95) * 1000, 2),
+                'min_ms': round(ordered[0] * 1000, 2),
+                'max_ms': round(ordered[-1] * 1000, 2)
+            }
+        return stages
+
+def clear_caches():
+    for store in (search_query.query_cache, cse.page_cache, utils.content_cache, summarize_page_content.summary_cache):
+        store.clear()
+    knowledge_store.library.clear()
+    search_query.similar_queries.clear()
+
+def git_commit() -> str:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return f"{commit}-dirty" if dirty else commit
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def bench_stages(timings: Timings, server: FixtureServer, client: FakeGroq, rounds: int):
+    documents = server.documents
+    html_names = [name for name, (kind, _) in documents.items() if kind == 'text/html']
+    pdf_names = [name for name, (kind, _) in documents.items() if kind == 'application/pdf']
+
+    # Warm-up: start the PDF process pool and the connection pool outside the timings
+    utils.extract_pdf_content(documents['paper_short.pdf'][1])
+    utils.fetch_page_content(server.document_url(html_names[0], 'warmup'))
+
+    for round_number in range(rounds):
+        for query in QUERIES:
+            with timings.measure('build_search_query'):
+                optimized, _, _ = search_query.build_search_query(f"{query} ({round_number})", client)
+            with timings.measure('cse.cse'):
+                cse.cse(f"{optimized} {round_number}", app.CONFIG['num_pages'],
+                        app.CONFIG['google_cse_api'], app.CONFIG['engine_id'])
+
+        for name in html_names + pdf_names:
+            kind = 'pdf' if name in pdf_names else 'html'
+            with timings.measure(f'fetch_page_content[{kind}]'):
+                utils.fetch_page_content(server.document_url(name, f"round-{round_number}"))
+
+        for name in html_names:
+            with timings.measure('process_html'):
+                utils.process_html(documents[name][1], documents[name][0])
+
+        pdf_texts = {}
+        for name in pdf_names:
+            with timings.measure(f'extract_pdf_content[{name}]'):
+                pdf_texts[name] = utils.extract_pdf_content(documents[name][1])
+
+        summarize_page_content.summary_cache.clear()
+        for name in html_names:
+            text = utils.process_html(documents[name][1], documents[name][0])
+            with timings.measure('summarize_html_content'):
+                summarize_page_content.summarize_html_content(text, client, queries=QUERIES[:1])
+        with timings.measure('map_reduce_summarize'):
+            summarize_page_content.map_reduce_summarize(pdf_texts['paper_long.pdf'], client)
+
+@contextmanager
+def library_answers(enabled: bool):
+    previous = app.CONFIG['library_answers']
+    app.CONFIG['library_answers'] = enabled
+    try:
+        yield
+    finally:
+        app.CONFIG['library_answers'] = previous
+
+def bench_end_to_end(timings: Timings, rounds: int):
+    for _ in range(rounds):
+        for query in QUERIES:
+            clear_caches()
+            # Cold and warm always run the pipeline, so they compare across commits whatever LIBRARY_ANSWERS is
+            with library_answers(False):
+                with timings.measure('process_query[cold]'):
+                    result = app.process_query(query)
+                if result['status'] != 'completed':
+                    print(f"⚠️ process_query did not complete for {query!r}: {result['error']}", file=sys.stderr)
+                with timings.measure('process_query[warm]'):
+                    app.process_query(query)
+            with library_answers(True):
+                with timings.measure('process_query[library]'):
+                    result = app.process_query(query)
+            if result.get('source') != 'library':
+                print(f"⚠️ process_query was not answered from the library for {query!r}", file=sys.stderr)
+
+def print_table(stages: dict, baseline: dict = None):
+    header = f"{'stage':<42} {'runs':>5} {'p50 ms':>9} {'p95 ms':>9} {'mean ms':>9}"
+    print(header + (f" {'base p50':>9} {'change':>8}" if baseline else ''))
+    for stage, values in stages.items():
+        line = (f"{stage:<42} {values['runs']:>5} {values['p50_ms']:>9.1f} "
+                f"{values['p95_ms']:>9.1f} {values['mean_ms']:>9.1f}")
+        if baseline:
+            old = baseline.get(stage)
+            if old and old['p50_ms']:
+                change = (values['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100
+                line += f" {old['p50_ms']:>9.1f} {change:>+7.1f}%"
+            else:
+                line += f" {'-':>9} {'-':>8}"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=3, help='passes over every stage')
+    parser.add_argument('--groq-latency', type=float, default=0.05, help='seconds per fake Groq call')
+    parser.add_argument('--groq-jitter', type=float, default=0.0, help='extra random seconds per call')
+    parser.add_argument('--groq-rpm', type=int, default=0, help='fake Groq requests/minute before 429s (0 = unlimited)')
+    parser.add_argument('--groq-tpm', type=int, default=0, help='fake Groq tokens/minute before 429s (0 = unlimited)')
+    parser.add_argument('--doc-latency', type=float, default=0.02, help='seconds before each document response')
+    parser.add_argument('--cse-latency', type=float, default=0.05, help='seconds before each CSE page response')
+    parser.add_argument('--fetch-mode', choices=['threads', 'async'], default=app.CONFIG['fetch_mode'])
+    parser.add_argument('--output', help='JSON results path (default: benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', help='earlier results JSON to show p50 changes against')
+    parser.add_argument('--verbose', action='store_true', help="keep the pipeline's own progress output")
+    args = parser.parse_args()
+
+    server = FixtureServer(load_documents(), doc_latency=args.doc_latency, cse_latency=args.cse_latency).start()
+    client = FakeGroq(latency=args.groq_latency, jitter=args.groq_jitter, rpm=args.groq_rpm, tpm=args.groq_tpm)
+    cse.CSE_ENDPOINT = server.cse_endpoint
+    app.groq_client = client
+    app.CONFIG['fetch_mode'] = args.fetch_mode
+
+    timings = Timings()
+    started = time.perf_counter()
+    quiet = nullcontext() if args.verbose else redirect_stdout(open(os.devnull, 'w'))
+    try:
+        with quiet:
+            bench_stages(timings, server, client, args.rounds)
+            bench_end_to_end(timings, args.rounds)
+    finally:
+        server.stop()
+    elapsed = time.perf_counter() - started
+
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'elapsed_s': round(elapsed, 2),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()
+        },
+        'settings': {key: value for key, value in vars(args).items() if key not in ('output', 'compare', 'verbose')},
+        'stages': timings.summary(),
+        'fake_groq': client.stats(),
+        'fixture_requests': dict(server.counts)
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as handle:
+        json.dump(report, handle, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as handle:
+            baseline = json.load(handle)['stages']
+    print()
+    print_table(report['stages'], baseline)
+    print(f"\nFake Groq: {client.stats()} | fixture requests: {server.counts}")
+    print(f"Results written to {output} ({elapsed:.1f}s)")
+
+if __name__ == '__main__':
+    main()
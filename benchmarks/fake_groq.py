@@ -0,0 +1,99 @@
+"""A stand-in for groq.Groq that answers chat completions locally.
+
+It is shaped like the parts of the SDK the app uses
+(client.chat.completions.create returning .choices[0].message.content and
+.usage.total_tokens) and understands the three prompts in the pipeline:
+query optimization, the final JSON summary, and plain-text compression.
+Each call sleeps for a configurable latency; optional requests/tokens per
+minute limits raise 429 errors carrying a retry-after header, like the API.
+"""
+import json
+import random
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+
+class FakeRateLimitError(Exception):
+    """Mimics groq.RateLimitError: status_code 429 and response.headers['retry-after']"""
+    def __init__(self, retry_after: float):
+        super().__init__(f"Error code: 429 - rate_limit_exceeded (retry after {retry_after:.2f}s)")
+        self.status_code = 429
+        self.response = SimpleNamespace(headers={'retry-after': f"{retry_after:.2f}"})
+
+def _completion(content: str, prompt_tokens: int, completion_tokens: int):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content), finish_reason='stop')],
+        usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                              total_tokens=prompt_tokens + completion_tokens)
+    )
+
+class _Completions:
+    def __init__(self, client: 'FakeGroq'):
+        self._client = client
+
+    def create(self, **kwargs):
+        return self._client.complete(**kwargs)
+
+class FakeGroq:
+    """Deterministic fake Groq client; rpm/tpm of 0 mean unlimited"""
+    def __init__(self, latency: float = 0.05, jitter: float = 0.0, rpm: int = 0, tpm: int = 0, seed: int = 42):
+        self.latency = latency
+        self.jitter = jitter
+        self.rpm = rpm
+        self.tpm = tpm
+        self.chat = SimpleNamespace(completions=_Completions(self))
+        self._random = random.Random(seed)
+        self._window = deque()  # (sent_at, tokens)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.rate_limited = 0
+        self.tokens = 0
+
+    def _admit(self, tokens: int):
+        now = time.monotonic()
+        with self._lock:
+            while self._window and self._window[0][0] <= now - 60:
+                self._window.popleft()
+            over_requests = self.rpm and len(self._window) >= self.rpm
+            over_tokens = self.tpm and sum(spent for _, spent in self._window) + tokens > self.tpm
+            if over_requests or over_tokens:
+                self.rate_limited += 1
+                retry_after = self._window[0][0] + 60 - now if self._window else 1.0
+                raise FakeRateLimitError(max(0.01, retry_after))
+            self._window.append((now, tokens))
+            self.calls += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+        time.sleep(delay)
+
+    def complete(self, model: str = '', messages=(), response_format=None, max_tokens=None, **_):
+        system = next((m['content'] for m in messages if m['role'] == 'system'), '')
+        user = next((m['content'] for m in messages if m['role'] == 'user'), '')
+        words = user.split()
+        prompt_tokens = (len(system) + len(user)) // 4
+
+        if 'optimized_query' in system:
+            keywords = [word for word in words if len(word) > 3][:8] or words[:8]
+            content = json.dumps({
+                'optimized_query': ' '.join(keywords) + ' (site:edu OR site:org)',
+                'explanation': 'Kept the content words and restricted results to authoritative sites.',
+                'search_intent': 'research'
+            })
+        elif response_format and response_format.get('type') == 'json_object':
+            content = json.dumps({
+                'brief_description': ' '.join(words[:40]),
+                'concise_summary': ' '.join(words[:120]),
+                'key_findings': [' '.join(words[i:i + 15]) for i in range(0, min(len(words), 60), 15)],
+                'actionable_insights': [' '.join(words[-15:])]
+            })
+        else:
+            # Compression prompt: plain text, roughly a third of the input
+            content = ' '.join(words[:max(1, min(len(words) // 3, int(max_tokens or 512) * 3 // 4))])
+
+        completion_tokens = len(content) // 4
+        self._admit(prompt_tokens + completion_tokens)
+        self.tokens += prompt_tokens + completion_tokens
+        return _completion(content, prompt_tokens, completion_tokens)
+
+    def stats(self) -> dict:
+        return {'calls': self.calls, 'rate_limited': self.rate_limited, 'tokens': self.tokens}
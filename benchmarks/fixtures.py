@@ -0,0 +1,170 @@
+"""Offline stand-ins for the web: a fixture document server and a fake Custom Search endpoint.
+
+FixtureServer serves the saved HTML pages in benchmarks/corpus/html plus
+PDFs generated from their text, and answers /customsearch/v1 the way
+Google does, with result links pointing back at those documents. Both can
+be given an artificial response latency.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, urlparse
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus', 'html')
+
+# Layout used by make_pdf: Helvetica 10pt, 12pt leading on an A4 page
+PDF_LINE_CHARS = 90
+PDF_LINES_PER_PAGE = 60
+
+def _pdf_string(text: str) -> str:
+    text = text.encode('latin-1', 'replace').decode('latin-1')
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+def _wrap(text: str, width: int) -> List[str]:
+    lines, current = [], ''
+    for word in text.split():
+        if current and len(current) + 1 + len(word) > width:
+            lines.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        lines.append(current)
+    return lines
+
+def make_pdf(pages: List[str]) -> bytes:
+    """Minimal valid PDF with one text page per string (each is wrapped, then cut to fit the page)"""
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            ' '.join(f"{4 + 2 * i} 0 R" for i in range(len(pages))), len(pages)),
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, text in enumerate(pages):
+        lines = _wrap(text, PDF_LINE_CHARS)[:PDF_LINES_PER_PAGE]
+        stream = "BT /F1 10 Tf 40 800 Td 12 TL " + ' '.join(f"({_pdf_string(line)}) '" for line in lines) + " ET"
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(stream.encode('latin-1'))} >>\nstream\n{stream}\nendstream")
+
+    out = "%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out.encode('latin-1')))
+        out += f"{number} 0 obj\n{body}\nendobj\n"
+    xref = len(out.encode('latin-1'))
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    out += ''.join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    return out.encode('latin-1')
+
+def load_documents(long_pdf_pages: int = 40) -> Dict[str, Tuple[str, bytes]]:
+    """{name: (content_type, body)} for every corpus page plus a short and a long generated PDF"""
+    documents = {}
+    texts = []
+    for name in sorted(os.listdir(CORPUS_DIR)):
+        path = os.path.join(CORPUS_DIR, name)
+        if name.endswith('.html'):
+            with open(path, 'rb') as handle:
+                documents[name] = ('text/html', handle.read())
+        elif name.endswith('.txt'):
+            with open(path, encoding='utf-8') as handle:
+                texts.append(handle.read())
+
+    # Each PDF page holds about one saved article's worth of text
+    page_texts = [' '.join(texts[i % len(texts)].split()) for i in range(max(long_pdf_pages, 3))]
+    documents['paper_short.pdf'] = ('application/pdf', make_pdf(page_texts[:3]))
+    documents['paper_long.pdf'] = ('application/pdf', make_pdf(page_texts[:long_pdf_pages]))
+    return documents
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, content_type: str, body: bytes):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        server = self.server
+        if parsed.path == '/customsearch/v1':
+            server.counts['cse'] += 1
+            time.sleep(server.cse_latency)
+            params = parse_qs(parsed.query)
+            query = params.get('q', [''])[0]
+            start = int(params.get('start', ['1'])[0])
+            self._send(200, 'application/json', json.dumps(server.search(query, start)).encode('utf-8'))
+            return
+
+        name = parsed.path.rsplit('/', 1)[-1]
+        if parsed.path.startswith('/docs/') and name in server.documents:
+            server.counts['documents'] += 1
+            time.sleep(server.doc_latency)
+            content_type, body = server.documents[name]
+            self._send(200, content_type, body)
+            return
+        self._send(404, 'text/plain', b'not found')
+
+class FixtureServer(ThreadingHTTPServer):
+    """Local document server and fake CSE endpoint on an ephemeral 127.0.0.1 port.
+
+    Search results cycle through the documents; every link carries a tag
+    derived from the query, so a new query means new (uncached) URLs.
+    Queries for site:youtube.com return watch links that are never fetched.
+    """
+    daemon_threads = True
+
+    def __init__(self, documents: Dict[str, Tuple[str, bytes]], doc_latency: float = 0.0,
+                 cse_latency: float = 0.0, results_per_query: int = 30):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.documents = documents
+        self.doc_latency = doc_latency
+        self.cse_latency = cse_latency
+        self.results_per_query = results_per_query
+        self.counts = {'cse': 0, 'documents': 0}
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    @property
+    def cse_endpoint(self) -> str:
+        return f"{self.base_url}/customsearch/v1"
+
+    def document_url(self, name: str, tag: str = '') -> str:
+        return f"{self.base_url}/docs/{name}" + (f"?v={tag}" if tag else '')
+
+    def search(self, query: str, start: int) -> dict:
+        tag = hashlib.sha1(query.encode('utf-8')).hexdigest()[:10]
+        names = sorted(self.documents)
+        items = []
+        for rank in range(start, min(start + 10, self.results_per_query + 1)):
+            if 'site:youtube.com' in query:
+                video_id = hashlib.sha1(f"{tag}{rank}".encode('utf-8')).hexdigest()[:11]
+                items.append({'title': f"Video {rank} - YouTube", 'link': f"https://www.youtube.com/watch?v={video_id}"})
+                continue
+            name = names[(rank - 1) % len(names)]
+            items.append({'title': f"{name} ({rank})", 'link': self.document_url(name, f"{tag}-{rank}")})
+        return {'items': items} if items else {}
+
+    def start(self) -> 'FixtureServer':
+        self._thread = threading.Thread(target=self.serve_forever, name='fixture-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
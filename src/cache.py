@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Optional
+
+# All persistent caches live here unless CACHE_DIR says otherwise
+CACHE_DIR = os.getenv(
+    "CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache')
+)
+
+class DiskCache:
+    """SQLite-backed key/value cache with TTL expiry and LRU eviction.
+
+    Values must be JSON-serializable. Each cache is a single SQLite file,
+    so it survives restarts and is safe to share between threads and
+    worker processes.
+    """
+    def __init__(self, name: str, ttl: Optional[float] = None, max_entries: Optional[int] = 1000,
+                 max_bytes: Optional[int] = None, path: Optional[str] = None):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.path = path or os.path.join(CACHE_DIR, f"{name}.sqlite3")
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries (accessed_at)")
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Build a stable cache key from any JSON-serializable parts"""
+        raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def record(self, hit: bool):
+        """Count a hit or miss for lookups made through get_entry"""
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get_entry(self, key: str) -> Optional[dict]:
+        """Return the stored entry even if expired, with a 'fresh' flag (no hit/miss counting)"""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, created_at, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+
+        value, created_at, expires_at = row
+        return {
+            'value': json.loads(value),
+            'created_at': created_at,
+            'expires_at': expires_at,
+            'fresh': expires_at is None or expires_at > now
+        }
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Return a fresh cached value, or default on a miss or expired entry"""
+        entry = self.get_entry(key)
+        if entry is None or not entry['fresh']:
+            self.record(hit=False)
+            return default
+        self.record(hit=True)
+        return entry['value']
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Store a value, then evict least recently used entries over the limits"""
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        payload = json.dumps(value, ensure_ascii=False)
+        expires_at = now + ttl if ttl else None
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created_at, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, payload, len(payload.encode('utf-8')), now, expires_at, now)
+            )
+            self._evict(conn)
+
+    def touch(self, key: str, ttl: Optional[float] = None):
+        """Extend an existing entry's lifetime without rewriting its value"""
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE entries SET expires_at = ?, accessed_at = ? WHERE key = ?",
+                (now + ttl if ttl else None, now, key)
+            )
+
+    def delete(self, key: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM entries")
+
+    def _evict(self, conn: sqlite3.Connection):
+        if self.max_entries:
+            count = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            excess = count - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM entries WHERE key IN "
+                    "(SELECT key FROM entries ORDER BY accessed_at ASC LIMIT ?)",
+                    (excess,)
+                )
+
+        if self.max_bytes:
+            # Keep the most recently used entries that fit within max_bytes
+            conn.execute(
+                "DELETE FROM entries WHERE key IN ("
+                "  SELECT key FROM ("
+                "    SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC, key) AS running"
+                "    FROM entries"
+                "  ) WHERE running > ?"
+                ")",
+                (self.max_bytes,)
+            )
+
+    def stats(self) -> dict:
+        """Hit/miss counters for this process plus the on-disk entry count and size"""
+        with self._connect() as conn:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': entries,
+            'bytes': size
+        }
@@ -1,121 +1,298 @@
 import asyncio
 import aiohttp
+import atexit
 import concurrent.futures
+import contextvars
+import os
+import threading
+from contextlib import asynccontextmanager
 from typing import List, Dict, Optional
+from urllib.parse import urlparse
 import time
-from utils import process_html
+import host_health
+import metrics
+import utils
+
+# Connection limits for the async ingest engine
+INGEST_MAX_CONNECTIONS = int(os.getenv("INGEST_MAX_CONNECTIONS", 20))
+INGEST_PER_HOST = int(os.getenv("INGEST_PER_HOST", 2))
+INGEST_EXTRACT_WORKERS = int(os.getenv("INGEST_EXTRACT_WORKERS", 4))
 
 class ParallelContentProcessor:
-    def __init__(self, max_workers: int = 5, timeout: int = 10):
+    """Async ingest engine: one long-lived event loop and aiohttp session for the process.
+
+    Downloads behave exactly like utils.download_page (content cache,
+    conditional GET, streaming with the byte cap, format sniffing, PDF
+    spooling) but run concurrently on the loop, with at most `per_host`
+    requests in flight to any one host. Text extraction is CPU-bound, so it
+    runs on a thread pool (PDF pages fan out further to pdf_extract's
+    process pool) instead of blocking the loop; content cache reads and
+    writes (SQLite) and PDF spool file writes run on a small pool of their
+    own for the same reason. Synchronous callers use submit_download /
+    download_page / fetch_page_content from any thread.
+    """
+    def __init__(self, max_workers: int = INGEST_MAX_CONNECTIONS, timeout: float = host_health.DEFAULT_TIMEOUT,
+                 per_host: int = INGEST_PER_HOST, extract_workers: int = INGEST_EXTRACT_WORKERS):
         self.max_workers = max_workers
         self.timeout = timeout
-        self.session_headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-        }
-    
-    async def fetch_content_async(self, session: aiohttp.ClientSession, url: str) -> Dict:
-        """Async fetch single URL content"""
+        self.per_host = per_host
+        self.session_headers = dict(utils.DEFAULT_HEADERS)
+        self.extract_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=extract_workers, thread_name_prefix="ingest-extract"
+        )
+        # Separate from extraction so a cache lookup never waits behind a long PDF
+        self.cache_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=4, thread_name_prefix="ingest-cache"
+        )
+        self._loop = None
+        self._session = None
+        self._host_limits = {}  # host -> [semaphore, requests holding or waiting for it]
+        self._start_lock = threading.Lock()
+        self._stats = {'requests': 0, 'failures': 0, 'in_flight': 0}
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="ingest-loop", daemon=True)
+                thread.start()
+                asyncio.run_coroutine_threadsafe(self._open_session(), loop).result()
+                self._loop = loop
+            return self._loop
+
+    async def _open_session(self):
+        connector = aiohttp.TCPConnector(limit=self.max_workers, ttl_dns_cache=300)
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers=self.session_headers
+        )
+
+    def close(self):
+        """Close the session and stop the loop (the engine restarts lazily if used again)"""
+        with self._start_lock:
+            if self._loop is None:
+                return
+            asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+            self._session = None
+            self._host_limits = {}
+
+    @asynccontextmanager
+    async def _host_limit(self, url: str):
+        # Only touched from the loop thread, so no lock is needed
+        host = urlparse(url).netloc
+        limit = self._host_limits.get(host)
+        if limit is None:
+            limit = self._host_limits[host] = [asyncio.Semaphore(self.per_host), 0]
+        limit[1] += 1
+        try:
+            async with limit[0]:
+                yield
+        finally:
+            limit[1] -= 1
+            if not limit[1] and self._host_limits.get(host) is limit:
+                # Nobody holds or waits for the host, so its semaphore can go
+                del self._host_limits[host]
+
+    async def _in_cache_executor(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.cache_executor, contextvars.copy_context().run, func, *args)
+
+    @staticmethod
+    def _locked(lock: threading.Lock, method, *args):
+        with lock:
+            return method(*args)
+
+    async def _feed_sink(self, sink: utils.BodySink, lock: threading.Lock, method, *args):
+        # HTML is only held in memory; creating, writing and closing the PDF spool file is disk work
+        if sink.kind == 'html':
+            return method(*args)
+        return await self._in_cache_executor(self._locked, lock, method, *args)
+
+    async def fetch_page(self, url: str) -> Optional[Dict]:
+        """Async equivalent of utils.download_page (same page dict, same caching)"""
+        cached_page, entry = await self._in_cache_executor(utils.lookup_cached_page, url)
+        if cached_page:
+            return cached_page
+
+        tracker = host_health.tracker
+        if not tracker.allow(url):
+            print(f"  🚧 Skipping {url[:80]}: host is cooling down after repeated failures")
+            return None
+
+        async with self._host_limit(url):
+            with metrics.span('fetch') as span:
+                page = await self._download(url, entry)
+                span['kind'] = utils.page_kind(page) if page else 'failed'
+        if page is None:
+            metrics.count_error('fetch')
+        return page
+
+    async def _download(self, url: str, entry: Optional[dict]) -> Optional[Dict]:
+        tracker = host_health.tracker
+        self._stats['requests'] += 1
+        self._stats['in_flight'] += 1
+        timeout = tracker.timeout_for(url, self.timeout)
+        # Per-socket limits adapt to the host; the session total still bounds the whole download
+        request_timeout = aiohttp.ClientTimeout(total=self.timeout, sock_connect=timeout, sock_read=timeout)
+        started = time.monotonic()
+        latency = None
         try:
-            async with session.get(url, timeout=self.timeout) as response:
-                if response.status == 200:
-                    content = await response.text()
-                    processed_content = process_html(content)
-                    
-                    return {
-                        'url': url,
-                        'content': processed_content,
-                        'word_count': len(processed_content.split()),
-                        'success': True,
-                        'error': None
-                    }
-                else:
-                    # Handle non-200 status codes
-                    return {
-                        'url': url,
-                        'content': '',
-                        'word_count': 0,
-                        'success': False,
-                        'error': f'HTTP {response.status}'
-                    }
+            print(f"  📡 Requesting (async): {url[:80]}...")
+            async with self._session.get(url, headers=utils.request_headers(entry),
+                                         allow_redirects=True, timeout=request_timeout) as response:
+                latency = time.monotonic() - started
+                tracker.record_status(url, latency, response.status)
+                if response.status == 304 and entry:
+                    return await self._in_cache_executor(utils.not_modified_page, url, entry)
+                response.raise_for_status()
+
+                page = utils.new_page(url, response.headers)
+                sink = utils.BodySink(page)
+                # A cancelled await leaves its write running; the lock keeps abort() from closing the file under it
+                spool_lock = threading.Lock()
+                if not sink.accepts_length(response.headers.get('content-length')):
+                    return None
+                try:
+                    async for chunk in response.content.iter_chunked(utils.DOWNLOAD_CHUNK_SIZE):
+                        if not await self._feed_sink(sink, spool_lock, sink.feed, chunk):
+                            break
+                except BaseException:
+                    # Not awaited, so a cancelled download still cleans up its spool file
+                    self.cache_executor.submit(self._locked, spool_lock, sink.abort)
+                    raise
+                return page if await self._feed_sink(sink, spool_lock, sink.finish) else None
+
+        except asyncio.TimeoutError:
+            self._stats['failures'] += 1
+            tracker.record(url, None, False, 'timeout')
+            print(f"  ⏰ Timeout fetching {url} after {timeout:.1f}s")
+            return None
+        except aiohttp.ClientError as e:
+            self._stats['failures'] += 1
+            if latency is None:
+                tracker.record(url, None, False, type(e).__name__)
+            print(f"  ❌ Request error for {url}: {e}")
+            return None
         except Exception as e:
-            return {
-                'url': url,
-                'content': '',
-                'word_count': 0,
-                'success': False,
-                'error': str(e)
-            }
-    
-    async def fetch_multiple_contents(self, urls: List[str]) -> List[Dict]:
-        """Fetch multiple URLs concurrently"""
-        connector = aiohttp.TCPConnector(limit=self.max_workers)
-        timeout = aiohttp.ClientTimeout(total=self.timeout)
-        
-        async with aiohttp.ClientSession(
-            connector=connector, 
-            timeout=timeout,
-            headers=self.session_headers
-        ) as session:
-            tasks = [self.fetch_content_async(session, url) for url in urls]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            # Filter out exceptions and return successful results
-            valid_results = []
-            for result in results:
-                if isinstance(result, dict):
-                    valid_results.append(result)
-                else:
-                    print(f"Exception in fetch: {result}")
-            
-            return valid_results
-    
+            self._stats['failures'] += 1
+            print(f"  ❌ Error fetching {url}: {e}")
+            return None
+        finally:
+            self._stats['in_flight'] -= 1
+
+    async def fetch_content_async(self, url: str) -> Dict:
+        """Fetch and extract one URL, off-loading extraction from the loop"""
+        page = await self.fetch_page(url)
+        if not page:
+            return {'url': url, 'content': '', 'word_count': 0, 'success': False, 'error': 'fetch failed'}
+
+        loop = asyncio.get_running_loop()
+        content = await loop.run_in_executor(self.extract_executor, contextvars.copy_context().run,
+                                             utils.extract_page_content, page)
+        return {
+            'url': url,
+            'content': content,
+            'word_count': len(content.split()),
+            'success': bool(content),
+            'error': None if content else 'no extractable content',
+            'cached': page.get('cached', False)
+        }
+
+    @staticmethod
+    async def _for_request(timings: Optional[metrics.RequestTimings], coroutine):
+        # Tasks on the loop start from the loop thread's context, not the submitting thread's
+        metrics.bind_request(timings)
+        return await coroutine
+
+    def submit_download(self, url: str) -> concurrent.futures.Future:
+        """Start downloading url on the engine loop; the future resolves to a page dict or None"""
+        loop = self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(
+            self._for_request(metrics.current_request(), self.fetch_page(url)), loop
+        )
+
+    def download_page(self, url: str) -> Optional[Dict]:
+        """Blocking drop-in for utils.download_page"""
+        return self.submit_download(url).result()
+
+    def fetch_page_content(self, url: str) -> str:
+        """Blocking drop-in for utils.fetch_page_content"""
+        page = self.download_page(url)
+        return utils.extract_page_content(page) if page else ""
+
+    async def _gather(self, urls: List[str]) -> List[Dict]:
+        results = await asyncio.gather(*(self.fetch_content_async(url) for url in urls),
+                                       return_exceptions=True)
+
+        # Filter out exceptions and return successful results
+        valid_results = []
+        for result in results:
+            if isinstance(result, dict):
+                valid_results.append(result)
+            else:
+                print(f"Exception in fetch: {result}")
+        return valid_results
+
+    def fetch_multiple_contents(self, urls: List[str]) -> List[Dict]:
+        """Fetch and extract multiple URLs concurrently (blocking)"""
+        loop = self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(
+            self._for_request(metrics.current_request(), self._gather(urls)), loop
+        ).result()
+
     def process_search_results_parallel(self, search_results: Dict, max_results: int = 5) -> List[Dict]:
         """Process search results in parallel"""
         urls = []
-        titles = []
-        
+        titles = {}
+
         for idx, (title, link) in list(search_results.items())[:max_results]:
             urls.append(link)
-            titles.append(title)
-        
-        # Run async content fetching
+            titles[link] = title
+
         start_time = time.time()
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        try:
-            content_results = loop.run_until_complete(self.fetch_multiple_contents(urls))
-        finally:
-            loop.close()
-        
+        content_results = self.fetch_multiple_contents(urls)
         end_time = time.time()
         print(f"Parallel processing completed in {end_time - start_time:.2f} seconds")
-        
+
         # Combine with titles and filter successful results
         combined_results = []
-        for i, content_result in enumerate(content_results):
+        for content_result in content_results:
             if content_result['success'] and content_result['word_count'] > 50:
                 combined_results.append({
-                    'title': titles[i] if i < len(titles) else 'Unknown',
+                    'title': titles.get(content_result['url'], 'Unknown'),
                     'url': content_result['url'],
                     'content': content_result['content'],
                     'word_count': content_result['word_count']
                 })
-        
+
         return combined_results
 
+    def stats(self) -> Dict:
+        return {
+            'running': self._loop is not None,
+            'max_connections': self.max_workers,
+            'per_host_limit': self.per_host,
+            'hosts_active': len(self._host_limits),
+            **self._stats
+        }
+
+# Process-wide engine used when CONFIG['fetch_mode'] is 'async'
+engine = ParallelContentProcessor()
+atexit.register(engine.close)
+
 # Usage example function
-def get_enhanced_search_results(query: str, num_pages: int, API_KEY: str, 
+def get_enhanced_search_results(query: str, num_pages: int, API_KEY: str,
                               SEARCH_ENGINE_ID: str, max_results: int = 5) -> List[Dict]:
     """Complete enhanced search with parallel processing"""
     from cse import cse
-    
+
     # Get search results
     search_results = cse(query, num_pages, API_KEY, SEARCH_ENGINE_ID)
-    
+
     # Process content in parallel
-    processor = ParallelContentProcessor(max_workers=3)
-    content_results = processor.process_search_results_parallel(search_results, max_results)
-    
-    return content_results
\ No newline at end of file
+    content_results = engine.process_search_results_parallel(search_results, max_results)
+
+    return content_results
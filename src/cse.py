@@ -1,80 +1,353 @@
+import contextvars
 import json
+import os
+import sqlite3
+import uuid
 import requests
 import time
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional, Tuple
+import cache
+import http_client
+import metrics
+import rate_limit
+
+class Reservation:
+    """Quota units set aside for one caller; unused units go back on release"""
+    def __init__(self, reservation_id: str, granted: int):
+        self.id = reservation_id
+        self.granted = granted
+        self.used = 0
+        self.claimed = 0
+
+    @property
+    def remaining(self) -> int:
+        return self.granted - self.used - self.claimed
+
+    def claim(self) -> bool:
+        """Earmark one unit for a request that is about to be sent"""
+        if self.remaining < 1:
+            return False
+        self.claimed += 1
+        return True
+
+    def unclaim(self):
+        """Give back an earmarked unit whose request never reached Google"""
+        self.claimed = max(0, self.claimed - 1)
 
 class QuotaManager:
-    """Manages API quota to prevent exceeding limits"""
-    def __init__(self, daily_limit=100):
+    """Manages API quota to prevent exceeding limits.
+
+    Usage is kept in a SQLite ledger shared by every thread and worker process,
+    so restarts and multi-worker servers all see the same daily figure. Callers
+    can reserve units up front, commit them as requests succeed and release
+    whatever they did not use.
+    """
+    def __init__(self, daily_limit=100, path=None, reservation_ttl=300):
         self.daily_limit = daily_limit
-        self.requests_today = 0
-        self.last_reset_date = datetime.now().date()
-    
+        self.path = path or os.getenv("QUOTA_DB", os.path.join(cache.CACHE_DIR, 'quota.sqlite3'))
+        # Reservations older than this are treated as abandoned (e.g. a crashed worker)
+        self.reservation_ttl = reservation_ttl
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._transaction() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS usage (day TEXT PRIMARY KEY, used INTEGER NOT NULL)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS reservations (
+                    id TEXT PRIMARY KEY,
+                    day TEXT NOT NULL,
+                    units INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, making read-check-write atomic across processes
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _today() -> str:
+        return datetime.now().date().isoformat()
+
+    def _state(self, conn) -> Tuple[int, int]:
+        """(used, reserved) for today, dropping stale rows along the way"""
+        today = self._today()
+        conn.execute("DELETE FROM usage WHERE day < ?", (today,))
+        conn.execute(
+            "DELETE FROM reservations WHERE day < ? OR created_at < ?",
+            (today, time.time() - self.reservation_ttl)
+        )
+        row = conn.execute("SELECT used FROM usage WHERE day = ?", (today,)).fetchone()
+        reserved = conn.execute(
+            "SELECT COALESCE(SUM(units), 0) FROM reservations WHERE day = ?", (today,)
+        ).fetchone()[0]
+        return (row[0] if row else 0), reserved
+
+    def _add_usage(self, conn, units: int):
+        conn.execute(
+            "INSERT INTO usage (day, used) VALUES (?, ?) "
+            "ON CONFLICT(day) DO UPDATE SET used = used + excluded.used",
+            (self._today(), units)
+        )
+
     def check_quota(self):
         """Check if we have quota remaining"""
-        current_date = datetime.now().date()
-        if current_date > self.last_reset_date:
-            self.requests_today = 0
-            self.last_reset_date = current_date
-        
-        return self.requests_today < self.daily_limit
-    
+        return self.get_remaining() > 0
+
+    def reserve(self, units: int) -> Reservation:
+        """Atomically set aside up to `units` requests; granted may be fewer (or zero)"""
+        with self._transaction() as conn:
+            used, reserved = self._state(conn)
+            granted = max(0, min(units, self.daily_limit - used - reserved))
+            reservation = Reservation(uuid.uuid4().hex, granted)
+            if granted:
+                conn.execute(
+                    "INSERT INTO reservations (id, day, units, created_at) VALUES (?, ?, ?, ?)",
+                    (reservation.id, self._today(), granted, time.time())
+                )
+        return reservation
+
+    def commit(self, reservation: Reservation, units: int = 1):
+        """Turn reserved units into recorded usage"""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE reservations SET units = MAX(0, units - ?) WHERE id = ?",
+                (units, reservation.id)
+            )
+            self._add_usage(conn, units)
+        reservation.claimed = max(0, reservation.claimed - units)
+        reservation.used += units
+
+    def release(self, reservation: Reservation):
+        """Return any units the reservation did not commit"""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM reservations WHERE id = ?", (reservation.id,))
+        reservation.granted = reservation.used
+
     def increment_usage(self):
         """Increment usage counter"""
-        self.requests_today += 1
-    
+        with self._transaction() as conn:
+            self._add_usage(conn, 1)
+
     def get_remaining(self):
-        """Get remaining quota"""
-        return max(0, self.daily_limit - self.requests_today)
+        """Get remaining quota, not counting units other callers have reserved"""
+        with self._transaction() as conn:
+            used, reserved = self._state(conn)
+        return max(0, self.daily_limit - used - reserved)
+
+    def get_status(self) -> dict:
+        with self._transaction() as conn:
+            used, reserved = self._state(conn)
+        return {
+            'remaining': max(0, self.daily_limit - used - reserved),
+            'used_today': used,
+            'reserved': reserved,
+            'daily_limit': self.daily_limit,
+            'reset_date': self._today()
+        }
 
 # Global quota manager instance
-quota_manager = QuotaManager()
+quota_manager = QuotaManager(daily_limit=int(os.getenv("CSE_DAILY_LIMIT", 100)))
 
-def cse(query: str, num_pages: int, API_KEY: str, SEARCH_ENGINE_ID: str) -> dict:
-    """Enhanced CSE with quota management and better error handling"""
-    results = {}
-    
-    # Check quota before making any requests
-    if not quota_manager.check_quota():
-        raise Exception(f"Daily quota exceeded ({quota_manager.daily_limit} requests/day). Remaining: 0")
-    
+# Result pages cached by (query, start offset); a hit costs no network call and no quota
+page_cache = cache.DiskCache(
+    'cse_pages',
+    ttl=int(os.getenv("CSE_CACHE_TTL", 24 * 3600)),
+    max_entries=int(os.getenv("CSE_CACHE_MAX_ENTRIES", 2000))
+)
+
+# Custom Search JSON API; pointed at a local fake by the offline benchmarks
+CSE_ENDPOINT = os.getenv("CSE_ENDPOINT", "https://www.googleapis.com/customsearch/v1")
+
+# Google CSE allows roughly 100 requests/minute per project; pace and parallelize pages to match
+CSE_REQUESTS_PER_SECOND = float(os.getenv("CSE_REQUESTS_PER_SECOND", 1.5))
+CSE_BURST = float(os.getenv("CSE_BURST", 3))
+CSE_MAX_RETRY_WAIT = float(os.getenv("CSE_MAX_RETRY_WAIT", 10))
+CSE_PAGE_DEADLINE = float(os.getenv("CSE_PAGE_DEADLINE", 30))
+
+cse_limiter = rate_limit.TokenBucket(rate=CSE_REQUESTS_PER_SECOND, capacity=CSE_BURST)
+page_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("CSE_MAX_CONCURRENCY", 4)), thread_name_prefix="cse-page"
+)
+
+def _page_cache_key(query: str, start: int, SEARCH_ENGINE_ID: str) -> str:
+    return cache.DiskCache.make_key(query, start, SEARCH_ENGINE_ID)
+
+def uncached_pages(query: str, num_pages: int, SEARCH_ENGINE_ID: str) -> int:
+    """How many of the requested pages would need a network call (and a unit of quota)"""
+    missing = 0
     for i in range(num_pages):
-        page = i + 1
-        start = (page - 1) * 10 + 1
+        entry = page_cache.get_entry(_page_cache_key(query, i * 10 + 1, SEARCH_ENGINE_ID))
+        if entry is None or not entry['fresh']:
+            missing += 1
+    return missing
 
-        # Check quota before each request
-        if not quota_manager.check_quota():
-            print(f"⚠️ Quota exhausted after page {i}. Remaining quota: 0")
-            break
+def is_cached(query: str, num_pages: int, SEARCH_ENGINE_ID: str) -> bool:
+    """True if every requested page can be served from the cache without using quota"""
+    return uncached_pages(query, num_pages, SEARCH_ENGINE_ID) == 0
 
-        url = f"https://www.googleapis.com/customsearch/v1?key={API_KEY}&cx={SEARCH_ENGINE_ID}&q={query}&start={start}"
+class RateLimitError(Exception):
+    """Google asked us to back off for longer than we are willing to wait"""
+    pass
+
+def _fetch_page(query: str, start: int, API_KEY: str, SEARCH_ENGINE_ID: str, page_stats: dict) -> dict:
+    """Request one result page from the API, pacing requests through the shared limiter.
+    
+    A 429 pauses the limiter for the server's Retry-After (or an exponential
+    default), so every concurrent page backs off together; if the server asks
+    for more than CSE_MAX_RETRY_WAIT seconds the page fails instead of waiting.
+    """
+    url = f"{CSE_ENDPOINT}?key={API_KEY}&cx={SEARCH_ENGINE_ID}&q={query}&start={start}"
+    deadline = time.monotonic() + CSE_PAGE_DEADLINE
 
+    max_retries = 3
+    for attempt in range(max_retries):
+        if not cse_limiter.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            raise RateLimitError(f"429 rate limit: no request slot for start={start} within {CSE_PAGE_DEADLINE}s")
+        
         try:
-            # Add exponential backoff for rate limiting
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    response = requests.get(url, timeout=15)
-                    
-                    # Handle rate limiting specifically
-                    if response.status_code == 429:
-                        wait_time = (2 ** attempt) * 2  # Exponential backoff: 2, 4, 8 seconds
-                        print(f"⏳ Rate limited (429). Waiting {wait_time}s before retry {attempt + 1}/{max_retries}")
-                        time.sleep(wait_time)
-                        continue
-                    
-                    response.raise_for_status()
-                    break
-                    
-                except requests.exceptions.RequestException as e:
-                    if attempt == max_retries - 1:
-                        raise e
-                    time.sleep(1)
+            response = http_client.get(url, timeout=15)
+        except requests.exceptions.RequestException:
+            if attempt == max_retries - 1:
+                raise
+            page_stats['retries'] += 1
+            continue
+        
+        # Handle rate limiting specifically
+        if response.status_code == 429:
+            wait_time = rate_limit.parse_retry_after(response.headers.get('Retry-After'), (2 ** attempt) * 2)
+            page_stats['retries'] += 1
+            if attempt == max_retries - 1 or wait_time > CSE_MAX_RETRY_WAIT:
+                raise RateLimitError(f"429 rate limited by Google CSE (Retry-After: {wait_time:.0f}s)")
+            print(f"⏳ Rate limited (429). Pausing CSE requests {wait_time:.1f}s before retry {attempt + 1}/{max_retries}")
+            cse_limiter.pause_until(time.monotonic() + wait_time)
+            continue
+        
+        response.raise_for_status()
+        try:
+            return response.json()
+        except ValueError:
+            # Google answered (and counted the request), just not with JSON: an error page, a captive portal
+            page_stats['error'] = 'invalid_json'
+            return {'error': f"non-JSON response ({response.headers.get('Content-Type', 'unknown type')})"}
+
+def _timed_fetch(query: str, start: int, API_KEY: str, SEARCH_ENGINE_ID: str, page_stats: dict) -> dict:
+    started = time.monotonic()
+    try:
+        with metrics.span('cse_page'):
+            return _fetch_page(query, start, API_KEY, SEARCH_ENGINE_ID, page_stats)
+    except Exception as e:
+        page_stats['error'] = type(e).__name__
+        raise
+    finally:
+        page_stats['latency_ms'] = round((time.monotonic() - started) * 1000, 1)
+        metrics.count_retry('cse_page', page_stats['retries'])
+
+def _parse_items(data: list, start: int, results: dict):
+    for idx, item in enumerate(data, start=1):
+        title = item.get("title", "No title")
+        link = item.get("link", "No link")
+        
+        # Clean YouTube titles and URLs
+        if 'youtube.com' in link:
+            # Remove " - YouTube" from titles
+            title = title.replace(" - YouTube", "")
+            # Ensure clean YouTube URL
+            if 'youtube.com/watch' in link:
+                video_id = None
+                if 'v=' in link:
+                    video_id = link.split('v=')[1].split('&')[0]
+                    link = f"https://www.youtube.com/watch?v={video_id}"
+        
+        results[int(idx+start-1)] = [title, link]
+
+def cse(query: str, num_pages: int, API_KEY: str, SEARCH_ENGINE_ID: str,
+        reservation: Optional[Reservation] = None, stats: Optional[dict] = None) -> dict:
+    """Enhanced CSE with quota management and better error handling
+    
+    Network pages draw on `reservation` when one is passed (see
+    QuotaManager.reserve); otherwise each page reserves its own unit.
+    Cache hits never touch the quota. Uncached pages are requested
+    concurrently through the shared token bucket. If `stats` is given,
+    stats['cse_pages'] receives per-page source, latency and retry counts,
+    plus an 'error' for pages that failed.
+    """
+    results = {}
+    page_stats = []
+    responses = {}
+    pending = {}
+    own_reservations = []
+    
+    try:
+        # Serve what we can from the cache and secure quota for the rest
+        for i in range(num_pages):
+            page = i + 1
+            start = (page - 1) * 10 + 1
+            info = {'page': page, 'start': start, 'source': 'cache', 'latency_ms': 0.0, 'retries': 0}
             
-            # Increment quota counter for successful request
-            quota_manager.increment_usage()
+            response_json = page_cache.get(_page_cache_key(query, start, SEARCH_ENGINE_ID))
+            if response_json is not None:
+                print(f"⚡ CSE cache hit for page {page}")
+                responses[page] = response_json
+                page_stats.append(info)
+                continue
+            
+            if reservation is not None and reservation.remaining > 0:
+                page_reservation = reservation
+            else:
+                page_reservation = quota_manager.reserve(1)
+                own_reservations.append(page_reservation)
+            if not page_reservation.claim():
+                print(f"⚠️ Quota exhausted before page {page}. Remaining quota: 0")
+                break
+            
+            info['source'] = 'network'
+            page_stats.append(info)
+            # Run in a copy of the caller's context so page timings land in its request breakdown
+            pending[page] = (page_reservation, page_executor.submit(
+                contextvars.copy_context().run, _timed_fetch, query, start, API_KEY, SEARCH_ENGINE_ID, info
+            ))
+        
+        if not responses and not pending:
+            raise Exception(f"Daily quota exceeded ({quota_manager.daily_limit} requests/day). Remaining: 0")
+        
+        for page, (page_reservation, future) in pending.items():
+            try:
+                response_json = future.result()
+            except Exception as e:
+                page_reservation.unclaim()
+                responses[page] = e
+                continue
             
-            response_json = response.json()
+            # Count the page against the quota once Google has answered
+            quota_manager.commit(page_reservation)
+            responses[page] = response_json
+    finally:
+        for page_reservation in own_reservations:
+            quota_manager.release(page_reservation)
+        if stats is not None:
+            stats['cse_pages'] = page_stats
+    
+    for page in sorted(responses):
+        start = (page - 1) * 10 + 1
+        response_json = responses[page]
+        
+        try:
+            if isinstance(response_json, Exception):
+                raise response_json
             
             # Check for API errors
             if 'error' in response_json:
@@ -84,6 +357,8 @@ def cse(query: str, num_pages: int, API_KEY: str, SEARCH_ENGINE_ID: str) -> dict
                 print(f"API Error on page {page}: {error_info}")
                 continue
             
+            page_cache.set(_page_cache_key(query, start, SEARCH_ENGINE_ID), response_json)
+            
             # Get items safely
             data = response_json.get("items")
             
@@ -91,27 +366,11 @@ def cse(query: str, num_pages: int, API_KEY: str, SEARCH_ENGINE_ID: str) -> dict
                 print(f"No results found for page {page}")
                 continue
 
-            for idx, item in enumerate(data, start=1):
-                title = item.get("title", "No title")
-                link = item.get("link", "No link")
-                
-                # Clean YouTube titles and URLs
-                if 'youtube.com' in link:
-                    # Remove " - YouTube" from titles
-                    title = title.replace(" - YouTube", "")
-                    # Ensure clean YouTube URL
-                    if 'youtube.com/watch' in link:
-                        video_id = None
-                        if 'v=' in link:
-                            video_id = link.split('v=')[1].split('&')[0]
-                            link = f"https://www.youtube.com/watch?v={video_id}"
-                
-                results[int(idx+start-1)] = [title, link]
-                
-            # Add delay between requests to be respectful
-            if i < num_pages - 1:  # Don't sleep after last page
-                time.sleep(0.5)
+            _parse_items(data, start, results)
             
+        except RateLimitError as e:
+            print(f"⚠️ Rate limiting detected: {e}")
+            raise Exception(f"Rate limit exceeded: {e}")
         except requests.exceptions.RequestException as e:
             if "429" in str(e):
                 print(f"⚠️ Rate limiting detected: {e}")
@@ -133,9 +392,6 @@ def cse(query: str, num_pages: int, API_KEY: str, SEARCH_ENGINE_ID: str) -> dict
 
 def get_quota_status():
     """Get current quota status"""
-    return {
-        'remaining': quota_manager.get_remaining(),
-        'used_today': quota_manager.requests_today,
-        'daily_limit': quota_manager.daily_limit,
-        'reset_date': quota_manager.last_reset_date.isoformat()
-    }
\ No newline at end of file
+    status = quota_manager.get_status()
+    status['cache'] = page_cache.stats()
+    return status
\ No newline at end of file
@@ -0,0 +1,36 @@
+import os
+from typing import FrozenSet, Optional
+
+from passage_ranker import tokenize
+
+# Share of the shorter document's shingles that must also be in the longer one for the two to count as copies
+DEDUP_CONTAINMENT = float(os.getenv("DEDUP_CONTAINMENT", 0.8))
+SHINGLE_SIZE = 3
+# Long PDFs are fingerprinted from their opening, which is where a landing page's text (title, abstract) comes from
+MAX_TOKENS = 10000
+
+def shingles(text: str) -> Optional[FrozenSet[int]]:
+    """Hashed word 3-shingles of a document; None if it has too few words.
+
+    Words are stemmed with stop words dropped (as for passage ranking), so
+    copies that differ in markup, punctuation or inflection share shingles.
+    The hashes are only compared within one process.
+    """
+    tokens = tokenize(text)[:MAX_TOKENS]
+    if len(tokens) < SHINGLE_SIZE:
+        return None
+    return frozenset(hash(tuple(tokens[i:i + SHINGLE_SIZE])) for i in range(len(tokens) - SHINGLE_SIZE + 1))
+
+def containment(left: FrozenSet[int], right: FrozenSet[int]) -> float:
+    """Share of the smaller shingle set found in the larger one"""
+    smaller, larger = sorted((left, right), key=len)
+    if not smaller:
+        return 0.0
+    return len(smaller & larger) / len(smaller)
+
+def near_duplicate(left: Optional[FrozenSet[int]], right: Optional[FrozenSet[int]],
+                   threshold: float = DEDUP_CONTAINMENT) -> bool:
+    """True if one document is (nearly) contained in the other: a mirror, a wrapped copy, a landing page of a PDF"""
+    if left is None or right is None or threshold <= 0:
+        return False
+    return containment(left, right) >= threshold
@@ -0,0 +1,276 @@
+import contextvars
+import itertools
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional, Union
+
+import metrics
+import rate_limit
+
+# Lower numbers are dispatched first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+# Share of each model's per-minute budget background calls may fill, leaving the rest for interactive searches
+BACKGROUND_SHARE = float(os.getenv("GROQ_BACKGROUND_SHARE", 0.7))
+
+# Free-tier limits as (requests per minute, tokens per minute); override with GROQ_LIMITS
+DEFAULT_LIMITS = {
+    'llama-3.1-8b-instant': (30, 6000),
+    'deepseek-r1-distill-llama-70b': (30, 6000),
+}
+FALLBACK_LIMITS = (30, 6000)
+
+class Priority:
+    """A priority shared by several calls that can be raised while they are queued.
+
+    Used when an interactive search joins a background one already in
+    flight: raising the flight's priority moves its queued and future Groq
+    calls ahead, instead of the interactive caller waiting behind the job
+    queue.
+    """
+    def __init__(self, value: int):
+        self.value = value
+
+def _level(priority: Union[int, Priority]) -> int:
+    return priority.value if isinstance(priority, Priority) else priority
+
+_priority = contextvars.ContextVar('groq_priority', default=PRIORITY_INTERACTIVE)
+
+@contextmanager
+def use_priority(priority: Union[int, Priority]):
+    """Run Groq calls made in this context (and pipeline threads it spawns) at `priority`"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def current_priority() -> int:
+    """Priority level of Groq calls made in this context"""
+    return _level(_priority.get())
+
+def _parse_limits(spec: Optional[str]) -> dict:
+    """Parse 'model=rpm:tpm,model=rpm:tpm' into {model: (rpm, tpm)}"""
+    limits = dict(DEFAULT_LIMITS)
+    for part in (spec or '').split(','):
+        if '=' not in part:
+            continue
+        model, values = part.split('=', 1)
+        rpm, tpm = values.split(':')
+        limits[model.strip()] = (int(rpm), int(tpm))
+    return limits
+
+def _parse_duration(value: Optional[str]) -> Optional[float]:
+    """Groq reset headers look like '7.66s', '2m59.56s' or '120ms'"""
+    if not value:
+        return None
+    total = 0.0
+    matched = False
+    for amount, unit in re.findall(r'([\d.]+)(ms|h|m|s)', value):
+        matched = True
+        total += float(amount) * {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}[unit]
+    return total if matched else None
+
+def estimate_tokens(kwargs: dict) -> int:
+    """Rough prompt + completion token count used until the response reports real usage"""
+    chars = sum(len(str(message.get('content', ''))) for message in kwargs.get('messages', []))
+    return chars // 4 + int(kwargs.get('max_tokens') or 1024)
+
+class _ModelBudget:
+    """Sliding one-minute window of requests and tokens for one model"""
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.window = deque()  # [dispatched_at, tokens] per request
+        self.blocked_until = 0.0
+        self.waiting = 0
+        self.dispatched = 0
+        self.throttled = 0
+        self.rate_limited = 0
+
+    def _trim(self, now: float):
+        while self.window and self.window[0][0] <= now - 60:
+            self.window.popleft()
+
+    def wait_time(self, tokens: int, now: float, share: float = 1.0) -> float:
+        """Seconds until a request of `tokens` fits in `share` of the budget (0 if it fits now)"""
+        self._trim(now)
+        wait = max(0.0, self.blocked_until - now)
+        rpm = max(1, int(self.rpm * share))
+        tpm = self.tpm * share
+
+        if len(self.window) >= rpm:
+            wait = max(wait, self.window[len(self.window) - rpm][0] + 60 - now)
+
+        used = sum(entry[1] for entry in self.window)
+        if self.window and used + tokens > tpm:
+            # Wait for enough of the oldest requests to age out of the window
+            freed = 0
+            for dispatched_at, spent in self.window:
+                freed += spent
+                if used - freed + tokens <= tpm:
+                    wait = max(wait, dispatched_at + 60 - now)
+                    break
+            else:
+                wait = max(wait, self.window[-1][0] + 60 - now)
+        return wait
+
+    def stats(self, now: float) -> dict:
+        self._trim(now)
+        return {
+            'rpm_limit': self.rpm,
+            'tpm_limit': self.tpm,
+            'requests_last_minute': len(self.window),
+            'tokens_last_minute': sum(entry[1] for entry in self.window),
+            'waiting': self.waiting,
+            'dispatched': self.dispatched,
+            'throttled': self.throttled,
+            'rate_limited': self.rate_limited,
+            'blocked_for': round(max(0.0, self.blocked_until - now), 2)
+        }
+
+class GroqScheduler:
+    """Single gate for every Groq chat completion in the process.
+
+    Calls are queued per model and dispatched as soon as the model's
+    requests-per-minute and tokens-per-minute budgets allow, highest priority
+    (lowest number) first; background calls only fill BACKGROUND_SHARE of
+    the budgets, so an interactive search never waits for a whole minute of
+    background work to age out. Budgets are refined from response usage and Groq's
+    x-ratelimit-* headers, and 429s pause the model for their retry-after.
+    """
+    def __init__(self, limits: Optional[dict] = None, max_retries: int = 3):
+        self.limits = limits or dict(DEFAULT_LIMITS)
+        self.max_retries = max_retries
+        self._budgets = {}
+        self._queue = []  # (priority, sequence, model) of waiting calls
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+
+    def _budget(self, model: str) -> _ModelBudget:
+        if model not in self._budgets:
+            self._budgets[model] = _ModelBudget(*self.limits.get(model, FALLBACK_LIMITS))
+        return self._budgets[model]
+
+    def _acquire(self, model: str, tokens: int, priority: Union[int, Priority]) -> list:
+        ticket = (priority, next(self._sequence), model)
+        with self._cond:
+            budget = self._budget(model)
+            self._queue.append(ticket)
+            budget.waiting += 1
+            throttled = False
+            try:
+                while True:
+                    now = time.monotonic()
+                    # A shared Priority may have been raised since the ticket was queued
+                    ahead = min((t for t in self._queue if t[2] == model), key=lambda t: (_level(t[0]), t[1]))
+                    share = BACKGROUND_SHARE if _level(priority) >= PRIORITY_BACKGROUND else 1.0
+                    wait = budget.wait_time(tokens, now, share) if ahead == ticket else None
+                    if wait == 0:
+                        entry = [now, tokens]
+                        budget.window.append(entry)
+                        budget.dispatched += 1
+                        return entry
+                    if not throttled and wait:
+                        throttled = True
+                        budget.throttled += 1
+                    # Either budget-bound (timed wait) or behind a higher-priority call (woken on dispatch)
+                    self._cond.wait(wait if wait else 1.0)
+            finally:
+                self._queue.remove(ticket)
+                budget.waiting -= 1
+                self._cond.notify_all()
+
+    def _update_from_headers(self, model: str, headers, tokens: int):
+        if not headers:
+            return
+        now = time.monotonic()
+        with self._cond:
+            budget = self._budget(model)
+            remaining_tokens = headers.get('x-ratelimit-remaining-tokens')
+            reset_tokens = _parse_duration(headers.get('x-ratelimit-reset-tokens'))
+            if remaining_tokens is not None and reset_tokens and int(float(remaining_tokens)) < tokens:
+                budget.blocked_until = max(budget.blocked_until, now + reset_tokens)
+
+            # Groq reports requests per day here; only act when the day's allowance is gone
+            remaining_requests = headers.get('x-ratelimit-remaining-requests')
+            reset_requests = _parse_duration(headers.get('x-ratelimit-reset-requests'))
+            if remaining_requests is not None and reset_requests and int(float(remaining_requests)) <= 0:
+                budget.blocked_until = max(budget.blocked_until, now + reset_requests)
+            self._cond.notify_all()
+
+    def _pause(self, model: str, seconds: float):
+        with self._cond:
+            budget = self._budget(model)
+            budget.rate_limited += 1
+            budget.blocked_until = max(budget.blocked_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def raise_priority(self, priority: Priority, level: int):
+        """Move calls made under `priority` up to `level` (no-op if they are already there)"""
+        with self._cond:
+            if level < priority.value:
+                priority.value = level
+                self._cond.notify_all()
+
+    def create(self, client: object, priority: Union[int, Priority, None] = None, **kwargs):
+        """Drop-in for client.chat.completions.create that waits for rate-limit budget"""
+        model = kwargs.get('model', '')
+        priority = _priority.get() if priority is None else priority
+        tokens = estimate_tokens(kwargs)
+
+        for attempt in range(self.max_retries):
+            waited = time.monotonic()
+            entry = self._acquire(model, tokens, priority)
+            metrics.observe('groq_wait', time.monotonic() - waited, model)
+            started = time.monotonic()
+            try:
+                completions = client.chat.completions
+                raw_api = getattr(completions, 'with_raw_response', None)
+                if raw_api is not None:
+                    raw = raw_api.create(**kwargs)
+                    headers = raw.headers
+                    completion = raw.parse()
+                else:
+                    headers = None
+                    completion = completions.create(**kwargs)
+            except Exception as e:
+                metrics.observe('groq_call', time.monotonic() - started, model)
+                status = getattr(e, 'status_code', None)
+                if status != 429 and "rate_limit_exceeded" not in str(e):
+                    metrics.count_error('groq_call')
+                    raise
+                response = getattr(e, 'response', None)
+                retry_after = rate_limit.parse_retry_after(
+                    response.headers.get('retry-after') if response is not None else None,
+                    2 ** (attempt + 1)
+                )
+                print(f"⏳ Groq rate limit on {model}. Holding its queue for {retry_after:.1f}s")
+                self._pause(model, retry_after)
+                if attempt == self.max_retries - 1:
+                    metrics.count_error('groq_call')
+                    raise
+                metrics.count_retry('groq_call')
+                continue
+
+            metrics.observe('groq_call', time.monotonic() - started, model)
+            usage = getattr(completion, 'usage', None)
+            actual = getattr(usage, 'total_tokens', None) if usage is not None else None
+            with self._cond:
+                if actual:
+                    entry[1] = actual
+                self._cond.notify_all()
+            self._update_from_headers(model, headers, tokens)
+            return completion
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._cond:
+            return {model: budget.stats(now) for model, budget in self._budgets.items()}
+
+# Process-wide scheduler shared by query optimization and summarization
+scheduler = GroqScheduler(limits=_parse_limits(os.getenv("GROQ_LIMITS")))
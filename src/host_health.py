@@ -0,0 +1,179 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, List, Optional, TypeVar
+from urllib.parse import urlparse
+
+# Timeout used when a host has no history yet
+DEFAULT_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", 15))
+# Adaptive timeout = clamp(p95 latency * multiplier + headroom, minimum, caller's default)
+TIMEOUT_MULTIPLIER = 3.0
+TIMEOUT_HEADROOM = 1.0
+MIN_TIMEOUT = float(os.getenv("HOST_MIN_TIMEOUT", 3))
+MIN_SAMPLES = 5
+LATENCY_SAMPLES = 50
+OUTCOME_WINDOW = 20
+
+# The breaker opens after this many failures in a row, or when half of the recent attempts failed
+BREAKER_FAILURES = int(os.getenv("HOST_BREAKER_FAILURES", 3))
+BREAKER_FAILURE_RATE = 0.5
+BREAKER_MIN_ATTEMPTS = 6
+HOST_COOLDOWN = float(os.getenv("HOST_COOLDOWN", 300))
+MAX_COOLDOWN = HOST_COOLDOWN * 8
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+T = TypeVar('T')
+
+def host_of(url: str) -> str:
+    return urlparse(url).netloc.lower()
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+class _Host:
+    def __init__(self):
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.outcomes = deque(maxlen=OUTCOME_WINDOW)  # True for success
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.skipped = 0
+        self.state = CLOSED
+        self.open_until = 0.0
+        self.cooldown = HOST_COOLDOWN
+        self.probing = False
+        self.probe_started = 0.0
+        self.last_error = None
+
+class HostHealth:
+    """Per-host latency and failure tracking with adaptive timeouts and circuit breakers.
+
+    Every download records its time to response headers and whether the host
+    failed (timeout, connection error, 5xx or 429). Timeouts for a host come
+    from its observed p95 latency once there are enough samples. A host that
+    keeps failing is skipped for a cool-down period; after it, one probe
+    request is let through, and its outcome closes the breaker or reopens it
+    with a doubled cool-down.
+    """
+    def __init__(self):
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _host(self, host: str) -> _Host:
+        if host not in self._hosts:
+            self._hosts[host] = _Host()
+        return self._hosts[host]
+
+    def timeout_for(self, url: str, default: float) -> float:
+        """Timeout for a request to url: derived from its latency history, never above default"""
+        with self._lock:
+            return self._timeout(self._hosts.get(host_of(url)), default)
+
+    @staticmethod
+    def _timeout(state: Optional[_Host], default: float) -> float:
+        if state is None or len(state.latencies) < MIN_SAMPLES:
+            return default
+        p95 = _percentile(sorted(state.latencies), 0.95)
+        return round(max(MIN_TIMEOUT, min(default, p95 * TIMEOUT_MULTIPLIER + TIMEOUT_HEADROOM)), 2)
+
+    def allow(self, url: str) -> bool:
+        """False while the host's breaker is open; lets a single probe through once it cools down"""
+        now = time.monotonic()
+        with self._lock:
+            state = self._host(host_of(url))
+            if state.state == CLOSED:
+                return True
+            if state.state == OPEN and now >= state.open_until:
+                state.state = HALF_OPEN
+                state.probing = False
+            # A probe whose outcome never got recorded stops blocking after a while
+            probe_stale = state.probing and now - state.probe_started > 2 * DEFAULT_TIMEOUT
+            if state.state == HALF_OPEN and (not state.probing or probe_stale):
+                state.probing = True
+                state.probe_started = now
+                return True
+            state.skipped += 1
+            return False
+
+    def is_open(self, url: str) -> bool:
+        with self._lock:
+            state = self._hosts.get(host_of(url))
+            return state is not None and state.state == OPEN and time.monotonic() < state.open_until
+
+    def record(self, url: str, latency: Optional[float], ok: bool, error: Optional[str] = None):
+        """Record one request outcome; latency is None when no response arrived"""
+        now = time.monotonic()
+        with self._lock:
+            state = self._host(host_of(url))
+            state.outcomes.append(ok)
+            if latency is not None:
+                state.latencies.append(latency)
+
+            if ok:
+                state.successes += 1
+                state.consecutive_failures = 0
+                if state.state != CLOSED:
+                    state.state = CLOSED
+                    state.cooldown = HOST_COOLDOWN
+                state.probing = False
+                return
+
+            state.failures += 1
+            state.consecutive_failures += 1
+            state.last_error = error
+            recent_failures = state.outcomes.count(False)
+            if state.state == HALF_OPEN:
+                # The probe failed: back off harder
+                state.cooldown = min(MAX_COOLDOWN, state.cooldown * 2)
+                self._open(state, url, now)
+            elif state.state == CLOSED and (
+                state.consecutive_failures >= BREAKER_FAILURES
+                or (len(state.outcomes) >= BREAKER_MIN_ATTEMPTS
+                    and recent_failures / len(state.outcomes) >= BREAKER_FAILURE_RATE)
+            ):
+                self._open(state, url, now)
+
+    def record_status(self, url: str, latency: float, status: int):
+        """Record a response; only 5xx and 429 count against the host"""
+        ok = status < 500 and status != 429
+        self.record(url, latency, ok, None if ok else f"HTTP {status}")
+
+    @staticmethod
+    def _open(state: _Host, url: str, now: float):
+        state.state = OPEN
+        state.open_until = now + state.cooldown
+        state.probing = False
+        print(f"🚧 Circuit open for {host_of(url)} for {state.cooldown:.0f}s ({state.last_error})")
+
+    def prefer_healthy(self, items: List[T], url_of: Callable[[T], str]) -> List[T]:
+        """Stable reorder that moves items on hosts with an open breaker to the end"""
+        return sorted(items, key=lambda item: self.is_open(url_of(item)))
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        hosts = {}
+        with self._lock:
+            for host, state in self._hosts.items():
+                latencies = sorted(state.latencies)
+                attempts = len(state.outcomes)
+                hosts[host] = {
+                    'state': state.state,
+                    'requests': state.successes + state.failures,
+                    'failures': state.failures,
+                    'recent_failure_rate': round(state.outcomes.count(False) / attempts, 3) if attempts else 0.0,
+                    'consecutive_failures': state.consecutive_failures,
+                    'skipped': state.skipped,
+                    'latency_p50': round(_percentile(latencies, 0.5), 3) if latencies else None,
+                    'latency_p90': round(_percentile(latencies, 0.9), 3) if latencies else None,
+                    'latency_p95': round(_percentile(latencies, 0.95), 3) if latencies else None,
+                    'open_for': round(max(0.0, state.open_until - now), 1) if state.state == OPEN else 0,
+                    'timeout': self._timeout(state, DEFAULT_TIMEOUT),
+                    'last_error': state.last_error
+                }
+        return hosts
+
+# Process-wide table shared by the requests and aiohttp download paths
+tracker = HostHealth()
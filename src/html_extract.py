@@ -0,0 +1,278 @@
+import codecs
+import re
+import xml.etree.ElementTree as ET
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Set, Union
+
+# lxml's C parser is several times faster than any pure-Python tree builder
+try:
+    import lxml.html
+    HAVE_LXML = True
+except ImportError:
+    HAVE_LXML = False
+
+try:
+    import charset_normalizer
+except ImportError:
+    charset_normalizer = None
+
+# Content that is never part of the article text
+STRIP_TAGS = {
+    'script', 'style', 'noscript', 'iframe', 'nav', 'footer', 'header', 'aside',
+    'form', 'button', 'select', 'svg', 'canvas', 'template', 'head', 'title', 'meta', 'link'
+}
+# Elements whose own text is scored as a paragraph
+PARAGRAPH_TAGS = {'p', 'pre', 'td', 'blockquote'}
+# A div or section without any of these children reads like a paragraph
+BLOCK_TAGS = {
+    'address', 'article', 'aside', 'blockquote', 'dl', 'div', 'fieldset', 'figure',
+    'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'main',
+    'nav', 'ol', 'p', 'pre', 'section', 'table', 'ul'
+}
+# Elements whose text must not run into the neighbouring text
+SEPARATOR_TAGS = BLOCK_TAGS | {'br', 'li', 'td', 'th', 'tr'}
+VOID_TAGS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta',
+    'param', 'source', 'track', 'wbr'
+}
+
+UNLIKELY = re.compile(
+    r'banner|breadcrumb|combx|comment|community|cookie|consent|disqus|extra|footer|'
+    r'header|legends|menu|modal|newsletter|pager|pagination|popup|related|remark|'
+    r'replies|rss|share|shoutbox|sidebar|skyscraper|social|sponsor|subscribe|'
+    r'supplemental|ad-break|agegate', re.I)
+MAYBE_CANDIDATE = re.compile(r'and|article|body|column|content|main|shadow', re.I)
+POSITIVE = re.compile(r'article|body|content|entry|hentry|main|page|post|text|blog|story', re.I)
+NEGATIVE = re.compile(
+    r'hidden|banner|combx|comment|com-|contact|foot|footer|footnote|masthead|media|meta|'
+    r'outbrain|promo|related|scroll|share|shoutbox|sidebar|skyscraper|sponsor|shopping|'
+    r'tags|tool|widget|social|nav|menu|advert', re.I)
+
+# Starting score of a container before its paragraphs are counted
+TAG_SCORES = {
+    'div': 5, 'article': 10, 'main': 5, 'section': 3, 'pre': 3, 'td': 3, 'blockquote': 3,
+    'address': -3, 'ol': -3, 'ul': -3, 'dl': -3, 'dd': -3, 'dt': -3, 'li': -3, 'form': -3,
+    'h1': -5, 'h2': -5, 'h3': -5, 'h4': -5, 'h5': -5, 'h6': -5, 'th': -5
+}
+
+MIN_PARAGRAPH_CHARS = 25
+# Below this many words the scorer probably picked the wrong block, so keep the whole body
+MIN_MAIN_WORDS = 100
+
+_META_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?\s*([a-zA-Z0-9_\-]+)', re.I)
+_HEADER_CHARSET = re.compile(r'charset=["\']?\s*([a-zA-Z0-9_\-]+)', re.I)
+_WHITESPACE = re.compile(r'\s+')
+
+def _valid_codec(name: Optional[str]) -> Optional[str]:
+    if not name:
+        return None
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+def decode_html(body: Union[bytes, str], content_type: str = '') -> str:
+    """Decode an HTML body using the Content-Type charset, then <meta charset>, then detection"""
+    if isinstance(body, str):
+        return body
+
+    if body.startswith(b'\xef\xbb\xbf'):
+        return body[3:].decode('utf-8', errors='replace')
+
+    header_match = _HEADER_CHARSET.search(content_type or '')
+    meta_match = _META_CHARSET.search(body[:4096])
+    for candidate in (header_match and header_match.group(1),
+                      meta_match and meta_match.group(1).decode('ascii', 'ignore')):
+        codec = _valid_codec(candidate)
+        if codec:
+            return body.decode(codec, errors='replace')
+
+    try:
+        return body.decode('utf-8')
+    except UnicodeDecodeError:
+        pass
+    if charset_normalizer is not None:
+        best = charset_normalizer.from_bytes(body[:65536]).best()
+        if best is not None:
+            return body.decode(best.encoding, errors='replace')
+    return body.decode('cp1252', errors='replace')
+
+class _TreeBuilder(HTMLParser):
+    """Minimal forgiving HTML -> ElementTree builder used when lxml is not installed"""
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = ET.Element('html')
+        self.stack = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'html':
+            return
+        element = ET.SubElement(self.stack[-1], tag, {k: v or '' for k, v in attrs})
+        if tag not in VOID_TAGS:
+            self.stack.append(element)
+
+    def handle_startendtag(self, tag, attrs):
+        ET.SubElement(self.stack[-1], tag, {k: v or '' for k, v in attrs})
+
+    def handle_endtag(self, tag):
+        # Close everything up to the matching open tag; stray end tags are ignored
+        for depth in range(len(self.stack) - 1, 0, -1):
+            if self.stack[depth].tag == tag:
+                del self.stack[depth:]
+                return
+
+    def handle_data(self, data):
+        parent = self.stack[-1]
+        if len(parent):
+            parent[-1].tail = (parent[-1].tail or '') + data
+        else:
+            parent.text = (parent.text or '') + data
+
+def parse_html(html: str) -> ET.Element:
+    """Parse into an ElementTree-compatible tree, with lxml when available"""
+    if HAVE_LXML:
+        try:
+            return lxml.html.document_fromstring(html)
+        except (ValueError, lxml.etree.ParserError):
+            # e.g. an XML encoding declaration inside a str document
+            return lxml.html.document_fromstring(html.encode('utf-8'))
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.root
+
+def _tag(element) -> str:
+    # lxml represents comments and processing instructions with non-string tags
+    return element.tag.lower() if isinstance(element.tag, str) else ''
+
+def _class_id(element) -> str:
+    return f"{element.get('class', '')} {element.get('id', '')}"
+
+def _is_unlikely(element) -> bool:
+    if _tag(element) in ('html', 'body', 'article', 'main'):
+        return False
+    names = _class_id(element)
+    return bool(UNLIKELY.search(names)) and not MAYBE_CANDIDATE.search(names)
+
+class _Document:
+    """Cleaned view of a parsed page: boilerplate subtrees are skipped, not removed"""
+    def __init__(self, root):
+        body = None
+        for element in root.iter():
+            if _tag(element) == 'body':
+                body = element
+                break
+        self.body = body if body is not None else root
+        self.parents: Dict[object, object] = {}
+        self.kept: List[object] = []
+        self.skipped: Set[object] = set()
+
+        stack = [self.body]
+        while stack:
+            element = stack.pop()
+            self.kept.append(element)
+            for child in reversed(list(element)):
+                self.parents[child] = element
+                tag = _tag(child)
+                if not tag or tag in STRIP_TAGS or _is_unlikely(child):
+                    self.skipped.add(child)
+                else:
+                    stack.append(child)
+        self.kept_set = set(self.kept)
+
+    def text(self, element) -> str:
+        """Text of element, leaving out skipped subtrees but keeping their tails"""
+        parts = []
+        stack = [element]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                parts.append(item)
+                continue
+            if item.text:
+                parts.append(item.text)
+            if _tag(item) in SEPARATOR_TAGS:
+                # Popped after the children, before this element's tail
+                stack.append(' ')
+            for child in reversed(list(item)):
+                if child.tail:
+                    stack.append(child.tail)
+                if child not in self.skipped:
+                    stack.append(child)
+        return _WHITESPACE.sub(' ', ''.join(parts)).strip()
+
+    def link_density(self, element) -> float:
+        total = len(self.text(element))
+        if not total:
+            return 0.0
+        link_chars = sum(len(self.text(link)) for link in element.iter()
+                         if _tag(link) == 'a' and link in self.kept_set)
+        return min(1.0, link_chars / total)
+
+def _initial_score(element) -> float:
+    score = TAG_SCORES.get(_tag(element), 0)
+    names = _class_id(element)
+    if POSITIVE.search(names):
+        score += 25
+    if NEGATIVE.search(names):
+        score -= 25
+    return score
+
+def _is_paragraph(element) -> bool:
+    tag = _tag(element)
+    if tag in PARAGRAPH_TAGS:
+        return True
+    return tag in ('div', 'section') and not any(_tag(child) in BLOCK_TAGS for child in element)
+
+def extract_main_text(html: Union[bytes, str], content_type: str = '') -> str:
+    """Readability-style main-content text of an HTML page.
+
+    Paragraph-like blocks score their parent (and half that for the
+    grandparent) by length and comma count; the best container, discounted
+    by link density, wins along with siblings that score nearly as well.
+    Falls back to all non-boilerplate body text when the winner is too short.
+    """
+    document = _Document(parse_html(decode_html(html, content_type)))
+
+    scores = {}
+    for element in document.kept:
+        if not _is_paragraph(element):
+            continue
+        text = document.text(element)
+        if len(text) < MIN_PARAGRAPH_CHARS:
+            continue
+        content_score = 1 + text.count(',') + min(len(text) // 100, 3)
+        parent = document.parents.get(element)
+        grandparent = document.parents.get(parent) if parent is not None else None
+        for ancestor, divisor in ((parent, 1), (grandparent, 2)):
+            if ancestor is None:
+                continue
+            if ancestor not in scores:
+                scores[ancestor] = _initial_score(ancestor)
+            scores[ancestor] += content_score / divisor
+
+    full_text = document.text(document.body)
+    if not scores:
+        return full_text
+
+    for candidate in scores:
+        scores[candidate] *= 1 - document.link_density(candidate)
+    top = max(scores, key=scores.get)
+
+    # Pull in siblings that are part of the same article (e.g. split content divs)
+    threshold = max(10.0, scores[top] * 0.2)
+    parent = document.parents.get(top)
+    siblings = [child for child in parent if child not in document.skipped] if parent is not None else [top]
+    parts = []
+    for sibling in siblings:
+        include = sibling is top or scores.get(sibling, float('-inf')) >= threshold
+        if not include and _tag(sibling) == 'p':
+            text = document.text(sibling)
+            include = len(text) > 80 and document.link_density(sibling) < 0.25
+        if include:
+            parts.append(document.text(sibling))
+
+    main_text = ' '.join(part for part in parts if part)
+    if len(main_text.split()) < MIN_MAIN_WORDS:
+        return full_text
+    return main_text
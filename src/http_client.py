@@ -0,0 +1,64 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+# Connection pool limits: how many hosts keep a pool, and keep-alive connections per host
+POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", 32))
+POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 10))
+DEFAULT_TIMEOUT = 15
+
+# One adapter (and so one urllib3 PoolManager) is shared by every thread's session,
+# so a connection opened by one request can be reused by any later one.
+_adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+_local = threading.local()
+_stats_lock = threading.Lock()
+_requests_by_host = {}
+
+def get_session() -> requests.Session:
+    """Return this thread's session; sessions are per thread but share one connection pool"""
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        session.mount('http://', _adapter)
+        session.mount('https://', _adapter)
+        _local.session = session
+    return session
+
+def get(url: str, timeout: float = DEFAULT_TIMEOUT, **kwargs) -> requests.Response:
+    """requests.get through the shared keep-alive pool"""
+    host = requests.utils.urlparse(url).netloc
+    with _stats_lock:
+        _requests_by_host[host] = _requests_by_host.get(host, 0) + 1
+    return get_session().get(url, timeout=timeout, **kwargs)
+
+def get_pool_stats() -> dict:
+    """Per-host connection reuse for the pools that are currently alive"""
+    hosts = {}
+    pools = _adapter.poolmanager.pools
+    for key in pools.keys():
+        pool = pools.get(key)
+        if pool is None:
+            continue
+        requests_made = pool.num_requests
+        connections_opened = pool.num_connections
+        hosts[f"{key.key_scheme}://{key.key_host}:{key.key_port}"] = {
+            'requests': requests_made,
+            'connections_opened': connections_opened,
+            'reused': max(0, requests_made - connections_opened),
+            # The pool queue is pre-filled with None placeholders for unopened slots
+            'idle_connections': sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0
+        }
+
+    with _stats_lock:
+        total_requests = sum(_requests_by_host.values())
+
+    total_opened = sum(h['connections_opened'] for h in hosts.values())
+    total_pooled = sum(h['requests'] for h in hosts.values())
+    return {
+        'pool_connections': POOL_CONNECTIONS,
+        'pool_maxsize': POOL_MAXSIZE,
+        'total_requests': total_requests,
+        'reuse_ratio': round(1 - total_opened / total_pooled, 3) if total_pooled else 0.0,
+        'hosts': hosts
+    }
@@ -0,0 +1,142 @@
+import queue
+import threading
+import time
+import uuid
+from typing import Callable, Optional
+
+# Final job status for each status a handler's result may carry; anything else is a failure
+RESULT_STATUSES = {'completed': 'completed', 'error': 'error'}
+
+class JobQueueFull(Exception):
+    """Raised when the job queue is at capacity and the caller should retry later"""
+    pass
+
+class JobManager:
+    """Runs searches as background jobs on a local thread pool with a bounded queue.
+
+    handler(query, on_event) does the actual work and returns the final
+    payload; the events it reports are folded into the job's partial results
+    so pollers can show progress before the job finishes.
+    """
+    def __init__(self, handler: Callable, workers: int = 2, max_queue: int = 20, retention: int = 3600):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.retention = retention
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _start_workers(self):
+        # Workers start on first use so importing the app does not spawn threads
+        if self._threads:
+            return
+        for worker_num in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{worker_num + 1}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, query: str) -> dict:
+        """Queue a query and return a snapshot of the new job; raises JobQueueFull under backpressure"""
+        job = {
+            'id': uuid.uuid4().hex,
+            'query': query,
+            'status': 'queued',
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'partial': {'results': [], 'youtube_videos': []},
+            'result': None,
+            'error': None
+        }
+
+        with self._lock:
+            self._prune()
+            self._start_workers()
+            try:
+                self._queue.put_nowait(job['id'])
+            except queue.Full:
+                raise JobQueueFull(f"Job queue is full ({self.max_queue} pending jobs)")
+            self._jobs[job['id']] = job
+            return self._snapshot(job)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._snapshot(job) if job else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            statuses = [job['status'] for job in self._jobs.values()]
+        return {
+            'workers': self.workers,
+            'queue_depth': self._queue.qsize(),
+            'max_queue': self.max_queue,
+            'queued': statuses.count('queued'),
+            'running': statuses.count('running'),
+            'completed': statuses.count('completed'),
+            'failed': statuses.count('error')
+        }
+
+    def _snapshot(self, job: dict) -> dict:
+        snapshot = dict(job)
+        snapshot['partial'] = {
+            key: list(value) if isinstance(value, list) else value
+            for key, value in job['partial'].items()
+        }
+        if job['status'] == 'queued':
+            # Position among jobs still waiting for a worker, 1-based
+            waiting = [j for j in self._jobs.values() if j['status'] == 'queued']
+            snapshot['queue_position'] = sorted(waiting, key=lambda j: j['created_at']).index(job) + 1
+        return snapshot
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job['finished_at'] and job['finished_at'] < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def _record_event(self, job: dict, event: str, data: dict):
+        with self._lock:
+            partial = job['partial']
+            if event == 'query':
+                partial.update(data)
+            elif event == 'search_results':
+                partial['search_results_found'] = data.get('count', 0)
+            elif event == 'summary':
+                partial['results'].append(dict(data['result'], index=data['index']))
+                partial['results'].sort(key=lambda r: r['index'])
+            elif event == 'videos':
+                partial['youtube_videos'] = data.get('youtube_videos', [])
+
+    def _worker(self):
+        while True:
+            job_id = self._queue.get()
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    continue
+                job['status'] = 'running'
+                job['started_at'] = time.time()
+
+            print(f"🧵 Job {job_id[:8]} started: {job['query'][:50]}")
+            try:
+                result = self.handler(job['query'], lambda event, data: self._record_event(job, event, data))
+                reported = result.get('status') if isinstance(result, dict) else None
+                with self._lock:
+                    job['result'] = result
+                    job['status'] = RESULT_STATUSES.get(reported, 'error')
+                    job['error'] = result.get('error') if isinstance(result, dict) else None
+                    if job['status'] == 'error' and not job['error']:
+                        job['error'] = f"Search ended with unexpected status {reported!r}"
+            except Exception as e:
+                print(f"❌ Job {job_id[:8]} failed: {e}")
+                with self._lock:
+                    job['status'] = 'error'
+                    job['error'] = str(e)
+            finally:
+                with self._lock:
+                    job['finished_at'] = time.time()
+            print(f"✅ Job {job_id[:8]} finished with status '{job['status']}'")
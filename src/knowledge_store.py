@@ -0,0 +1,262 @@
+import json
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import List, Optional, Union
+import cache
+from query_index import overlap, reversed_order
+from search_query import STOP_WORDS, direction_pairs, similarity_terms
+
+# A stored summary older than this is not used to answer a search without going to Google
+LIBRARY_MAX_AGE_DAYS = float(os.getenv("LIBRARY_MAX_AGE_DAYS", 30))
+# Queries with fewer content words than this are too vague to answer from the library
+LIBRARY_MIN_TERMS = 2
+# A stored document answers a search only if the query that found it is this close (Jaccard of stemmed terms)
+LIBRARY_QUERY_SIMILARITY = float(os.getenv("LIBRARY_QUERY_SIMILARITY", 0.9))
+# Columns that say what a document is about; body text mentions too many things in passing
+_TOPIC_COLUMNS = '{title summary_text query}'
+MAX_QUERY_TERMS = 12
+
+_WORD = re.compile(r"\w+")
+
+def query_terms(query: str) -> List[str]:
+    """Distinct lowercase content words of a query, in order"""
+    terms = []
+    for word in _WORD.findall(query.lower()):
+        if len(word) > 1 and word not in STOP_WORDS and word not in terms:
+            terms.append(word)
+    return terms[:MAX_QUERY_TERMS]
+
+def _match_expression(terms: List[str], operator: str) -> str:
+    # Quoting keeps FTS5 from reading words like AND/NOT/NEAR as syntax
+    return f' {operator} '.join(f'"{term}"' for term in terms)
+
+def summary_text(summary: Union[dict, str, None]) -> str:
+    """Plain text of a summary result, for the full-text index"""
+    if not summary:
+        return ''
+    if isinstance(summary, str):
+        return summary
+    parts = []
+    for value in summary.values():
+        if isinstance(value, list):
+            parts.extend(str(item) for item in value)
+        elif isinstance(value, str):
+            parts.append(value)
+    return ' '.join(parts)
+
+def _usable_summary(summary) -> bool:
+    return bool(summary) and not (isinstance(summary, dict) and 'error' in summary)
+
+class KnowledgeStore:
+    """Every document the pipeline extracted and summarized, with an FTS5 index.
+
+    Documents are keyed by URL; the latest fetch wins, but a failed
+    summarization never replaces a good stored summary. Title, text, summary
+    and the query that found the page are indexed (Porter-stemmed) so the
+    library can be searched, and strong matches can answer a search without
+    spending CSE quota or Groq calls. A summary keeps the query it was
+    written for and its own timestamp (summary_query, summary_at), since a
+    later fetch for another query does not re-summarize the page.
+    """
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("LIBRARY_DB", os.path.join(cache.CACHE_DIR, 'library.sqlite3'))
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    id INTEGER PRIMARY KEY,
+                    url TEXT NOT NULL UNIQUE,
+                    title TEXT,
+                    content TEXT NOT NULL,
+                    summary TEXT,
+                    summary_text TEXT,
+                    query TEXT,
+                    optimized_query TEXT,
+                    word_count INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    summary_query TEXT,
+                    summary_optimized_query TEXT,
+                    summary_at REAL
+                )
+            """)
+            # Libraries created before summaries carried their own query and timestamp
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(documents)")}
+            for column, kind in (('summary_query', 'TEXT'), ('summary_optimized_query', 'TEXT'), ('summary_at', 'REAL')):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE documents ADD COLUMN {column} {kind}")
+            # External-content index kept in step with the table by triggers
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+                    title, content, summary_text, query,
+                    content='documents', content_rowid='id', tokenize='porter unicode61'
+                )
+            """)
+            # The indexed query is the one the stored summary was written for (else the one that found the page).
+            # Triggers are recreated on open so libraries from before summary_query pick up the new definitions;
+            # their rows have no summary_query yet, so what is already indexed still matches.
+            indexed_query = "COALESCE({row}.summary_query, {row}.query)"
+            for trigger in ('documents_ai', 'documents_ad', 'documents_au'):
+                conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            conn.execute(f"""
+                CREATE TRIGGER documents_ai AFTER INSERT ON documents BEGIN
+                    INSERT INTO documents_fts (rowid, title, content, summary_text, query)
+                    VALUES (new.id, new.title, new.content, new.summary_text, {indexed_query.format(row='new')});
+                END
+            """)
+            conn.execute(f"""
+                CREATE TRIGGER documents_ad AFTER DELETE ON documents BEGIN
+                    INSERT INTO documents_fts (documents_fts, rowid, title, content, summary_text, query)
+                    VALUES ('delete', old.id, old.title, old.content, old.summary_text, {indexed_query.format(row='old')});
+                END
+            """)
+            conn.execute(f"""
+                CREATE TRIGGER documents_au AFTER UPDATE ON documents BEGIN
+                    INSERT INTO documents_fts (documents_fts, rowid, title, content, summary_text, query)
+                    VALUES ('delete', old.id, old.title, old.content, old.summary_text, {indexed_query.format(row='old')});
+                    INSERT INTO documents_fts (rowid, title, content, summary_text, query)
+                    VALUES (new.id, new.title, new.content, new.summary_text, {indexed_query.format(row='new')});
+                END
+            """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def save(self, url: str, title: str, content: str, query: str = '', optimized_query: str = '',
+             summary: Union[dict, str, None] = None):
+        """Insert or refresh a document; a missing or failed summary keeps the stored one.
+
+        The stored summary's query and timestamp only change together with
+        the summary itself.
+        """
+        if not _usable_summary(summary):
+            summary = None
+        now = time.time()
+        summarized = summary is not None
+        with self._connect() as conn:
+            conn.execute("""
+                INSERT INTO documents (url, title, content, summary, summary_text, query, optimized_query,
+                                       word_count, created_at, updated_at,
+                                       summary_query, summary_optimized_query, summary_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    title = excluded.title,
+                    content = excluded.content,
+                    summary = COALESCE(excluded.summary, summary),
+                    summary_text = COALESCE(excluded.summary_text, summary_text),
+                    query = excluded.query,
+                    optimized_query = excluded.optimized_query,
+                    word_count = excluded.word_count,
+                    updated_at = excluded.updated_at,
+                    summary_query = COALESCE(excluded.summary_query, summary_query),
+                    summary_optimized_query = COALESCE(excluded.summary_optimized_query, summary_optimized_query),
+                    summary_at = COALESCE(excluded.summary_at, summary_at)
+            """, (
+                url, title, content,
+                json.dumps(summary, ensure_ascii=False) if summarized else None,
+                summary_text(summary) if summarized else None,
+                query, optimized_query, len(content.split()), now, now,
+                query if summarized else None,
+                optimized_query if summarized else None,
+                now if summarized else None
+            ))
+
+    def save_summary(self, url: str, summary: Union[dict, str, None], query: str = '', optimized_query: str = ''):
+        """Attach a summary, and the query it was written for, to a stored document (ignored if it is an error result)"""
+        if not _usable_summary(summary):
+            return
+        with self._connect() as conn:
+            conn.execute("""
+                UPDATE documents
+                SET summary = ?, summary_text = ?, summary_query = ?, summary_optimized_query = ?, summary_at = ?
+                WHERE url = ?
+            """, (json.dumps(summary, ensure_ascii=False), summary_text(summary), query, optimized_query,
+                  time.time(), url))
+
+    @staticmethod
+    def _row(row: sqlite3.Row) -> dict:
+        document = dict(row)
+        document['summary'] = json.loads(document['summary']) if document['summary'] else None
+        document['score'] = round(-document.pop('rank'), 4)
+        return document
+
+    def _query(self, match: str, extra_where: str, params: tuple, limit: int, with_content: bool) -> List[dict]:
+        columns = "d.content, " if with_content else ""
+        with self._connect() as conn:
+            rows = conn.execute(f"""
+                SELECT d.url, d.title, {columns}d.summary, d.query, d.optimized_query, d.word_count, d.updated_at,
+                       d.summary_query, d.summary_optimized_query, d.summary_at,
+                       snippet(documents_fts, 1, '[', ']', ' … ', 24) AS snippet,
+                       bm25(documents_fts, 5.0, 1.0, 2.0, 3.0) AS rank
+                FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid
+                WHERE documents_fts MATCH ? {extra_where}
+                ORDER BY rank LIMIT ?
+            """, (match, *params, limit)).fetchall()
+        return [self._row(row) for row in rows]
+
+    def search(self, query: str, limit: int = 10) -> List[dict]:
+        """Best-ranked documents containing any of the query's words (BM25, title-weighted)"""
+        terms = query_terms(query)
+        if not terms:
+            return []
+        return self._query(_match_expression(terms, 'OR'), '', (), limit, with_content=False)
+
+    def strong_matches(self, query: str, limit: int, max_age_days: float = LIBRARY_MAX_AGE_DAYS,
+                       min_similarity: float = LIBRARY_QUERY_SIMILARITY) -> List[dict]:
+        """Documents with a recent summary written for essentially the same query.
+
+        Every content word must appear in the title, summary or originating
+        query (not just somewhere in the body), and the query the summary
+        was written for must reduce to nearly the same stemmed terms as this
+        one, so a search that merely shares words with a stored page is not
+        answered with that page's summary. Age counts from the summary, not
+        from the latest fetch.
+        """
+        terms = query_terms(query)
+        if len(terms) < LIBRARY_MIN_TERMS:
+            return []
+        wanted_terms = frozenset(similarity_terms(query))
+        wanted_pairs = direction_pairs(query)
+        candidates = self._query(
+            f"{_TOPIC_COLUMNS} : ({_match_expression(terms, 'AND')})",
+            "AND d.summary IS NOT NULL AND d.summary_at >= ?",
+            (time.time() - max_age_days * 86400,),
+            limit * 5,
+            with_content=True
+        )
+        matches = [
+            document for document in candidates
+            if overlap(wanted_terms, frozenset(similarity_terms(document['summary_query'] or ''))) >= min_similarity
+            and not reversed_order(wanted_pairs, direction_pairs(document['summary_query'] or ''))
+        ]
+        return matches[:limit]
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM documents")
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            documents, summarized, words = conn.execute(
+                "SELECT COUNT(*), COUNT(summary), COALESCE(SUM(word_count), 0) FROM documents"
+            ).fetchone()
+        return {
+            'documents': documents,
+            'summarized': summarized,
+            'words': words,
+            'bytes': os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        }
+
+# Process-wide library shared by the pipeline and /library/search
+library = KnowledgeStore()
@@ -26,7 +26,7 @@ print(f"Processing query: {user_defined_query}")
 # Output: optimized_query -> enhanced version of the user query with type str,
 # explanation -> short explanation of what the model does for the logs
 try:
-    optimized_query, explanation, search_intent = search_query.build_search_query(user_defined_query, groq_client)
+    optimized_query, explanation, search_intent = search_query.cached_build_search_query(user_defined_query, groq_client)
     print(f"\n✅ Query Optimization Successful:")
     print(f"Original query: {user_defined_query}")
     print(f"Optimized query: {optimized_query}")
@@ -106,12 +106,9 @@ try:
                 # Choose summarization strategy based on content length
                 if result['word_count'] > 2000:
                     # Use chunked summarization for large content
-                    print("📊 Using chunked summarization for large content...")
-                    summary_list = summarize_page_content.summary(
-                        result['content'], 2, groq_client
-                    )
-                    final_summary = summarize_page_content.summarize_html_content(
-                        ' '.join(summary_list), groq_client
+                    print("📊 Using map-reduce summarization for large content...")
+                    final_summary = summarize_page_content.map_reduce_summarize(
+                        result['content'], groq_client
                     )
                 else:
                     # Direct summarization for smaller content
@@ -0,0 +1,188 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+# Latency buckets in seconds: from cache hits and HTML parsing up to slow PDFs and Groq queues
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+class Counter:
+    """Monotonic count per label combination"""
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                yield f"{self.name}{_format_labels(self.labelnames, labels)} {value:g}"
+
+class Histogram:
+    """Cumulative-bucket latency histogram per label combination"""
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series: Dict[Tuple[str, ...], list] = {}  # labels -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                bounds = [f"{bound:g}" for bound in self.buckets] + ['+Inf']
+                for bound, bucket_count in zip(bounds, counts + [count]):
+                    label_text = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                    yield f"{self.name}_bucket{label_text} {bucket_count}"
+                yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total:.6f}"
+                yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}"
+
+# `kind` narrows a stage: html/pdf for fetch and extract, the model for Groq calls
+STAGE_SECONDS = Histogram(
+    'storyboard_stage_duration_seconds', 'Time spent in each pipeline stage', ('stage', 'kind')
+)
+ERRORS = Counter('storyboard_errors_total', 'Stage invocations that failed', ('stage',))
+RETRIES = Counter('storyboard_retries_total', 'Requests retried after a rate limit or transient error', ('stage',))
+REGISTRY = [STAGE_SECONDS, ERRORS, RETRIES]
+
+class RequestTimings:
+    """Per-search breakdown: time, call count and errors for every stage the search touched.
+
+    Stages that run concurrently (fetches, Groq calls) add up, so a stage's
+    total can exceed the wall-clock time of the request.
+    """
+    def __init__(self):
+        self._stages = {}
+        self._retries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(stage: str, kind: str) -> str:
+        return f"{stage}[{kind}]" if kind else stage
+
+    def _entry(self, key: str) -> dict:
+        if key not in self._stages:
+            self._stages[key] = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'errors': 0}
+        return self._stages[key]
+
+    def add(self, stage: str, kind: str, seconds: float):
+        with self._lock:
+            entry = self._entry(self._key(stage, kind))
+            entry['count'] += 1
+            entry['total_ms'] += seconds * 1000
+            entry['max_ms'] = max(entry['max_ms'], seconds * 1000)
+
+    def error(self, stage: str):
+        with self._lock:
+            self._entry(stage)['errors'] += 1
+
+    def retry(self, stage: str, amount: int):
+        with self._lock:
+            self._retries[stage] = self._retries.get(stage, 0) + amount
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stages = {
+                key: {**entry, 'total_ms': round(entry['total_ms'], 1), 'max_ms': round(entry['max_ms'], 1)}
+                for key, entry in self._stages.items()
+            }
+            if self._retries:
+                stages['retries'] = dict(self._retries)
+            return stages
+
+# The search the current thread or task is working for; pipeline threads inherit it
+_request = contextvars.ContextVar('metrics_request', default=None)
+
+@contextmanager
+def track_request():
+    """Collect a RequestTimings for every stage run in this context"""
+    timings = RequestTimings()
+    token = _request.set(timings)
+    try:
+        yield timings
+    finally:
+        _request.reset(token)
+
+def current_request() -> Optional[RequestTimings]:
+    return _request.get()
+
+def bind_request(timings: Optional[RequestTimings]):
+    """Attach work in this context (e.g. an asyncio task) to a search started elsewhere"""
+    _request.set(timings)
+
+def observe(stage: str, seconds: float, kind: str = ''):
+    STAGE_SECONDS.observe(seconds, stage, kind)
+    timings = _request.get()
+    if timings is not None:
+        timings.add(stage, kind, seconds)
+
+def count_error(stage: str):
+    ERRORS.inc(stage)
+    timings = _request.get()
+    if timings is not None:
+        timings.error(stage)
+
+def count_retry(stage: str, amount: int = 1):
+    if amount <= 0:
+        return
+    RETRIES.inc(stage, amount=amount)
+    timings = _request.get()
+    if timings is not None:
+        timings.retry(stage, amount)
+
+@contextmanager
+def span(stage: str, kind: str = ''):
+    """Time a block as `stage`; an exception counts as an error.
+
+    Yields a dict whose 'kind' can be filled in once it is known (e.g. after
+    a download reveals whether it was HTML or a PDF).
+    """
+    labels = {'kind': kind}
+    started = time.monotonic()
+    try:
+        yield labels
+    except BaseException:
+        count_error(stage)
+        raise
+    finally:
+        observe(stage, time.monotonic() - started, labels['kind'])
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,103 @@
+import math
+import re
+from collections import Counter
+from typing import Iterable, List
+
+from search_query import STOP_WORDS, stem_word as _stem
+
+# Extra filler words that are common in page text but not in queries
+_TEXT_STOP_WORDS = STOP_WORDS | {
+    'is', 'are', 'was', 'were', 'be', 'been', 'this', 'that', 'these', 'those',
+    'it', 'its', 'as', 'from', 'can', 'which', 'also', 'not', 'such', 'than'
+}
+
+# Search operators the optimizer adds that are not content words
+_OPERATOR = re.compile(r'(?:-?\w+:\S+)|(?:^|\s)-\S+|\bOR\b|\bAND\b')
+_WORD = re.compile(r"[a-z0-9][a-z0-9\-']*")
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased, lightly stemmed content words with stop words removed"""
+    return [_stem(word) for word in _WORD.findall(text.lower()) if word not in _TEXT_STOP_WORDS]
+
+def query_terms(queries: Iterable[str]) -> List[str]:
+    """Content words from the original and optimized queries, minus search operators"""
+    terms = []
+    for query in queries:
+        if not query:
+            continue
+        # intitle: wraps a real content word, so keep the word and drop the operator
+        cleaned = _OPERATOR.sub(' ', query.replace('intitle:', ' ')).replace('"', ' ')
+        for term in tokenize(cleaned):
+            if term not in terms:
+                terms.append(term)
+    return terms
+
+def split_passages(text: str, target_chars: int = 400) -> List[str]:
+    """Group consecutive sentences into passages of roughly target_chars"""
+    passages = []
+    current = ""
+    for sentence in _SENTENCE_END.split(text.strip()):
+        if current and len(current) + 1 + len(sentence) > target_chars:
+            passages.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        passages.append(current)
+    return passages
+
+def bm25_scores(passages: List[str], terms: List[str], k1: float = 1.5, b: float = 0.75) -> List[float]:
+    """Okapi BM25 score of every passage against the query terms"""
+    tokenized = [tokenize(passage) for passage in passages]
+    count = len(tokenized)
+    avg_length = sum(len(tokens) for tokens in tokenized) / count if count else 0
+    document_frequency = Counter(term for tokens in tokenized for term in set(tokens))
+
+    scores = []
+    for tokens in tokenized:
+        frequencies = Counter(tokens)
+        score = 0.0
+        for term in terms:
+            tf = frequencies.get(term, 0)
+            if not tf:
+                continue
+            df = document_frequency[term]
+            idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+            norm = tf + k1 * (1 - b + b * len(tokens) / (avg_length or 1))
+            score += idf * tf * (k1 + 1) / norm
+        scores.append(score)
+    return scores
+
+def select_passages(text: str, queries: Iterable[str], budget_chars: int) -> str:
+    """Keep the passages most relevant to the queries, in document order, within budget_chars.
+
+    Text that already fits is returned as is, and text with no passage
+    matching any query term falls back to its first budget_chars characters.
+    """
+    if len(text) <= budget_chars:
+        return text
+
+    terms = query_terms(queries)
+    passages = split_passages(text)
+    scores = bm25_scores(passages, terms) if terms else []
+    if not any(scores):
+        return text[:budget_chars]
+
+    ranked = sorted(range(len(passages)), key=lambda i: scores[i], reverse=True)
+    chosen = []
+    used = 0
+    for index in ranked:
+        if scores[index] <= 0:
+            break
+        length = len(passages[index]) + 1
+        if used + length > budget_chars:
+            continue
+        chosen.append(index)
+        used += length
+
+    if not chosen:
+        # Even the best passage is longer than the budget
+        return passages[ranked[0]][:budget_chars]
+
+    return ' '.join(passages[index] for index in sorted(chosen))
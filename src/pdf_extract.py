@@ -0,0 +1,243 @@
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Tuple, Union
+
+import PyPDF2
+import pdfplumber
+
+# Extraction limits: pages considered, words that are "enough" to summarize, and wall-clock budget
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", 30))
+PDF_TARGET_WORDS = int(os.getenv("PDF_TARGET_WORDS", 4000))
+PDF_TIME_BUDGET = float(os.getenv("PDF_TIME_BUDGET", 20))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+# One page per task, so a stop leaves at most a page per worker still running
+PDF_PAGES_PER_TASK = 1
+
+# A PyPDF2 page shorter than this, or mostly non-letters, is retried with pdfplumber
+POOR_PAGE_CHARS = 100
+POOR_PAGE_ALPHA_RATIO = 0.5
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Forking a threaded server can copy held locks into the workers; start them clean instead
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context(method))
+        return _pool
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    """Drop a broken pool (e.g. a worker was OOM-killed) so the next call starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _terminate_pool(pool: ProcessPoolExecutor):
+    """Discard a pool whose workers are still busy past the time budget and kill them, so they stop using CPU"""
+    processes = list((pool._processes or {}).values())
+    _discard_pool(pool)
+    for process in processes:
+        process.terminate()
+
+def _is_poor(text: str) -> bool:
+    stripped = text.strip()
+    if len(stripped) < POOR_PAGE_CHARS:
+        return True
+    letters = sum(1 for char in stripped if char.isalpha())
+    return letters / len(stripped) < POOR_PAGE_ALPHA_RATIO
+
+def _extract_pages(path: str, page_numbers: List[int]) -> List[Tuple[int, str, str]]:
+    """Worker task: PyPDF2 first, pdfplumber only for pages that come back poor.
+
+    Returns (page_number, text, method) for each requested page.
+    """
+    results = []
+    poor_pages = []
+    try:
+        reader = PyPDF2.PdfReader(path)
+    except Exception:
+        # Some PDFs only open in pdfplumber
+        reader = None
+
+    for page_num in page_numbers:
+        try:
+            text = reader.pages[page_num].extract_text() or "" if reader else ""
+        except Exception:
+            text = ""
+        if _is_poor(text):
+            poor_pages.append(page_num)
+        results.append([page_num, text, 'pypdf2'])
+
+    if poor_pages:
+        try:
+            with pdfplumber.open(path) as pdf:
+                for entry in results:
+                    if entry[0] in poor_pages and entry[0] < len(pdf.pages):
+                        better = pdf.pages[entry[0]].extract_text() or ""
+                        if len(better.strip()) > len(entry[1].strip()):
+                            entry[1] = better
+                            entry[2] = 'pdfplumber'
+        except Exception as e:
+            print(f"pdfplumber failed: {e}")
+
+    return [tuple(entry) for entry in results]
+
+def _page_count(path: str) -> int:
+    return len(PyPDF2.PdfReader(path).pages)
+
+def extract_pdf_text(pdf: Union[bytes, str], delete_after: bool = False) -> str:
+    """Extract text from PDF bytes or a PDF file path, page-parallel in a process pool.
+
+    Pages are handed out in small batches; extraction stops early once the
+    leading pages already hold PDF_TARGET_WORDS words, or when the
+    PDF_TIME_BUDGET runs out (workers still busy then are killed),
+    returning the contiguous run of pages from page 0 that finished.
+    If the pool breaks, it is replaced and the extraction retried once,
+    then done in-process under the same limits.
+    With delete_after the file at `pdf` is removed once no worker needs it.
+    """
+    temp_path = None
+    if isinstance(pdf, (bytes, bytearray)):
+        # Workers open the document by path instead of receiving the bytes
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as handle:
+            handle.write(pdf)
+            temp_path = handle.name
+        path = temp_path
+    else:
+        path = pdf
+        if delete_after:
+            temp_path = pdf
+
+    try:
+        try:
+            total_pages = min(PDF_MAX_PAGES, _page_count(path))
+        except Exception as e:
+            print(f"PyPDF2 failed: {e}")
+            try:
+                with pdfplumber.open(path) as document:
+                    total_pages = min(PDF_MAX_PAGES, len(document.pages))
+            except Exception as e:
+                print(f"pdfplumber failed: {e}")
+                return ""
+
+        batches = [list(range(start, min(start + PDF_PAGES_PER_TASK, total_pages)))
+                   for start in range(0, total_pages, PDF_PAGES_PER_TASK)]
+        pages = None
+        for attempt in range(2):
+            pool = _get_pool()
+            try:
+                pages, leftover = _extract_in_pool(pool, path, batches)
+            except BrokenProcessPool as e:
+                _discard_pool(pool)
+                next_step = "retrying with a new pool" if attempt == 0 else "extracting in-process"
+                print(f"PDF process pool broke ({e}); {next_step}")
+                continue
+            if temp_path and leftover:
+                # Batches already running after an early stop still read the file
+                _remove_when_done(temp_path, leftover)
+                temp_path = None
+            break
+        if pages is None:
+            pages = _extract_in_process(path, batches)
+
+        text = "\n".join(page for page in _leading_pages(pages) if page)
+        return re.sub(r'\s+', ' ', text).strip()
+    finally:
+        if temp_path:
+            os.unlink(temp_path)
+
+def _safe_extract(path: str, batch: List[int]) -> List[Tuple[int, str, str]]:
+    try:
+        return _extract_pages(path, batch)
+    except Exception as e:
+        print(f"PDF page extraction failed for pages {batch}: {e}")
+        # Empty pages rather than gaps, so the pages after them still count as leading
+        return [(page_num, "", 'failed') for page_num in batch]
+
+def _remove_when_done(path: str, futures: list):
+    remaining = {'count': len(futures)}
+    lock = threading.Lock()
+
+    def on_done(_):
+        with lock:
+            remaining['count'] -= 1
+            last = remaining['count'] == 0
+        if last:
+            os.unlink(path)
+
+    for future in futures:
+        future.add_done_callback(on_done)
+
+def _leading_pages(pages: dict) -> List[str]:
+    """Texts of the contiguous run of finished pages starting at page 0"""
+    leading = []
+    while len(leading) in pages:
+        leading.append(pages[len(leading)])
+    return leading
+
+def _leading_words(pages: dict) -> int:
+    return sum(len(page.split()) for page in _leading_pages(pages))
+
+def _extract_in_process(path: str, batches: List[List[int]]) -> dict:
+    """Fallback without the pool: one batch at a time, same word target and time budget"""
+    deadline = time.monotonic() + PDF_TIME_BUDGET
+    pages = {}
+    for batch in batches:
+        if time.monotonic() >= deadline:
+            print(f"⏰ PDF time budget ({PDF_TIME_BUDGET}s) spent after {len(pages)} pages")
+            break
+        for page_num, text, _ in _safe_extract(path, batch):
+            pages[page_num] = text
+        if _leading_words(pages) >= PDF_TARGET_WORDS:
+            print(f"✂️ Stopping PDF extraction early after {len(pages)} pages")
+            break
+    return pages
+
+def _extract_in_pool(pool: ProcessPoolExecutor, path: str, batches: List[List[int]]) -> Tuple[dict, list]:
+    """Run batches in the pool; returns finished pages and any batches still running"""
+    deadline = time.monotonic() + PDF_TIME_BUDGET
+    max_in_flight = PDF_WORKERS * 2
+    pages = {}
+    pending = {}
+    next_batch = 0
+    timed_out = False
+
+    while next_batch < len(batches) or pending:
+        # Keep a bounded number of batches queued so an early stop leaves little work behind
+        while next_batch < len(batches) and len(pending) < max_in_flight:
+            batch = batches[next_batch]
+            pending[pool.submit(_safe_extract, path, batch)] = batch
+            next_batch += 1
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            print(f"⏰ PDF time budget ({PDF_TIME_BUDGET}s) spent after {len(pages)} pages")
+            timed_out = True
+            break
+
+        done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            del pending[future]
+            for page_num, text, _ in future.result():
+                pages[page_num] = text
+
+        if _leading_words(pages) >= PDF_TARGET_WORDS:
+            print(f"✂️ Stopping PDF extraction early after {len(pages)} pages")
+            break
+
+    leftover = [future for future in pending if not future.cancel()]
+    if leftover and timed_out:
+        # Pages this slow would hold the workers well past the budget; the next call starts a fresh pool
+        _terminate_pool(pool)
+    return pages, leftover
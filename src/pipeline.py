@@ -0,0 +1,240 @@
+import contextvars
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# Marks the end of a stage's input; one is queued per downstream worker
+_DONE = object()
+
+class Stage:
+    """A single pipeline step backed by its own pool of worker threads.
+
+    Items reaching a non-cancellable stage are processed even after the run
+    is cancelled (e.g. work that was already accepted).
+    """
+    def __init__(self, name: str, func: Callable[[Any], Any], workers: int = 1, cancellable: bool = True):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.cancellable = cancellable
+
+class StagedPipeline:
+    """Runs items through a chain of stages connected by bounded queues.
+
+    Every stage has its own worker pool, so item 1 can be in the last stage
+    while items 2 and 3 are still in the first. A stage function returns the
+    value handed to the next stage, or None to drop the item. Results come
+    back in input order, with None for items that were dropped or failed.
+    """
+    def __init__(self, stages: List[Stage], queue_size: int = 8):
+        if not stages:
+            raise ValueError("StagedPipeline needs at least one stage")
+        self.stages = stages
+        self.queue_size = queue_size
+
+    def run(self, items: Iterable[Any], cancel: Optional[threading.Event] = None,
+            on_drop: Optional[Callable[[Any], None]] = None) -> List[Optional[Any]]:
+        """Process all items and return the final stage output for each one.
+
+        `items` is consumed lazily by a feeder thread, so a generator can
+        decide to produce more items while earlier ones are in flight.
+        Once `cancel` is set, no new item is fed and every item still queued
+        for a cancellable stage is skipped; on_drop(item) is called for each
+        of those so the caller can release what the item holds (e.g. a temp
+        file).
+        """
+        cancel = cancel or threading.Event()
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        output = queue.Queue()
+        threads = []
+        fed = {'count': 0}
+
+        for stage_num, stage in enumerate(self.stages):
+            inbox = queues[stage_num]
+            is_last = stage_num == len(self.stages) - 1
+            outbox = output if is_last else queues[stage_num + 1]
+            downstream_workers = 1 if is_last else self.stages[stage_num + 1].workers
+            remaining = {'workers': stage.workers}
+            lock = threading.Lock()
+
+            for worker_num in range(stage.workers):
+                # Workers inherit the caller's context (e.g. Groq priority)
+                thread = threading.Thread(
+                    target=contextvars.copy_context().run,
+                    args=(self._worker, stage, inbox, outbox, downstream_workers, remaining, lock,
+                          cancel, on_drop),
+                    name=f"pipeline-{stage.name}-{worker_num + 1}",
+                    daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+
+        feeder = threading.Thread(
+            target=self._feed,
+            args=(items, queues[0], self.stages[0].workers, cancel, fed),
+            name="pipeline-feeder",
+            daemon=True
+        )
+        feeder.start()
+        threads.append(feeder)
+
+        results: Dict[int, Any] = {}
+        while True:
+            message = output.get()
+            if message is _DONE:
+                break
+            index, value = message
+            results[index] = value
+
+        for thread in threads:
+            thread.join()
+
+        return [results.get(index) for index in range(fed['count'])]
+
+    @staticmethod
+    def _feed(items: Iterable[Any], inbox: queue.Queue, workers: int, cancel: threading.Event, fed: dict):
+        for index, item in enumerate(items):
+            if cancel.is_set():
+                break
+            inbox.put((index, item))
+            fed['count'] = index + 1
+        for _ in range(workers):
+            inbox.put(_DONE)
+
+    @staticmethod
+    def _worker(stage: Stage, inbox: queue.Queue, outbox: queue.Queue,
+                downstream_workers: int, remaining: dict, lock: threading.Lock,
+                cancel: threading.Event, on_drop: Optional[Callable[[Any], None]]):
+        while True:
+            message = inbox.get()
+            if message is _DONE:
+                break
+
+            index, item = message
+            if cancel.is_set() and stage.cancellable:
+                if on_drop:
+                    on_drop(item)
+                continue
+            try:
+                value = stage.func(item)
+            except Exception as e:
+                print(f"❌ Pipeline stage '{stage.name}' failed: {e}")
+                value = None
+
+            if value is not None:
+                outbox.put((index, value))
+
+        # The last worker out of a stage closes the next stage's input
+        with lock:
+            remaining['workers'] -= 1
+            last_out = remaining['workers'] == 0
+        if last_out:
+            for _ in range(downstream_workers):
+                outbox.put(_DONE)
+
+class FirstNGate:
+    """Admits the first `wanted` qualifying items, preferring better (lower) ranks.
+
+    Every rank must end up in admit() (it qualified) or reject() (it did not).
+    admit() blocks until the item's fate is known: an item is let through as
+    soon as no better-ranked item still in flight could push it out of the top
+    `wanted`, or as soon as `wanted` items have qualified at all, in which case
+    the best-ranked of those win. When the quota is full, `done` is set so the
+    remaining work can be cancelled.
+
+    If `conflicts(rank, other)` is given, two conflicting items (e.g.
+    near-duplicate documents) never both hold a slot, and the better-ranked
+    one is kept: a worse-ranked copy is turned away without taking a slot,
+    and a better-ranked copy that qualifies later takes over the slot of a
+    worse one that was admitted first, unless that one was already
+    committed. The loser is recorded in `duplicates` as rank -> kept rank.
+    Callers commit() an admission before spending work on it.
+    """
+    def __init__(self, ranks: List[int], wanted: int,
+                 conflicts: Optional[Callable[[int, int], bool]] = None):
+        self.wanted = wanted
+        self.conflicts = conflicts
+        self.pending = set(ranks)
+        self.held = []
+        self.admitted = set()
+        self.decided = set()
+        self.committed = set()
+        self.duplicates = {}
+        self.done = threading.Event()
+        self._cond = threading.Condition()
+
+    def add(self, rank: int):
+        """Enter another candidate (a backfill) while the gate is open"""
+        with self._cond:
+            self.pending.add(rank)
+
+    def wait_for_shortfall(self) -> bool:
+        """Block until the candidates in play can no longer fill the quota (True) or it is full (False)"""
+        with self._cond:
+            while not self.done.is_set():
+                if len(self.admitted) + len(self.held) + len(self.pending) < self.wanted:
+                    return True
+                self._cond.wait()
+            return False
+
+    def admit(self, rank: int) -> bool:
+        """Report that rank qualified; True if it made the cut"""
+        with self._cond:
+            self.pending.discard(rank)
+            self.held.append(rank)
+            self._decide()
+            while rank not in self.decided:
+                self._cond.wait()
+            return rank in self.admitted
+
+    def reject(self, rank: int):
+        """Report that rank failed or was dropped"""
+        with self._cond:
+            self.pending.discard(rank)
+            self._decide()
+
+    def commit(self, rank: int) -> bool:
+        """Make an admission final; False if a better-ranked duplicate took the slot meanwhile"""
+        with self._cond:
+            if rank not in self.admitted:
+                return False
+            self.committed.add(rank)
+            return True
+
+    def _decide(self):
+        self.held.sort()
+        enough = len(self.admitted) + len(self.held) >= self.wanted
+        while self.held:
+            rank = self.held[0]
+            duplicate_of = self._conflict(rank)
+            if duplicate_of is not None:
+                self.held.pop(0)
+                self.decided.add(rank)
+                if rank < duplicate_of and duplicate_of not in self.committed:
+                    # The better-ranked copy takes the slot of the one admitted before it arrived
+                    self.admitted.discard(duplicate_of)
+                    self.admitted.add(rank)
+                    self.duplicates[duplicate_of] = rank
+                else:
+                    self.duplicates[rank] = duplicate_of
+                continue
+            if len(self.admitted) >= self.wanted:
+                break
+            better_pending = sum(1 for other in self.pending if other < rank)
+            if not enough and len(self.admitted) + better_pending >= self.wanted:
+                break
+            self.held.pop(0)
+            self.decided.add(rank)
+            self.admitted.add(rank)
+
+        if len(self.admitted) >= self.wanted:
+            # Quota full: everything still held is turned away
+            self.decided.update(self.held)
+            self.held = []
+            self.done.set()
+        self._cond.notify_all()
+
+    def _conflict(self, rank: int) -> Optional[int]:
+        if self.conflicts is None:
+            return None
+        return next((other for other in sorted(self.admitted) if self.conflicts(rank, other)), None)
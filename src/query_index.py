@@ -0,0 +1,200 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable, Optional, Tuple
+import cache
+
+def overlap(left: frozenset, right: frozenset) -> float:
+    """Jaccard similarity of two term sets: shared terms over all terms"""
+    if not left or not right:
+        return 0.0
+    return len(left & right) / len(left | right)
+
+def reversed_order(left: Iterable[Tuple[str, str]], right: Iterable[Tuple[str, str]]) -> bool:
+    """True if a pair of terms appears in opposite order in the two queries ("a to b" vs "b to a")"""
+    right = set(right)
+    return any((after, before) in right for before, after in left)
+
+class QueryIndex:
+    """Finds an earlier query that asks the same thing in different words.
+
+    Each stored query is reduced to a set of normalized terms by `tokenize`
+    and scored by IDF-weighted Jaccard overlap: terms shared by many stored
+    queries weigh little, so paraphrases that differ in common words still
+    match, while a topic word present on one side only (a broader or
+    narrower query) pulls the score under the threshold. If `directions`
+    is given, queries whose ordered term pairs are reversed ("celsius to
+    fahrenheit" / "fahrenheit to celsius") never match. Entries live in
+    SQLite (shared by workers, kept across restarts) and are mirrored in
+    memory with an inverted index; each lookup picks up rows other
+    processes added, and drops expired rows and rows they evicted.
+    """
+    def __init__(self, name: str, tokenize: Callable[[str], Iterable[str]], threshold: float = 0.8,
+                 ttl: Optional[float] = None, max_entries: int = 5000, min_terms: int = 2,
+                 path: Optional[str] = None,
+                 directions: Optional[Callable[[str], Iterable[Tuple[str, str]]]] = None):
+        self.tokenize = tokenize
+        self.directions = directions
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.min_terms = min_terms
+        self.path = path or os.path.join(cache.CACHE_DIR, f"{name}.sqlite3")
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}  # id -> (terms, query, value, created_at, direction pairs)
+        self._by_query = {}  # stored query -> id
+        self._postings = {}  # term -> ids
+        self._document_frequency = Counter()
+        self._last_id = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS queries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    query TEXT NOT NULL UNIQUE,
+                    terms TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS queries_created_at ON queries (created_at)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _terms(self, query: str) -> frozenset:
+        return frozenset(self.tokenize(query))
+
+    def _pairs(self, query: str) -> frozenset:
+        return frozenset(self.directions(query)) if self.directions else frozenset()
+
+    def _forget(self, entry_id: int):
+        terms, query, _, _, _ = self._entries.pop(entry_id)
+        if self._by_query.get(query) == entry_id:
+            del self._by_query[query]
+        for term in terms:
+            self._postings[term].discard(entry_id)
+            self._document_frequency[term] -= 1
+
+    def _remember(self, entry_id: int, terms: frozenset, query: str, value: Any, created_at: float):
+        if query in self._by_query:
+            self._forget(self._by_query[query])
+        self._entries[entry_id] = (terms, query, value, created_at, self._pairs(query))
+        self._by_query[query] = entry_id
+        for term in terms:
+            self._postings.setdefault(term, set()).add(entry_id)
+            self._document_frequency[term] += 1
+        self._last_id = max(self._last_id, entry_id)
+
+    def _refresh(self):
+        oldest = time.time() - self.ttl if self.ttl else None
+        with self._connect() as conn:
+            if oldest is not None:
+                conn.execute("DELETE FROM queries WHERE created_at < ?", (oldest,))
+            # Eviction and clear() always remove the oldest ids, so anything below the first id left is gone
+            first_id = conn.execute("SELECT MIN(id) FROM queries").fetchone()[0]
+            rows = conn.execute(
+                "SELECT id, query, terms, value, created_at FROM queries WHERE id > ? ORDER BY id",
+                (self._last_id,)
+            ).fetchall()
+        gone = [
+            entry_id for entry_id, entry in self._entries.items()
+            if first_id is None or entry_id < first_id or (oldest is not None and entry[3] < oldest)
+        ]
+        for entry_id in gone:
+            self._forget(entry_id)
+        for entry_id, query, terms, value, created_at in rows:
+            self._remember(entry_id, frozenset(json.loads(terms)), query, json.loads(value), created_at)
+
+    def _weight(self, term: str) -> float:
+        # Smoothed inverse document frequency over the stored queries
+        return math.log((len(self._entries) + 1) / (self._document_frequency[term] + 1)) + 1
+
+    def _score(self, left: frozenset, right: frozenset) -> float:
+        shared = sum(self._weight(term) for term in left & right)
+        if not shared:
+            return 0.0
+        return shared / sum(self._weight(term) for term in left | right)
+
+    def find(self, query: str) -> Optional[dict]:
+        """The most similar stored query at or above the threshold: {'query', 'score', 'value'}"""
+        terms = self._terms(query)
+        if len(terms) < self.min_terms:
+            return None
+        oldest = time.time() - self.ttl if self.ttl else 0.0
+
+        with self._lock:
+            self._refresh()
+            candidates = set()
+            for term in terms:
+                candidates |= self._postings.get(term, set())
+
+            pairs = self._pairs(query)
+            best, best_score = None, 0.0
+            for entry_id in candidates:
+                stored_terms, stored_query, value, created_at, stored_pairs = self._entries[entry_id]
+                if created_at < oldest or reversed_order(pairs, stored_pairs):
+                    continue
+                score = self._score(terms, stored_terms)
+                if score > best_score:
+                    best, best_score = (stored_query, value), score
+
+            if best is None or best_score < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return {'query': best[0], 'score': round(best_score, 3), 'value': best[1]}
+
+    def add(self, query: str, value: Any):
+        """Store (or refresh) a query and the value to reuse for queries like it"""
+        terms = self._terms(query)
+        if len(terms) < self.min_terms:
+            return
+        with self._lock:
+            with self._connect() as conn:
+                # Re-inserting gives a refreshed entry a new id, so other workers pick it up too
+                conn.execute("DELETE FROM queries WHERE query = ?", (query,))
+                conn.execute(
+                    "INSERT INTO queries (query, terms, value, created_at) VALUES (?, ?, ?, ?)",
+                    (query, json.dumps(sorted(terms)), json.dumps(value), time.time())
+                )
+                # Oldest entries go first once the index is full
+                conn.execute(
+                    "DELETE FROM queries WHERE id NOT IN (SELECT id FROM queries ORDER BY id DESC LIMIT ?)",
+                    (self.max_entries,)
+                )
+                kept = {row[0] for row in conn.execute("SELECT id FROM queries")}
+            for entry_id in [entry_id for entry_id in self._entries if entry_id not in kept]:
+                self._forget(entry_id)
+            self._refresh()
+
+    def clear(self):
+        with self._lock:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM queries")
+            for entry_id in list(self._entries):
+                self._forget(entry_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'threshold': self.threshold
+            }
@@ -0,0 +1,84 @@
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+class TokenBucket:
+    """Thread-safe token bucket shared by every caller hitting the same API.
+
+    acquire() waits on a condition variable rather than sleeping, so waiters
+    wake as soon as a token is available and give up cleanly at their
+    deadline. pause_until() lets a Retry-After response hold back every
+    caller at once instead of each one discovering the limit separately.
+    """
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+
+    def _refill(self, now: float):
+        # _updated can sit in the future while a Retry-After pause is in effect
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Take one token, waiting at most `timeout` seconds; False if the deadline passes first"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    wait = (1 - self._tokens) / self.rate
+
+                if deadline is not None:
+                    remaining = deadline - now
+                    if remaining <= 0 or wait > remaining:
+                        return False
+                self._cond.wait(wait)
+
+    def pause_until(self, resume_at: float):
+        """Hold all callers until the monotonic time `resume_at` (e.g. from a Retry-After header)"""
+        with self._cond:
+            if resume_at > self._paused_until:
+                self._paused_until = resume_at
+                # Nothing accumulates while the API is refusing requests
+                self._tokens = 0
+                self._updated = max(self._updated, resume_at)
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            return {
+                'rate_per_second': self.rate,
+                'capacity': self.capacity,
+                'tokens': round(self._tokens, 2),
+                'paused_for': round(max(0.0, self._paused_until - now), 2)
+            }
+
+def parse_retry_after(value: Optional[str], default: float) -> float:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)"""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
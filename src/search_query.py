@@ -1,7 +1,12 @@
 import json
+import os
 import re
-from typing import Tuple, Optional
-from functools import lru_cache  
+import hashlib
+from typing import List, Tuple
+import cache
+import groq_scheduler
+import metrics
+import query_index
 
 # Enhanced context with more specific instructions
 context = """
@@ -42,16 +47,87 @@ Output Format (MUST follow exactly as valid JSON):
 **Important**: For identical inputs, produce identical outputs. Never invent facts. Always respond with valid JSON format.
 """
 
-def build_search_query(original_query: str, client: object) -> Tuple[str, str, str]:
-    """
-    Build optimized search query with enhanced context
-    
-    Returns:
-        Tuple of (optimized_query, explanation, search_intent)
-    """
-    try:
-        chat_completion = client.chat.completions.create(
-            model="deepseek-r1-distill-llama-70b",
+QUERY_MODEL = "deepseek-r1-distill-llama-70b"
+
+# Common words that carry no search intent
+STOP_WORDS = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'how', 'what', 'why', 'when', 'where'}
+
+# Persistent cache of model optimizations, shared across restarts and workers
+query_cache = cache.DiskCache(
+    'query_optimization',
+    ttl=int(os.getenv("QUERY_CACHE_TTL", 7 * 24 * 3600)),
+    max_entries=int(os.getenv("QUERY_CACHE_MAX_ENTRIES", 5000))
+)
+
+_SUFFIXES = ('ations', 'ation', 'ments', 'ment', 'ings', 'ing', 'ies', 'ed', 'es', 'e', 's')
+_NON_WORD = re.compile(r"[^\w\-']+")
+# Question phrasing and instruction verbs that differ between paraphrases without changing what is asked
+_FILLER_WORDS = {
+    'is', 'are', 'was', 'were', 'do', 'does', 'can', 'should', 'have', 'has', 'i', 'you', 'my', 'me', 'it', 'its',
+    'their', 'determine', 'find', 'explain', 'describe', 'tell', 'show', 'know', 'learn', 'understand'
+}
+# Words that name the same thing in search queries, mapped to one form before stemming
+_EQUIVALENT_WORDS = {
+    'soluble': 'dissolved', 'affect': 'effect', 'affects': 'effect', 'impact': 'effect', 'impacts': 'effect',
+    'influence': 'effect', 'technique': 'method', 'techniques': 'method', 'procedure': 'method',
+    'procedures': 'method', 'ways': 'method', 'conversion': 'convert', 'temp': 'temperature'
+}
+# Words after which the order of the two surrounding terms matters ("celsius to fahrenheit")
+_DIRECTION_WORDS = {'to', 'into', 'from', 'per', 'towards'}
+
+def stem_word(word: str) -> str:
+    """Crude suffix stripping so 'measure', 'measures' and 'measurement' match"""
+    # Two passes handle stacked suffixes like measure-ment-s
+    for _ in range(2):
+        for suffix in _SUFFIXES:
+            if len(word) - len(suffix) >= 3 and word.endswith(suffix):
+                word = word[:-len(suffix)]
+                break
+    return word
+
+def content_words(query: str) -> List[str]:
+    """Lowercased words of a query without the stop words"""
+    return [word for word in query.lower().split() if word not in STOP_WORDS]
+
+def _similarity_term(word: str) -> str:
+    word = _NON_WORD.sub('', word.lower())
+    if not word or word in STOP_WORDS or word in _FILLER_WORDS or word in _DIRECTION_WORDS:
+        return ''
+    return stem_word(_EQUIVALENT_WORDS.get(word, word))
+
+def similarity_terms(query: str) -> List[str]:
+    """Stemmed content words, punctuation stripped: what two paraphrases of a query share"""
+    return [term for term in map(_similarity_term, query.split()) if term]
+
+def direction_pairs(query: str) -> List[Tuple[str, str]]:
+    """(before, after) terms around 'to', 'from', 'into'...: the parts of a query whose order matters"""
+    words = query.lower().split()
+    pairs = []
+    for index, word in enumerate(words):
+        if _NON_WORD.sub('', word) not in _DIRECTION_WORDS:
+            continue
+        before = next((t for t in map(_similarity_term, reversed(words[:index])) if t), None)
+        after = next((t for t in map(_similarity_term, words[index + 1:]) if t), None)
+        if before and after and before != after:
+            pairs.append((before, after))
+    return pairs
+
+# Earlier queries whose optimization a close paraphrase can reuse (0 < threshold <= 1)
+similar_queries = query_index.QueryIndex(
+    'query_similarity',
+    tokenize=similarity_terms,
+    directions=direction_pairs,
+    threshold=float(os.getenv("QUERY_SIMILARITY_THRESHOLD", 0.8)),
+    ttl=int(os.getenv("QUERY_CACHE_TTL", 7 * 24 * 3600)),
+    max_entries=int(os.getenv("QUERY_CACHE_MAX_ENTRIES", 5000))
+)
+
+def _optimize_with_model(original_query: str, client: object) -> Tuple[str, str, str]:
+    """Ask the model for an optimized query; raises if the call or JSON parsing fails"""
+    with metrics.span('query_optimization'):
+        chat_completion = groq_scheduler.scheduler.create(
+            client,
+            model=QUERY_MODEL,
             temperature=0,          
             top_p=1,        
             seed=42,          
@@ -63,32 +139,41 @@ def build_search_query(original_query: str, client: object) -> Tuple[str, str, s
                 {"role": "user", "content": original_query} 
             ],
         )
-        
+    
         response = json.loads(chat_completion.choices[0].message.content)
-        
+    
         optimized_query = response.get("optimized_query", "")
         explanation = response.get("explanation", "Query optimization applied")
         search_intent = response.get("search_intent", "research")
-        
+    
         # Fallback validation
         if not optimized_query or len(optimized_query) > 250:
             optimized_query = _fallback_optimization(original_query)
             explanation = "Fallback optimization applied"
-        
+    
         return optimized_query, explanation, search_intent
-        
+
+def build_search_query(original_query: str, client: object) -> Tuple[str, str, str]:
+    """
+    Build optimized search query with enhanced context
+    
+    Returns:
+        Tuple of (optimized_query, explanation, search_intent)
+    """
+    try:
+        return _optimize_with_model(original_query, client)
     except Exception as e:
-        print(f"Error in query optimization: {e}")
-        fallback_query = _fallback_optimization(original_query)
-        return fallback_query, f"Fallback due to error: {str(e)[:50]}", "research"
+        return _error_fallback(original_query, e)
+
+def _error_fallback(original_query: str, error: Exception) -> Tuple[str, str, str]:
+    print(f"Error in query optimization: {error}")
+    fallback_query = _fallback_optimization(original_query)
+    return fallback_query, f"Fallback due to error: {str(error)[:50]}", "research"
 
 def _fallback_optimization(query: str) -> str:
     """Simple fallback optimization when AI fails"""
     # Remove common stop words
-    stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'how', 'what', 'why', 'when', 'where'}
-    
-    words = query.lower().split()
-    filtered_words = [word for word in words if word not in stop_words]
+    filtered_words = content_words(query)
     
     # Add basic scientific site restriction for technical queries
     technical_keywords = {'determine', 'measure', 'analyze', 'calculate', 'method', 'procedure', 'technique'}
@@ -97,8 +182,44 @@ def _fallback_optimization(query: str) -> str:
     
     return ' '.join(filtered_words)
 
-@lru_cache(maxsize=100)
-def cached_build_search_query(original_query: str, client_id: str) -> Tuple[str, str, str]:
-    """Cached version for repeated queries (requires string client_id instead of object)"""
-    # This would need client recreation, but shows the caching concept
-    pass
\ No newline at end of file
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a user query used for cache keys"""
+    return ' '.join(query.lower().split())
+
+def _query_cache_key(original_query: str) -> str:
+    prompt_hash = hashlib.sha256(context.encode('utf-8')).hexdigest()
+    return cache.DiskCache.make_key(normalize_query(original_query), prompt_hash, QUERY_MODEL)
+
+def cached_build_search_query(original_query: str, client: object) -> Tuple[str, str, str]:
+    """
+    build_search_query backed by the persistent query cache.
+    
+    Keyed on the normalized query, the system prompt and the model, so editing
+    the prompt or switching models invalidates old entries. A query close
+    enough to an earlier one (see similar_queries) reuses its optimization
+    instead of calling the model; that reuse is not cached under the new
+    query's key, so it is re-checked against the index on every request.
+    Error fallbacks are never cached, so a transient Groq failure is retried
+    on the next request.
+    """
+    key = _query_cache_key(original_query)
+    cached = query_cache.get(key)
+    if cached:
+        print(f"⚡ Query optimization cache hit: {original_query[:50]}")
+        return tuple(cached)
+    
+    similar = similar_queries.find(original_query)
+    if similar:
+        # A paraphrase of an earlier query: same optimized query, so its CSE pages and pages are cached too
+        print(f"♻️ Reusing optimization of similar query ({similar['score']:.2f}): {similar['query'][:50]}")
+        optimized_query, explanation, search_intent = similar['value']
+        return optimized_query, f"{explanation} (reused from similar query \"{similar['query']}\")", search_intent
+    
+    try:
+        result = _optimize_with_model(original_query, client)
+    except Exception as e:
+        return _error_fallback(original_query, e)
+    
+    query_cache.set(key, list(result))
+    similar_queries.add(normalize_query(original_query), list(result))
+    return result
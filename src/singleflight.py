@@ -0,0 +1,99 @@
+import copy
+import threading
+from typing import Any, Callable, Optional
+
+class _Call:
+    """One in-flight computation plus everyone waiting on it"""
+    def __init__(self):
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+        self.result = None
+        self.error = None
+        self.events = []
+        self.listeners = []
+        self.waiters = 0
+        self.state = None
+
+    def emit(self, event: str, data: Any):
+        # Listeners run under the lock so a late joiner's replay can't interleave with new events
+        with self.lock:
+            self.events.append((event, data))
+            for listener in self.listeners:
+                try:
+                    listener(event, data)
+                except Exception as e:
+                    print(f"⚠️ Coalesced listener failed on '{event}': {e}")
+
+    def subscribe(self, listener: Optional[Callable]):
+        if listener is None:
+            return
+        with self.lock:
+            for event, data in self.events:
+                try:
+                    listener(event, data)
+                except Exception as e:
+                    print(f"⚠️ Coalesced listener failed on '{event}': {e}")
+            self.listeners.append(listener)
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key onto a single execution.
+
+    The first caller for a key runs fn; callers arriving while it is still
+    running wait for it and receive a copy of its result (or its exception).
+    Progress events emitted by fn are replayed to late joiners and then
+    forwarded live, so streaming callers still see every stage. The
+    leader's `state` is kept with the flight and handed to on_join(state)
+    for each caller that joins it (e.g. to raise the flight's priority).
+    """
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[Callable], Any], on_event: Optional[Callable] = None,
+           state: Any = None, on_join: Optional[Callable[[Any], None]] = None) -> Any:
+        """Run fn(emit) once per concurrent key and return its result to every caller"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                call.state = state
+                self._calls[key] = call
+                self.executed += 1
+            else:
+                self.coalesced += 1
+            call.waiters += 1
+
+        if not leader and on_join is not None:
+            on_join(call.state)
+
+        call.subscribe(on_event)
+
+        if not leader:
+            print(f"🔗 Joined in-flight search ({call.waiters} callers)")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = fn(call.emit)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            in_flight = len(self._calls)
+        return {
+            'executed': self.executed,
+            'coalesced': self.coalesced,
+            'in_flight': in_flight
+        }
@@ -1,6 +1,39 @@
+import contextvars
 import json
-import time
-import random
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional
+import cache
+import groq_scheduler
+import passage_ranker
+
+SUMMARY_MODEL = "llama-3.1-8b-instant"
+SUMMARY_MAX_TOKENS = 512
+
+# Map-reduce sizing: chunk budget in tokens, rough chars per token, and the final prompt's input cap
+CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", 1500))
+CHARS_PER_TOKEN = 4
+FINAL_INPUT_CHARS = 3000
+
+# Input budget for query-aware passage selection before a direct summary
+PASSAGE_BUDGET_CHARS = int(os.getenv("SUMMARY_PASSAGE_BUDGET", 2400))
+
+# Shared pool for chunk calls; the Groq scheduler decides when each one actually goes out
+map_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SUMMARY_MAP_WORKERS", 4)), thread_name_prefix="summary-map"
+)
+
+# Groq calls run at temperature 0 with a fixed seed, so identical input gives identical output
+summary_cache = cache.DiskCache(
+    'summaries',
+    ttl=int(os.getenv("SUMMARY_CACHE_TTL", 30 * 24 * 3600)),
+    max_entries=int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", 20000))
+)
+
+def _summary_cache_key(text: str, system_prompt: str, model: str, max_tokens: int) -> str:
+    """Hash of the exact model input: user text, system prompt, model and token limit"""
+    return cache.DiskCache.make_key(text, system_prompt, model, max_tokens)
 
 context_final_summary = \
 """
@@ -48,97 +81,168 @@ USER
 
 """
 
-# def _chunks(text:str, num_chunks:int) -> str:
-# 	chunks = []	
-# 	len_text = len(text)
-# 	chunk_size = len_text // num_chunks
-# 	for i in range(num_chunks):
-# 		chunk = chunks.append(text[i*chunk_size: (chunk_size*i)+chunk_size])
-# 	return chunks
-
-def build_text(text:str, genrated_summaries:list ,num_chunks:int, chunk_num:int) -> str:
-	chunk_size = len(text) // num_chunks
-	processed_text = ""
-
-	if chunk_num == 0:
-		processed_text = text[:chunk_size]
-	else:
-		processed_text = " ".join(genrated_summaries) + " " + text[chunk_num*chunk_size::]
-	return processed_text
-
+def split_into_chunks(text: str, max_chars: int) -> List[str]:
+    """Split text into pieces of at most max_chars, breaking between sentences where possible"""
+    chunks = []
+    current = ""
+    
+    for sentence in re.split(r'(?<=[.!?])\s+', text.strip()):
+        # A single overlong sentence is broken on word boundaries instead
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(' ', 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(sentence[:cut])
+            sentence = sentence[cut:].strip()
+        
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    
+    if current:
+        chunks.append(current)
+    return chunks
 
-def summary(text: str, num_chunks: int, client: object):
-    summary_list = []
+def _compress(text: str, client: object) -> str:
+    """Compress one piece of text with the context_summary prompt (cached)"""
+    cache_key = _summary_cache_key(text, context_summary, SUMMARY_MODEL, SUMMARY_MAX_TOKENS)
+    cached = summary_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    chat_completion = groq_scheduler.scheduler.create(
+        client,
+        model=SUMMARY_MODEL,  # Use faster model
+        max_tokens=SUMMARY_MAX_TOKENS,
+        temperature=0,          
+        top_p=1,        
+        seed=42,          
+        presence_penalty=0,
+        frequency_penalty=0,
+        messages=[
+            {"role": "system", "content": context_summary},
+            {"role": "user", "content": text}
+        ],
+    )
     
-    for i in range(num_chunks):
+    response = chat_completion.choices[0].message.content
+    summary_cache.set(cache_key, response)
+    return response
+
+def _compress_all(pieces: List[str], client: object) -> List[Optional[str]]:
+    """Compress pieces concurrently; None marks a piece whose call failed"""
+    def compress_one(index_piece):
+        index, piece = index_piece
         try:
-            prompt = build_text(text, summary_list, num_chunks, i)
-            
-            # Add delay between chunks
-            if i > 0:
-                time.sleep(3)
-            
-            chat_completion = client.chat.completions.create(
-                model="llama-3.1-8b-instant",  # Use faster model
-                max_tokens=512,
-                temperature=0,          
-                top_p=1,        
-                seed=42,          
-                presence_penalty=0,
-                frequency_penalty=0,
-                messages=[
-                    {"role": "system", "content": context_summary},
-                    {"role": "user", "content": prompt[:3000]}
-                ],
-            )
-            
-            response = chat_completion.choices[0].message.content
-            summary_list.append(response)
-            
+            return _compress(piece, client)
         except Exception as e:
             if "rate_limit" in str(e).lower():
-                print(f"⏳ Rate limit on chunk {i+1}. Adding to list with error note...")
-                summary_list.append(f"[Rate limit - chunk {i+1} skipped]")
+                print(f"⏳ Rate limit on chunk {index+1}. Skipping it...")
             else:
-                summary_list.append(f"[Error in chunk {i+1}: {str(e)[:50]}]")
+                print(f"⚠️ Error in chunk {index+1}: {str(e)[:50]}")
+            return None
     
-    return summary_list
+    # Each task runs in a copy of the caller's context so Groq priority carries over
+    futures = [
+        map_executor.submit(contextvars.copy_context().run, compress_one, (index, piece))
+        for index, piece in enumerate(pieces)
+    ]
+    return [future.result() for future in futures]
 
+def summary(text: str, num_chunks: Optional[int], client: object, *, chunk_tokens: int = CHUNK_TOKENS) -> List[str]:
+    """Map step: split the full text into model-sized chunks and compress them in parallel.
 
-def summarize_html_content(page_content: str, client: object) -> str:
-    max_retries = 3
+    num_chunks asks for at least that many chunks; None lets the chunk budget decide.
+    """
+    max_chars = chunk_tokens * CHARS_PER_TOKEN
+    if num_chunks:
+        max_chars = min(max_chars, -(-len(text) // num_chunks))
+    chunks = split_into_chunks(text, max_chars)
+    print(f"🧩 Summarizing {len(chunks)} chunks in parallel...")
     
-    for attempt in range(max_retries):
-        try:
-            chat_completion = client.chat.completions.create(
-                model="llama-3.1-8b-instant",  # Use faster model with higher limits
-                temperature=0,          
-                top_p=1,        
-                seed=42,          
-                presence_penalty=0,
-                frequency_penalty=0,
-                max_tokens=512,
-                response_format={"type": "json_object"},
-                messages=[
-                    {"role": "system", "content": context_final_summary},
-                    {"role": "user", "content": page_content[:3000]}  # Limit input size
-                ],
-            )
-            
-            response = json.loads(chat_completion.choices[0].message.content)
-            return response
-            
-        except Exception as e:
-            error_str = str(e)
-            if "rate_limit_exceeded" in error_str or "429" in error_str:
-                if attempt < max_retries - 1:
-                    wait_time = (2 ** attempt) + random.uniform(1, 3)
-                    print(f"⏳ Rate limit hit. Waiting {wait_time:.1f} seconds...")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    return {"error": "Rate limit exceeded after retries"}
+    summary_list = []
+    for i, compressed in enumerate(_compress_all(chunks, client)):
+        summary_list.append(compressed if compressed is not None else f"[Error in chunk {i+1} - skipped]")
+    return summary_list
+
+def reduce_summaries(summaries: List[str], client: object, max_chars: int = FINAL_INPUT_CHARS,
+                     chunk_tokens: int = CHUNK_TOKENS) -> str:
+    """Reduce step: merge chunk summaries, compressing groups of them until they fit max_chars"""
+    summaries = [s for s in summaries if s and not s.startswith("[Error in chunk")]
+    combined = ' '.join(summaries)
+    
+    level = 1
+    while len(combined) > max_chars and len(summaries) > 1:
+        # Pack neighbouring summaries into model-sized groups and compress each group
+        groups = []
+        for summary_text in summaries:
+            if groups and len(groups[-1]) + 1 + len(summary_text) <= chunk_tokens * CHARS_PER_TOKEN:
+                groups[-1] = f"{groups[-1]} {summary_text}"
             else:
-                return {"error": str(e)}
+                groups.append(summary_text)
+        
+        if len(groups) == len(summaries):
+            # Nothing could be merged; further rounds would not shrink the input
+            break
+        
+        print(f"🔁 Reduce level {level}: {len(summaries)} summaries -> {len(groups)} groups")
+        summaries = [s for s in _compress_all(groups, client) if s]
+        combined = ' '.join(summaries)
+        level += 1
+    
+    return combined
+
+def map_reduce_summarize(text: str, client: object) -> dict:
+    """Summarize a long document with full coverage: parallel map, hierarchical reduce, final JSON"""
+    if len(text) <= FINAL_INPUT_CHARS:
+        return summarize_html_content(text, client)
+    
+    reduced = reduce_summaries(summary(text, None, client), client)
+    if not reduced:
+        return {"error": "All chunk summaries failed"}
+    return summarize_html_content(reduced, client)
+
+
+def summarize_html_content(page_content: str, client: object, queries: Optional[Iterable[str]] = None) -> str:
+    if queries:
+        # Send the passages that best match the question instead of the page's opening text
+        page_content = passage_ranker.select_passages(page_content, queries, PASSAGE_BUDGET_CHARS)
+    page_content = page_content[:FINAL_INPUT_CHARS]  # Limit input size
+    
+    cache_key = _summary_cache_key(page_content, context_final_summary, SUMMARY_MODEL, SUMMARY_MAX_TOKENS)
+    cached = summary_cache.get(cache_key)
+    if cached is not None:
+        print("⚡ Summary cache hit")
+        return cached
     
-    return {"error": "Max retries exceeded"}
\ No newline at end of file
+    try:
+        # The scheduler waits for budget and retries 429s itself
+        chat_completion = groq_scheduler.scheduler.create(
+            client,
+            model=SUMMARY_MODEL,  # Use faster model with higher limits
+            temperature=0,          
+            top_p=1,        
+            seed=42,          
+            presence_penalty=0,
+            frequency_penalty=0,
+            max_tokens=SUMMARY_MAX_TOKENS,
+            response_format={"type": "json_object"},
+            messages=[
+                {"role": "system", "content": context_final_summary},
+                {"role": "user", "content": page_content}
+            ],
+        )
+        
+        response = json.loads(chat_completion.choices[0].message.content)
+        summary_cache.set(cache_key, response)
+        return response
+        
+    except Exception as e:
+        error_str = str(e)
+        if "rate_limit_exceeded" in error_str or "429" in error_str:
+            return {"error": "Rate limit exceeded after retries"}
+        return {"error": str(e)}
@@ -1,12 +1,37 @@
+import os
 import re
+import tempfile
+import time
 import bs4
 import requests
-from typing import Optional
-import PyPDF2
-import pdfplumber
-import io
+from typing import Optional, Union
+import cache
+import host_health
+import html_extract
+import http_client
+import metrics
+import pdf_extract
 
-def process_html(html_code: str) -> str:
+# Extracted page text keyed by URL, revalidated with ETag/Last-Modified once stale
+content_cache = cache.DiskCache(
+    'page_content',
+    ttl=int(os.getenv("CONTENT_CACHE_TTL", 6 * 3600)),
+    max_entries=None,
+    max_bytes=int(os.getenv("CONTENT_CACHE_MAX_BYTES", 200 * 1024 * 1024))
+)
+
+def process_html(html_code: Union[bytes, str], content_type: str = '') -> str:
+    """Main-content text of an HTML page (readability-style scorer, lxml when installed)"""
+    try:
+        text = html_extract.extract_main_text(html_code, content_type)
+        if text:
+            return text
+    except Exception as e:
+        print(f"Fast HTML extraction failed, falling back to BeautifulSoup: {e}")
+    return process_html_bs4(html_extract.decode_html(html_code, content_type))
+
+def process_html_bs4(html_code: Union[bytes, str]) -> str:
+    """All body text minus a few boilerplate tags, via BeautifulSoup (fallback extractor)"""
     try:
         # parse the html file content
         soup = bs4.BeautifulSoup(html_code, 'html.parser')
@@ -27,74 +52,297 @@ def process_html(html_code: str) -> str:
         print(f"Error processing HTML: {e}")
         return ""
 
-def extract_pdf_content(pdf_content: bytes) -> str:
-    """Extract text content from PDF bytes"""
+def extract_pdf_content(pdf_content: Union[bytes, str]) -> str:
+    """Extract text content from PDF bytes or a PDF file path"""
     try:
-        # Method 1: Try pdfplumber first (better for complex PDFs)
-        try:
-            with pdfplumber.open(io.BytesIO(pdf_content)) as pdf:
-                text = ""
-                # Limit to first 10 pages for performance
-                max_pages = min(10, len(pdf.pages))
-                for page_num in range(max_pages):
-                    page = pdf.pages[page_num]
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-                
-                if text.strip():
-                    # Clean up text
-                    text = re.sub(r'\s+', ' ', text)
-                    return text.strip()
-        except Exception as e:
-            print(f"pdfplumber failed: {e}")
-        
-        # Method 2: Fallback to PyPDF2
-        try:
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_content))
-            text = ""
-            # Limit to first 10 pages
-            max_pages = min(10, len(pdf_reader.pages))
-            for page_num in range(max_pages):
-                page = pdf_reader.pages[page_num]
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-            
-            if text.strip():
-                # Clean up text
-                text = re.sub(r'\s+', ' ', text)
-                return text.strip()
-        except Exception as e:
-            print(f"PyPDF2 failed: {e}")
-            
-        return ""
-        
+        return pdf_extract.extract_pdf_text(pdf_content)
     except Exception as e:
         print(f"Error extracting PDF content: {e}")
         return ""
 
-def fetch_page_content(url: str, timeout: int = 15) -> str:
-    """Fetch and process content from URL (HTML or PDF)"""
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml,application/pdf;q=0.9,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
-        }
+# Per-document download cap; bodies are streamed so nothing larger is ever held in memory
+DOWNLOAD_MAX_BYTES = int(os.getenv("DOWNLOAD_MAX_BYTES", 15 * 1024 * 1024))
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+SNIFF_BYTES = 1024
+_HTML_MARKERS = (b'<!doctype html', b'<html', b'<head', b'<body', b'<meta', b'<title')
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml,application/pdf;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+}
+
+def _content_cache_key(url: str) -> str:
+    return cache.DiskCache.make_key(url.split('#')[0])
+
+def _cached_page(url: str, entry: dict) -> dict:
+    return {
+        'url': url,
+        'content_type': entry['value']['content_type'],
+        'text': entry['value']['text'],
+        'cached': True
+    }
+
+def sniff_kind(content_type: str, url: str, head: bytes) -> Optional[str]:
+    """Decide 'pdf', 'html' or None (unsupported) from the first bytes, then the headers"""
+    lead = head[:SNIFF_BYTES].lstrip(b'\xef\xbb\xbf \t\r\n').lower()
+    if lead.startswith(b'%pdf'):
+        return 'pdf'
+    if any(marker in lead for marker in _HTML_MARKERS):
+        return 'html'
+    if 'pdf' in content_type or url.lower().endswith('.pdf'):
+        return 'pdf'
+    if 'html' in content_type:
+        return 'html'
+    return None
+
+class BodySink:
+    """Incremental body reader shared by the requests and aiohttp download paths.
+    
+    Chunks are fed as they arrive. The format is sniffed from the first
+    SNIFF_BYTES, HTML is kept in memory up to DOWNLOAD_MAX_BYTES and PDFs are
+    spooled to a temp file. feed() returns False once reading should stop.
+    """
+    def __init__(self, page: dict):
+        self.page = page
+        self.kind = None
+        self.head = b''
+        self.parts = []
+        self.spool = None
+        self.received = 0
+        self.failed = False
+    
+    def accepts_length(self, declared: Optional[str]) -> bool:
+        """Oversized HTML is still read up to the cap; anything else is not worth starting"""
+        if declared and declared.isdigit() and int(declared) > DOWNLOAD_MAX_BYTES and 'html' not in self.page['content_type']:
+            print(f"  ⚠️  Skipping {self.page['url'][:80]}: {int(declared) // 1024} KB exceeds the download cap")
+            return False
+        return True
+    
+    def feed(self, chunk: bytes) -> bool:
+        if self.kind is None:
+            self.head += chunk
+            if len(self.head) < SNIFF_BYTES:
+                return True
+            chunk, self.head = self.head, b''
+            if not self._start(chunk):
+                return False
+        return self._store(chunk)
+    
+    def _start(self, head: bytes) -> bool:
+        self.kind = sniff_kind(self.page['content_type'], self.page['url'], head)
+        if self.kind is None:
+            print(f"  ⚠️  Unsupported content type: {self.page['content_type'] or 'unknown'} ({self.page['url'][:80]})")
+            self.failed = True
+            return False
+        self.page['kind'] = self.kind
+        if self.kind == 'pdf':
+            self.spool = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
+        return True
+    
+    def _store(self, chunk: bytes) -> bool:
+        self.received += len(chunk)
+        if self.kind == 'html':
+            self.parts.append(chunk)
+            if self.received >= DOWNLOAD_MAX_BYTES:
+                # The main content of a page comes early, so a truncated page is still useful
+                print(f"  ✂️  HTML truncated at {DOWNLOAD_MAX_BYTES // 1024} KB: {self.page['url'][:80]}")
+                return False
+            return True
+        
+        # A truncated PDF is unreadable (its index is at the end), so oversized ones are dropped
+        if self.received > DOWNLOAD_MAX_BYTES:
+            print(f"  ⚠️  PDF exceeds the {DOWNLOAD_MAX_BYTES // 1024} KB download cap: {self.page['url'][:80]}")
+            self.failed = True
+            return False
+        self.spool.write(chunk)
+        return True
+    
+    def finish(self) -> bool:
+        """Complete the page; False (with nothing left on disk) if the download was abandoned"""
+        if self.kind is None and not self.failed:
+            # The whole body was shorter than SNIFF_BYTES
+            head, self.head = self.head, b''
+            if self._start(head):
+                self._store(head)
+        if self.failed:
+            self.abort()
+            return False
         
+        if self.kind == 'html':
+            self.page['body'] = b''.join(self.parts)[:DOWNLOAD_MAX_BYTES]
+        else:
+            self.spool.close()
+            self.page['path'] = self.spool.name
+            self.spool = None
+        return True
+    
+    def abort(self):
+        if self.spool is not None:
+            self.spool.close()
+            os.unlink(self.spool.name)
+            self.spool = None
+
+def _read_body(response: requests.Response, page: dict) -> bool:
+    """Stream a requests response into page; False when the download is abandoned"""
+    sink = BodySink(page)
+    if not sink.accepts_length(response.headers.get('content-length')):
+        return False
+    try:
+        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+            if not sink.feed(chunk):
+                break
+    except Exception:
+        sink.abort()
+        raise
+    return sink.finish()
+
+def discard_page(page: dict):
+    """Remove a spooled PDF that will not be extracted"""
+    path = page.pop('path', None)
+    if path and os.path.exists(path):
+        os.unlink(path)
+
+def lookup_cached_page(url: str):
+    """(fresh cached page or None, cache entry or None) for url"""
+    entry = content_cache.get_entry(_content_cache_key(url))
+    if entry and entry['fresh']:
+        content_cache.record(hit=True)
+        print(f"  ⚡ Content cache hit: {url[:80]}")
+        return _cached_page(url, entry), entry
+    return None, entry
+
+def request_headers(entry: Optional[dict]) -> dict:
+    """Default headers plus ETag/Last-Modified validators from a stale cache entry"""
+    headers = dict(DEFAULT_HEADERS)
+    if entry:
+        if entry['value'].get('etag'):
+            headers['If-None-Match'] = entry['value']['etag']
+        if entry['value'].get('last_modified'):
+            headers['If-Modified-Since'] = entry['value']['last_modified']
+    return headers
+
+def not_modified_page(url: str, entry: dict) -> dict:
+    """Refresh a revalidated cache entry after a 304 and return it as a page"""
+    content_cache.record(hit=True)
+    content_cache.touch(_content_cache_key(url))
+    print(f"  ⚡ Not modified, using cached content: {url[:80]}")
+    return _cached_page(url, entry)
+
+def new_page(url: str, headers) -> dict:
+    """Page dict for a fresh 200 response, before its body is read"""
+    content_cache.record(hit=False)
+    return {
+        'url': url,
+        'content_type': headers.get('content-type', '').lower(),
+        'etag': headers.get('etag'),
+        'last_modified': headers.get('last-modified'),
+        'cached': False
+    }
+
+def download_page(url: str, timeout: float = host_health.DEFAULT_TIMEOUT) -> Optional[dict]:
+    """Download a URL and return its body along with the reported content type.
+    
+    The response is streamed: its format ('kind') is sniffed from the first
+    bytes, unsupported types are abandoned right away, HTML is kept as 'body'
+    (capped at DOWNLOAD_MAX_BYTES) and PDFs are spooled to a temp file 'path'.
+    Fresh entries in the content cache are returned without any network call,
+    and stale ones are revalidated with a conditional GET. Either way the
+    returned page carries the already-extracted 'text' and 'cached': True.
+    Hosts with an open circuit breaker are skipped, and `timeout` is lowered
+    to what the host's latency history justifies (see host_health).
+    """
+    cached_page, entry = lookup_cached_page(url)
+    if cached_page:
+        return cached_page
+    
+    tracker = host_health.tracker
+    if not tracker.allow(url):
+        print(f"  🚧 Skipping {url[:80]}: host is cooling down after repeated failures")
+        return None
+    timeout = tracker.timeout_for(url, timeout)
+    
+    with metrics.span('fetch') as span:
+        page = _download(url, entry, timeout)
+        span['kind'] = page_kind(page) if page else 'failed'
+    if page is None:
+        metrics.count_error('fetch')
+    return page
+
+def page_kind(page: dict) -> str:
+    """'html', 'pdf' or 'other' (a revalidated cache entry has no 'kind' of its own)"""
+    return page.get('kind') or sniff_kind(page.get('content_type', ''), page['url'], b'') or 'other'
+
+def _download(url: str, entry: Optional[dict], timeout: float) -> Optional[dict]:
+    tracker = host_health.tracker
+    started = time.monotonic()
+    latency = None
+    try:
         print(f"  📡 Requesting: {url[:80]}...")
-        response = requests.get(url, headers=headers, timeout=timeout, allow_redirects=True)
-        response.raise_for_status()
+        response = http_client.get(url, headers=request_headers(entry), timeout=timeout,
+                                   allow_redirects=True, stream=True)
+        latency = time.monotonic() - started
+        tracker.record_status(url, latency, response.status_code)
         
-        # Check content type
-        content_type = response.headers.get('content-type', '').lower()
+        with response:
+            if response.status_code == 304 and entry:
+                return not_modified_page(url, entry)
+            
+            response.raise_for_status()
+            page = new_page(url, response.headers)
+            if not _read_body(response, page):
+                return None
+            return page
         
-        if 'pdf' in content_type or url.lower().endswith('.pdf'):
+    except requests.exceptions.Timeout:
+        # Also counts a body that stalls after the headers arrived
+        tracker.record(url, None, False, 'timeout')
+        print(f"  ⏰ Timeout fetching {url} after {timeout:.1f}s")
+        return None
+    except requests.exceptions.RequestException as e:
+        if latency is None:
+            tracker.record(url, None, False, type(e).__name__)
+        print(f"  ❌ Request error for {url}: {e}")
+        return None
+    except Exception as e:
+        print(f"  ❌ Error fetching {url}: {e}")
+        return None
+
+def extract_page_content(page: dict) -> str:
+    """Extract plain text from a page returned by download_page (HTML or PDF)"""
+    if 'text' in page:
+        return page['text']
+    
+    kind = page_kind(page)
+    with metrics.span('extract', kind):
+        content = _extract_body(page)
+    if not content:
+        metrics.count_error('extract')
+    else:
+        content_cache.set(_content_cache_key(page['url']), {
+            'text': content,
+            'content_type': page['content_type'],
+            'etag': page.get('etag'),
+            'last_modified': page.get('last_modified')
+        })
+    return content
+
+def _extract_body(page: dict) -> str:
+    url = page['url']
+    content_type = page['content_type']
+    
+    kind = page_kind(page)
+    
+    try:
+        if kind == 'pdf':
             print(f"  📄 Processing PDF content...")
-            content = extract_pdf_content(response.content)
+            if 'path' in page:
+                # The extractor takes ownership of the spooled file and removes it when done
+                content = pdf_extract.extract_pdf_text(page.pop('path'), delete_after=True)
+            else:
+                content = extract_pdf_content(page['body'])
             if content:
                 print(f"  ✅ PDF extracted: {len(content.split())} words")
                 return content
@@ -102,9 +350,9 @@ def fetch_page_content(url: str, timeout: int = 15) -> str:
                 print(f"  ❌ PDF extraction failed")
                 return ""
                 
-        elif 'html' in content_type:
+        elif kind == 'html':
             print(f"  🌐 Processing HTML content...")
-            content = process_html(response.content)
+            content = process_html(page['body'], content_type)
             if content:
                 print(f"  ✅ HTML processed: {len(content.split())} words")
                 return content
@@ -115,15 +363,16 @@ def fetch_page_content(url: str, timeout: int = 15) -> str:
             print(f"  ⚠️  Unsupported content type: {content_type}")
             return ""
             
-    except requests.exceptions.Timeout:
-        print(f"  ⏰ Timeout fetching {url}")
-        return ""
-    except requests.exceptions.RequestException as e:
-        print(f"  ❌ Request error for {url}: {e}")
-        return ""
     except Exception as e:
-        print(f"  ❌ Error fetching {url}: {e}")
+        print(f"  ❌ Error extracting {url}: {e}")
+        return ""
+
+def fetch_page_content(url: str, timeout: float = host_health.DEFAULT_TIMEOUT) -> str:
+    """Fetch and process content from URL (HTML or PDF)"""
+    page = download_page(url, timeout)
+    if not page:
         return ""
+    return extract_page_content(page)
 
 def fetch_multiple_contents_sequential(urls_with_titles: list, max_results: int = 5) -> list:
     """Sequential content fetching (alternative to parallel processing)"""
@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, ROOT)
+
+# The modules open their caches and library on import, so keep them out of the real cache directory
+os.environ['CACHE_DIR'] = tempfile.mkdtemp(prefix='test-cache-')
+# app builds its Groq client on import; nothing in the tests reaches the real API
+os.environ.setdefault('GROQ_API_KEY', 'test')
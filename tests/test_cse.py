@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+import pytest
+
+import cse
+
+@pytest.fixture
+def quota(monkeypatch, tmp_path):
+    manager = cse.QuotaManager(daily_limit=10, path=str(tmp_path / 'quota.sqlite3'))
+    monkeypatch.setattr(cse, 'quota_manager', manager)
+    return manager
+
+def test_non_json_page_fails_but_counts_against_quota(monkeypatch, quota):
+    def html_error_page(url, timeout):
+        def json():
+            raise ValueError("Expecting value: line 1 column 1 (char 0)")
+        return SimpleNamespace(status_code=200, headers={'Content-Type': 'text/html'},
+                               raise_for_status=lambda: None, json=json)
+    monkeypatch.setattr(cse.http_client, 'get', html_error_page)
+
+    stats = {}
+    assert cse.cse("non json page test", 1, 'key', 'cx', stats=stats) == {}
+    assert stats['cse_pages'][0]['error'] == 'invalid_json'
+    # Google answered, so the unit is spent; nothing stays reserved or cached
+    assert quota.get_status()['used_today'] == 1
+    assert quota.get_status()['reserved'] == 0
+    assert cse.page_cache.get(cse._page_cache_key("non json page test", 1, 'cx')) is None
+
+def test_reservations_are_shared_between_connections(tmp_path):
+    path = str(tmp_path / 'quota.sqlite3')
+    first = cse.QuotaManager(daily_limit=5, path=path)
+    second = cse.QuotaManager(daily_limit=5, path=path)
+
+    reservation = first.reserve(3)
+    assert reservation.granted == 3
+    # The other worker only sees what is left after the reservation
+    assert second.get_remaining() == 2
+    assert second.reserve(4).granted == 2
+    assert first.get_remaining() == 0
+
+    assert reservation.claim()
+    first.commit(reservation)
+    first.release(reservation)
+    status = second.get_status()
+    assert status['used_today'] == 1
+    assert status['reserved'] == 2
+    assert status['remaining'] == 2
+
+def test_daily_limit_and_rollover(monkeypatch, tmp_path):
+    today = {'day': '2026-10-16'}
+    monkeypatch.setattr(cse.QuotaManager, '_today', staticmethod(lambda: today['day']))
+    quota = cse.QuotaManager(daily_limit=2, path=str(tmp_path / 'quota.sqlite3'))
+
+    reservation = quota.reserve(5)
+    assert reservation.granted == 2
+    for _ in range(2):
+        assert reservation.claim()
+        quota.commit(reservation)
+    assert not reservation.claim()
+    quota.release(reservation)
+    assert quota.reserve(1).granted == 0
+    assert not quota.check_quota()
+
+    today['day'] = '2026-10-17'
+    assert quota.get_status() == {'remaining': 2, 'used_today': 0, 'reserved': 0,
+                                  'daily_limit': 2, 'reset_date': '2026-10-17'}
+    assert quota.reserve(1).granted == 1
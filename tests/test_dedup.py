@@ -0,0 +1,103 @@
+import os
+import random
+
+import pytest
+
+import dedup
+import pipeline
+import utils
+from benchmarks.fixtures import CORPUS_DIR, make_pdf
+
+def corpus_texts():
+    texts = []
+    for name in sorted(os.listdir(CORPUS_DIR)):
+        if name.endswith('.txt'):
+            with open(os.path.join(CORPUS_DIR, name), encoding='utf-8') as handle:
+                texts.append(' '.join(handle.read().split()))
+    return texts
+
+VOCABULARY = sorted({word.strip('.,;:()"\'').lower() for text in corpus_texts() for word in text.split()} - {''})
+
+def article(words: int, seed: int) -> list:
+    rng = random.Random(seed)
+    return [rng.choice(VOCABULARY) for _ in range(words)]
+
+NAVIGATION = ("Home News Science Technology Health Environment Opinion Subscribe Sign in Newsletter "
+              "Privacy policy Terms of use Contact us About Careers Advertise Accessibility Cookie settings "
+              "Follow us on Facebook Twitter Instagram LinkedIn YouTube Share this article Print Email "
+              "Related stories Most read Trending now More from this section Back to top").split()
+
+def fingerprint(words) -> frozenset:
+    return dedup.shingles(' '.join(words))
+
+def test_identical_text_is_duplicate():
+    words = article(800, seed=1)
+    assert dedup.near_duplicate(fingerprint(words), fingerprint(list(words)))
+
+def test_article_wrapped_in_navigation_is_duplicate():
+    words = article(800, seed=2)
+    wrapped = NAVIGATION[:30] + words + NAVIGATION[30:]
+    assert dedup.near_duplicate(fingerprint(words), fingerprint(wrapped))
+
+@pytest.mark.parametrize('seed', range(30))
+def test_scattered_edits_are_duplicates(seed):
+    words = article(1500, seed=100 + seed)
+    rng = random.Random(seed)
+    edited = list(words)
+    for position in rng.sample(range(len(edited)), 15):
+        edited[position] = rng.choice(VOCABULARY)
+    assert dedup.near_duplicate(fingerprint(words), fingerprint(edited))
+
+def test_pdf_and_its_landing_page_are_duplicates():
+    texts = corpus_texts()
+    abstract, body = texts[0], texts[1:]
+    landing_page = f"""<html><head><title>Oxygen in rivers</title></head><body>
+        <nav>{' '.join(f'<a href="/{word}">{word}</a>' for word in NAVIGATION)}</nav>
+        <main><article><h1>Oxygen in rivers</h1><p>{abstract}</p><p><a href="paper.pdf">Download PDF</a></p></article></main>
+        <footer>Copyright Example University. All rights reserved.</footer>
+    </body></html>"""
+    page_text = utils.process_html(landing_page.encode('utf-8'), 'text/html; charset=utf-8')
+    pdf_text = utils.extract_pdf_content(make_pdf([abstract] + body))
+    assert dedup.near_duplicate(dedup.shingles(page_text), dedup.shingles(pdf_text))
+
+def test_different_documents_are_not_duplicates():
+    texts = corpus_texts()
+    fingerprints = [dedup.shingles(text) for text in texts]
+    for i, left in enumerate(fingerprints):
+        for right in fingerprints[i + 1:]:
+            assert not dedup.near_duplicate(left, right)
+
+def test_same_topic_different_words_is_not_duplicate():
+    assert not dedup.near_duplicate(fingerprint(article(800, seed=3)), fingerprint(article(800, seed=4)))
+
+def conflicting(*groups):
+    return lambda rank, other: any(rank in group and other in group for group in groups)
+
+def test_gate_skips_worse_ranked_copy_without_taking_a_slot():
+    gate = pipeline.FirstNGate([1, 2, 3, 4], wanted=2, conflicts=conflicting({1, 2}))
+    assert gate.admit(1)
+    assert not gate.admit(2)
+    assert gate.duplicates == {2: 1}
+    assert gate.admit(3)
+    assert gate.admitted == {1, 3}
+    assert gate.done.is_set()
+
+def test_gate_keeps_better_ranked_copy_that_arrives_later():
+    gate = pipeline.FirstNGate([1, 2, 3], wanted=2, conflicts=conflicting({1, 2}))
+    # 2 cannot be pushed out of the top two, so it goes through before 1 arrives
+    assert gate.admit(2)
+    assert gate.admit(1)
+    assert gate.admitted == {1}
+    assert gate.duplicates == {2: 1}
+    assert not gate.commit(2)
+    assert gate.commit(1)
+    assert gate.admit(3)
+    assert gate.done.is_set()
+
+def test_gate_does_not_revoke_a_committed_copy():
+    gate = pipeline.FirstNGate([1, 2, 3], wanted=2, conflicts=conflicting({1, 2}))
+    assert gate.admit(2)
+    assert gate.commit(2)
+    assert not gate.admit(1)
+    assert gate.duplicates == {1: 2}
+    assert gate.admitted == {2}
@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+import groq_scheduler
+from groq_scheduler import _ModelBudget, _parse_duration
+
+@pytest.mark.parametrize('value, seconds', [
+    ('7.66s', 7.66),
+    ('2m59.56s', 179.56),
+    ('120ms', 0.12),
+    ('1h2m', 3720),
+    ('', None),
+    (None, None),
+    ('soon', None),
+])
+def test_parse_duration(value, seconds):
+    assert _parse_duration(value) == pytest.approx(seconds)
+
+def test_request_fits_an_empty_budget():
+    assert _ModelBudget(rpm=2, tpm=1000).wait_time(500, now=100.0) == 0
+
+def test_rpm_bound_waits_for_oldest_request_to_age_out():
+    budget = _ModelBudget(rpm=2, tpm=10 ** 6)
+    budget.window.extend([[100.0, 10], [110.0, 10]])
+    assert budget.wait_time(10, now=120.0) == pytest.approx(40)
+    # Once the first request is a minute old there is room again
+    assert budget.wait_time(10, now=160.0) == 0
+
+def test_tpm_waits_until_enough_tokens_age_out():
+    budget = _ModelBudget(rpm=100, tpm=1000)
+    budget.window.extend([[100.0, 400], [110.0, 400], [120.0, 100]])
+    # 900 used: 600 more fits only after the first two requests (800) leave the window
+    assert budget.wait_time(600, now=130.0) == pytest.approx(40)
+    assert budget.wait_time(100, now=130.0) == 0
+
+def test_oversized_request_waits_for_the_whole_window():
+    budget = _ModelBudget(rpm=100, tpm=1000)
+    budget.window.extend([[100.0, 100], [110.0, 100]])
+    assert budget.wait_time(5000, now=120.0) == pytest.approx(50)
+
+def test_blocked_until_holds_the_model():
+    budget = _ModelBudget(rpm=100, tpm=1000)
+    budget.blocked_until = 130.0
+    assert budget.wait_time(10, now=120.0) == pytest.approx(10)
+    assert budget.wait_time(10, now=131.0) == 0
+
+def test_background_share_leaves_headroom():
+    budget = _ModelBudget(rpm=10, tpm=1000)
+    budget.window.extend([[100.0, 300], [110.0, 300]])
+    share = 0.7
+    # 600 used: another 300 would take background calls past 700 but still fits the full budget
+    assert budget.wait_time(300, now=120.0, share=share) == pytest.approx(40)
+    assert budget.wait_time(300, now=120.0) == 0
+
+    budget = _ModelBudget(rpm=10, tpm=10 ** 6)
+    budget.window.extend([[100.0 + i, 1] for i in range(7)])
+    assert budget.wait_time(1, now=120.0, share=share) == pytest.approx(40)
+    assert budget.wait_time(1, now=120.0) == 0
+
+def test_background_calls_are_held_to_their_share(monkeypatch):
+    monkeypatch.setattr(groq_scheduler, 'BACKGROUND_SHARE', 0.5)
+    scheduler = groq_scheduler.GroqScheduler(limits={'m': (2, 10 ** 6)})
+    scheduler._acquire('m', 1, groq_scheduler.PRIORITY_BACKGROUND)
+    # The background call used the background half; an interactive call still gets through at once
+    scheduler._acquire('m', 1, groq_scheduler.PRIORITY_INTERACTIVE)
+    assert scheduler._budget('m').wait_time(1, time.monotonic(), 0.5) > 0
@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+import jobs
+
+def wait_for(manager, job_id, status, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = manager.get(job_id)
+        if job['status'] == status:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job never reached {status!r}: {manager.get(job_id)}")
+
+def test_job_runs_from_queued_to_completed():
+    started, release = threading.Event(), threading.Event()
+
+    def handler(query, on_event):
+        started.set()
+        on_event('query', {'optimized_query': query.upper()})
+        on_event('summary', {'index': 1, 'result': {'title': 'second'}})
+        on_event('summary', {'index': 0, 'result': {'title': 'first'}})
+        release.wait(5)
+        return {'status': 'completed', 'results': []}
+
+    manager = jobs.JobManager(handler, workers=1)
+    job = manager.submit("tides")
+    assert job['status'] == 'queued' and job['started_at'] is None
+
+    started.wait(5)
+    running = wait_for(manager, job['id'], 'running')
+    assert running['partial']['optimized_query'] == 'TIDES'
+    assert [r['title'] for r in running['partial']['results']] == ['first', 'second']
+
+    release.set()
+    done = wait_for(manager, job['id'], 'completed')
+    assert done['result'] == {'status': 'completed', 'results': []}
+    assert done['error'] is None and done['finished_at'] >= done['started_at']
+
+@pytest.mark.parametrize('result, error', [
+    ({'status': 'error', 'error': 'quota exceeded'}, 'quota exceeded'),
+    ({'status': 'processing'}, "Search ended with unexpected status 'processing'"),
+    ({'results': []}, "Search ended with unexpected status None"),
+    (None, "Search ended with unexpected status None"),
+])
+def test_failed_or_unfinished_result_is_an_error(result, error):
+    manager = jobs.JobManager(lambda query, on_event: result, workers=1)
+    job = wait_for(manager, manager.submit("tides")['id'], 'error')
+    assert job['error'] == error
+    assert manager.stats()['failed'] == 1
+
+def test_handler_exception_is_an_error():
+    def handler(query, on_event):
+        raise RuntimeError("search blew up")
+
+    manager = jobs.JobManager(handler, workers=1)
+    job = wait_for(manager, manager.submit("tides")['id'], 'error')
+    assert job['error'] == 'search blew up'
+
+def test_full_queue_pushes_back():
+    release = threading.Event()
+    manager = jobs.JobManager(lambda query, on_event: release.wait(5) and {'status': 'completed'},
+                              workers=1, max_queue=1)
+    running = manager.submit("first")
+    wait_for(manager, running['id'], 'running')
+    queued = manager.submit("second")
+    assert queued['queue_position'] == 1
+
+    with pytest.raises(jobs.JobQueueFull):
+        manager.submit("third")
+
+    release.set()
+    wait_for(manager, queued['id'], 'completed')
+    assert manager.submit("fourth")['status'] == 'queued'
+
+def test_jobs_endpoint_answers_429_when_full(monkeypatch):
+    import app
+
+    def full(query):
+        raise jobs.JobQueueFull("Job queue is full (1 pending jobs)")
+    monkeypatch.setattr(app.job_manager, 'submit', full)
+
+    response = app.app.test_client().post('/jobs', json={'query': 'tides'})
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '10'
+    assert 'full' in response.get_json()['error']
@@ -0,0 +1,78 @@
+import pytest
+
+from knowledge_store import KnowledgeStore
+
+QUERY = "how is dissolved oxygen measured in river water"
+BODY = ("Dissolved oxygen in river water is measured with the Winkler titration or an optical probe. "
+        "Readings depend on water temperature, so the temperature of the river is recorded with every sample. ") * 10
+SUMMARY = {'brief_description': 'Measuring dissolved oxygen in rivers', 'concise_summary': 'Winkler titration and probes.'}
+
+@pytest.fixture
+def store(tmp_path):
+    store = KnowledgeStore(path=str(tmp_path / 'library.sqlite3'))
+    for number in range(3):
+        url = f"https://example.org/oxygen-{number}"
+        store.save(url, f"Dissolved oxygen in rivers, part {number}", BODY, QUERY, 'dissolved oxygen river', SUMMARY)
+    return store
+
+def test_same_question_matches(store):
+    assert len(store.strong_matches(QUERY, 3)) == 3
+    assert len(store.strong_matches("How is dissolved oxygen measured in river water?", 3)) == 3
+
+@pytest.mark.parametrize('query', [
+    "water temperature",
+    "river temperature",
+    "oxygen titration",
+    "measure temperature of water",
+    "dissolved oxygen",
+])
+def test_query_sharing_words_does_not_match(store, query):
+    assert store.strong_matches(query, 3) == []
+
+def test_body_only_words_do_not_match(store):
+    # Every word is in the stored body, and the stored query is about something else
+    store.save("https://example.org/probe", "Optical probes", BODY, "optical probe temperature readings", '', SUMMARY)
+    assert store.strong_matches("winkler titration sample readings", 3) == []
+
+def test_off_topic_query_goes_to_google(monkeypatch, store):
+    import app
+
+    searched = []
+    def optimize(query, client):
+        searched.append(query)
+        raise RuntimeError("went to Google")
+
+    monkeypatch.setattr(app.knowledge_store, 'library', store)
+    monkeypatch.setitem(app.CONFIG, 'library_answers', True)
+    monkeypatch.setattr(app.search_query, 'cached_build_search_query', optimize)
+
+    result = app.process_query("water temperature of the river")
+    assert searched == ["water temperature of the river"]
+    assert result.get('source') != 'library'
+
+    result = app.process_query(QUERY)
+    assert result['source'] == 'library'
+    assert len(result['results']) == 3
+    assert searched == ["water temperature of the river"]
+
+def test_refetch_for_another_query_does_not_reassign_the_summary(store):
+    # The oxygen pages are fetched again for a new search but not summarized for it
+    other = "river water temperature readings"
+    for number in range(3):
+        store.save(f"https://example.org/oxygen-{number}", f"Dissolved oxygen in rivers, part {number}", BODY, other,
+                   'river temperature', None)
+    assert store.strong_matches(other, 3) == []
+    # The summaries still belong to the question they were written for
+    assert len(store.strong_matches(QUERY, 3)) == 3
+
+def test_refetch_does_not_refresh_summary_age(store):
+    store.save("https://example.org/oxygen-0", "Dissolved oxygen in rivers, part 0", BODY, QUERY, '', None)
+    assert store.strong_matches(QUERY, 3, max_age_days=0) == []
+
+def test_save_summary_records_its_query(store):
+    url = "https://example.org/temperature"
+    store.save(url, "River temperature", BODY, "how warm is river water in summer", '', None)
+    store.save_summary(url, SUMMARY, "how warm is river water in summer", 'river water summer temperature')
+    matches = store.strong_matches("how warm is river water in summer", 3)
+    assert [match['url'] for match in matches] == [url]
+    assert matches[0]['summary_optimized_query'] == 'river water summer temperature'
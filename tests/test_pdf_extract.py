@@ -0,0 +1,67 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import pdf_extract
+from benchmarks.fixtures import make_pdf
+
+PAGE = ' '.join(f"oxygen{i} river water sample" for i in range(60))
+
+@pytest.fixture
+def pdf():
+    return make_pdf([f"page {number} {PAGE}" for number in range(10)])
+
+def test_broken_pool_is_replaced(monkeypatch, pdf):
+    broken = ProcessPoolExecutor(max_workers=1)
+    with pytest.raises(BrokenProcessPool):
+        # A worker dying mid-task breaks the pool, as an OOM kill would
+        broken.submit(os._exit, 1).result()
+    monkeypatch.setattr(pdf_extract, '_pool', broken)
+
+    assert 'page 9' in pdf_extract.extract_pdf_text(pdf)
+    assert pdf_extract._pool is not None and pdf_extract._pool is not broken
+
+def test_in_process_fallback_honours_word_target(monkeypatch, pdf):
+    def always_broken(pool, path, batches):
+        raise BrokenProcessPool("worker died")
+    monkeypatch.setattr(pdf_extract, '_extract_in_pool', always_broken)
+    monkeypatch.setattr(pdf_extract, 'PDF_TARGET_WORDS', 100)
+
+    text = pdf_extract.extract_pdf_text(pdf)
+    assert 'page 0' in text
+    assert 'page 9' not in text
+
+def test_in_process_fallback_honours_time_budget(monkeypatch, pdf):
+    def always_broken(pool, path, batches):
+        raise BrokenProcessPool("worker died")
+    monkeypatch.setattr(pdf_extract, '_extract_in_pool', always_broken)
+    monkeypatch.setattr(pdf_extract, 'PDF_TIME_BUDGET', 0)
+
+    assert pdf_extract.extract_pdf_text(pdf) == ''
+
+def test_pool_workers_are_not_forked():
+    assert pdf_extract._get_pool()._mp_context.get_start_method() in ('forkserver', 'spawn')
+
+def test_only_leading_pages_are_joined(monkeypatch, pdf):
+    # An early stop can leave page 2 unfinished while page 3 is done
+    def gap(pool, path, batches):
+        return {0: 'first', 1: 'second', 3: 'fourth'}, []
+    monkeypatch.setattr(pdf_extract, '_extract_in_pool', gap)
+
+    assert pdf_extract.extract_pdf_text(pdf) == 'first second'
+
+def test_workers_past_time_budget_are_stopped(monkeypatch, pdf):
+    pool = pdf_extract._get_pool()
+    # Starting the workers alone takes longer than this
+    monkeypatch.setattr(pdf_extract, 'PDF_TIME_BUDGET', 0.01)
+
+    pdf_extract.extract_pdf_text(pdf)
+    assert pdf_extract._pool is not pool
+    for process in list((pool._processes or {}).values()):
+        process.join(5)
+        assert not process.is_alive()
+
+    monkeypatch.setattr(pdf_extract, 'PDF_TIME_BUDGET', 20)
+    assert 'page 9' in pdf_extract.extract_pdf_text(pdf)
@@ -0,0 +1,168 @@
+import threading
+import time
+
+import pytest
+
+import pipeline
+
+def admit_in_background(gate, rank):
+    outcome = {}
+    thread = threading.Thread(target=lambda: outcome.setdefault(rank, gate.admit(rank)))
+    thread.start()
+    return thread, outcome
+
+def test_gate_waits_for_better_ranks_before_admitting():
+    gate = pipeline.FirstNGate([1, 2, 3, 4], 2)
+    thread, outcome = admit_in_background(gate, 3)
+    # Ranks 1 and 2 could still take both slots
+    thread.join(0.1)
+    assert thread.is_alive()
+
+    assert gate.admit(1)
+    gate.reject(2)
+    thread.join(1)
+    assert outcome == {3: True}
+    assert gate.done.is_set()
+    assert not gate.admit(4)
+
+def test_shortfall_asks_for_a_backfill():
+    gate = pipeline.FirstNGate([1, 2], 2)
+    shortfall = {}
+    waiter = threading.Thread(target=lambda: shortfall.setdefault('first', gate.wait_for_shortfall()))
+    waiter.start()
+    waiter.join(0.1)
+    assert waiter.is_alive()
+
+    gate.reject(1)
+    waiter.join(1)
+    assert shortfall == {'first': True}
+
+    gate.add(3)
+    assert gate.admit(2) and gate.admit(3)
+    assert gate.done.is_set()
+    assert not gate.wait_for_shortfall()
+
+def test_better_ranked_duplicate_replaces_uncommitted_one():
+    gate = pipeline.FirstNGate([1, 2, 3], 2, conflicts=lambda rank, other: {rank, other} == {1, 2})
+    assert gate.admit(2)
+    assert gate.admit(1)
+    assert gate.duplicates == {2: 1}
+    assert not gate.commit(2)
+    assert gate.commit(1)
+    # The replaced copy freed no slot: rank 3 still gets in
+    assert gate.admit(3)
+
+def test_committed_copy_keeps_its_slot():
+    gate = pipeline.FirstNGate([1, 2, 3], 2, conflicts=lambda rank, other: {rank, other} == {1, 2})
+    assert gate.admit(2) and gate.commit(2)
+    assert not gate.admit(1)
+    assert gate.duplicates == {1: 2}
+    assert not gate.done.is_set()
+
+def test_stages_run_in_order_and_results_keep_input_order():
+    seen = []
+    lock = threading.Lock()
+
+    def record(stage):
+        def run(item):
+            with lock:
+                seen.append((stage, item))
+            if stage == 'first':
+                # Later items finish first, so output order must come from the input index
+                time.sleep(0.01 * (5 - item))
+            return item
+        return run
+
+    stages = [
+        pipeline.Stage('first', record('first'), workers=5),
+        pipeline.Stage('second', lambda item: item * 10, workers=2),
+        pipeline.Stage('third', record('third'), workers=3),
+    ]
+    results = pipeline.StagedPipeline(stages).run(range(5))
+    assert results == [0, 10, 20, 30, 40]
+    for item in range(5):
+        assert seen.index(('first', item)) < seen.index(('third', item * 10))
+
+def test_dropped_and_failed_items_come_back_as_none():
+    def check(item):
+        if item == 2:
+            raise ValueError("bad item")
+        return None if item == 1 else item
+
+    results = pipeline.StagedPipeline([pipeline.Stage('check', check, workers=2),
+                                       pipeline.Stage('keep', lambda item: item)]).run(range(4))
+    assert results == [0, None, None, 3]
+
+def test_later_stages_start_before_the_first_finishes():
+    second_started = threading.Event()
+
+    def first(item):
+        if item == 1:
+            # Item 1 waits in stage one until item 0 has reached stage two
+            assert second_started.wait(1)
+        return item
+
+    def second(item):
+        second_started.set()
+        return item
+
+    results = pipeline.StagedPipeline([pipeline.Stage('first', first, workers=2),
+                                       pipeline.Stage('second', second)]).run([0, 1])
+    assert results == [0, 1]
+
+def test_feed_is_consumed_lazily():
+    produced = []
+    finished = threading.Event()
+
+    def feed():
+        for item in range(3):
+            produced.append(item)
+            yield item
+        # More input can depend on what earlier items did
+        assert finished.wait(1)
+        produced.append(3)
+        yield 3
+
+    def stage(item):
+        if item == 2:
+            finished.set()
+        return item
+
+    results = pipeline.StagedPipeline([pipeline.Stage('only', stage)]).run(feed())
+    assert results == [0, 1, 2, 3]
+    assert produced == [0, 1, 2, 3]
+
+def test_cancel_stops_feeding_and_drops_queued_items():
+    cancel = threading.Event()
+    dropped = []
+    summarized = []
+
+    def fetch(item):
+        if item == 0:
+            cancel.set()
+        return item
+
+    def summarize(item):
+        summarized.append(item)
+        return item
+
+    def feed():
+        for item in range(100):
+            yield item
+            if cancel.is_set():
+                time.sleep(0.01)
+
+    stages = [
+        pipeline.Stage('fetch', fetch),
+        pipeline.Stage('summarize', summarize, cancellable=False),
+    ]
+    results = pipeline.StagedPipeline(stages, queue_size=2).run(feed(), cancel=cancel, on_drop=dropped.append)
+    # Item 0 was accepted before the cancel, so the non-cancellable stage still finishes it
+    assert summarized == [0]
+    assert results[0] == 0 and all(result is None for result in results[1:])
+    assert len(results) < 100
+    assert dropped == list(range(1, len(results)))
+
+def test_pipeline_needs_a_stage():
+    with pytest.raises(ValueError):
+        pipeline.StagedPipeline([])
@@ -0,0 +1,83 @@
+import threading
+import time
+
+import app
+
+TEXT = {
+    'same': ' '.join(f"tidal range {i} depends on the moon and the sun" for i in range(20)),
+    'other': ' '.join(f"river delta {i} forms where sediment settles out" for i in range(20)),
+    'third': ' '.join(f"glacier {i} retreat is measured from satellite images" for i in range(20)),
+    'fourth': ' '.join(f"coral reef {i} bleaching follows warm water events" for i in range(20)),
+}
+
+class Web:
+    """Stub downloads: each link names its text and how long the fetch takes"""
+    def __init__(self, monkeypatch, summary_time=0.0):
+        self.summarized = []
+        self.discarded = []
+        self.summary_time = summary_time
+        self._lock = threading.Lock()
+        monkeypatch.setitem(app.CONFIG, 'fetch_mode', 'threads')
+        monkeypatch.setattr(app.utils, 'download_page', self.download)
+        monkeypatch.setattr(app.utils, 'extract_page_content', lambda page: page['text'])
+        monkeypatch.setattr(app.utils, 'discard_page', self.discard)
+        monkeypatch.setattr(app, 'summarize_document', self.summarize)
+        monkeypatch.setattr(app, 'remember_document', lambda *args, **kwargs: None)
+
+    def download(self, link):
+        name, delay = link.split('/')[-2:]
+        time.sleep(float(delay))
+        return None if name == 'broken' else {'url': link, 'text': TEXT[name]}
+
+    def discard(self, page):
+        with self._lock:
+            self.discarded.append(page['url'])
+
+    def summarize(self, content, word_count, queries):
+        with self._lock:
+            self.summarized.append(content)
+        time.sleep(self.summary_time)
+        return {'concise_summary': content[:20]}
+
+def candidate(name, delay=0.0):
+    return (name, f"https://example.org/{name}/{delay}")
+
+def test_failed_candidate_is_backfilled_from_reserve(monkeypatch):
+    Web(monkeypatch)
+    stats = {}
+    results = app.process_results([candidate('same'), candidate('broken'), candidate('other')], wanted=3,
+                                  reserve=[candidate('third'), candidate('fourth')], stats=stats)
+    assert [result['title'] for result in results] == ['same', 'other', 'third']
+    assert stats['candidates_fetched'] == 4
+
+def test_near_duplicate_is_summarized_once(monkeypatch):
+    web = Web(monkeypatch)
+    stats = {}
+    results = app.process_results([candidate('same'), candidate('same', 0.05), candidate('other', 0.1)],
+                                  wanted=3, reserve=[candidate('third')], stats=stats)
+    # The copy takes no slot, so the reserve hit fills the third one
+    assert [result['title'] for result in results] == ['same', 'other', 'third']
+    assert stats['duplicates_skipped'] == 1
+    assert len(web.summarized) == 3
+
+def test_copy_being_summarized_is_not_replaced(monkeypatch):
+    # The worse-ranked copy is already in its Groq call when the better one qualifies
+    web = Web(monkeypatch, summary_time=0.3)
+    results = app.process_results([candidate('same', 0.1), candidate('same'), candidate('other', 0.15)],
+                                  wanted=2)
+    assert [result['url'] for result in results] == [candidate('same')[1], candidate('other', 0.15)[1]]
+    assert len(web.summarized) == len(results)
+
+def test_filled_quota_cancels_and_cleans_up_the_rest(monkeypatch):
+    web = Web(monkeypatch)
+    slow = [candidate(name, 0.5) for name in ('other', 'third', 'fourth')]
+    started = time.monotonic()
+    results = app.process_results([candidate('same')] + slow, wanted=1)
+    assert [result['title'] for result in results] == ['same']
+    assert time.monotonic() - started < 0.45
+
+    # Downloads that lose the race release their pages when they finish
+    deadline = time.monotonic() + 2
+    while len(web.discarded) < len(slow) and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert sorted(web.discarded) == sorted(link for _, link in slow)
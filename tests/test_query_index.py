@@ -0,0 +1,117 @@
+import json
+import sqlite3
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import search_query
+from query_index import QueryIndex
+
+# Earlier searches, so term weights look like a live index's: 'high' and 'water' are common, topic words are not
+BACKGROUND = [
+    "high blood pressure causes", "high tide times today", "high protein foods list",
+    "high school chemistry experiments", "water cycle for kids", "drinking water treatment steps",
+    "effects of exercise on the heart", "how to grow tomatoes", "speed of sound in air",
+]
+
+@pytest.fixture
+def index(tmp_path):
+    index = QueryIndex('test_queries', tokenize=search_query.similarity_terms,
+                       directions=search_query.direction_pairs, threshold=search_query.similar_queries.threshold,
+                       path=str(tmp_path / 'queries.sqlite3'))
+    for number, query in enumerate(BACKGROUND):
+        index.add(query, [f"background {number}", '', 'research'])
+    return index
+
+@pytest.mark.parametrize('stored, asked', [
+    ("dissolved oxygen in water", "determine soluble oxygen in water"),
+    ("effects of caffeine on sleep", "how does caffeine affect sleep"),
+    ("methods for measuring ph of soil", "soil ph measurement techniques"),
+    ("celsius to fahrenheit conversion", "how to convert celsius into fahrenheit"),
+    ("boiling point of water at high altitude", "water boiling point at altitude"),
+    ("What causes the seasons on Earth?", "what causes the seasons on earth"),
+])
+def test_paraphrase_reuses_stored_query(index, stored, asked):
+    index.add(stored, ['stored', '', 'research'])
+    match = index.find(asked)
+    assert match is not None and match['value'] == ['stored', '', 'research']
+
+@pytest.mark.parametrize('stored, asked', [
+    ("symptoms of lung cancer", "symptoms of cancer"),
+    ("symptoms of cancer", "symptoms of lung cancer"),
+    ("what causes the seasons on earth", "causes of seasons"),
+    ("causes of seasons", "what causes the seasons on earth"),
+    ("history of the printing press in europe", "printing press history"),
+    ("printing press history", "history of the printing press in europe"),
+    ("dissolved oxygen in water", "dissolved oxygen in blood"),
+])
+def test_broader_narrower_or_different_query_does_not_reuse(index, stored, asked):
+    index.add(stored, ['stored', '', 'research'])
+    assert index.find(asked) is None
+
+@pytest.mark.parametrize('stored, asked', [
+    ("celsius to fahrenheit", "fahrenheit to celsius"),
+    ("convert celsius to fahrenheit", "convert from fahrenheit to celsius"),
+    ("translate english to spanish", "translate spanish into english"),
+])
+def test_reversed_direction_does_not_reuse(index, stored, asked):
+    index.add(stored, ['stored', '', 'research'])
+    assert index.find(asked) is None
+
+def test_expired_entries_are_pruned_on_read(tmp_path):
+    index = QueryIndex('expiring', tokenize=search_query.similarity_terms, ttl=0.05,
+                       path=str(tmp_path / 'queries.sqlite3'))
+    index.add("dissolved oxygen in water", ['stored', '', 'research'])
+    assert index.find("dissolved oxygen in water") is not None
+    time.sleep(0.1)
+    assert index.find("dissolved oxygen in water") is None
+    assert index.stats()['entries'] == 0
+    with sqlite3.connect(index.path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM queries").fetchone()[0] == 0
+
+def test_rows_evicted_by_another_worker_are_dropped(tmp_path):
+    path = str(tmp_path / 'queries.sqlite3')
+    first = QueryIndex('shared', tokenize=search_query.similarity_terms, max_entries=2, path=path)
+    second = QueryIndex('shared', tokenize=search_query.similarity_terms, max_entries=2, path=path)
+    first.add("dissolved oxygen in water", ['oxygen', '', 'research'])
+    assert second.find("dissolved oxygen in water") is not None
+
+    # The other worker fills its index past max_entries, evicting the oldest row
+    first.add("speed of sound in air", ['sound', '', 'research'])
+    first.add("boiling point of water", ['boiling', '', 'research'])
+    assert second.find("dissolved oxygen in water") is None
+    assert second.stats()['entries'] == 2
+
+    first.clear()
+    assert second.find("speed of sound in air") is None
+    assert second.stats()['entries'] == 0
+
+class FakeClient:
+    """Answers query optimization prompts with the query's own words"""
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, messages, **_):
+        self.calls += 1
+        user = next(m['content'] for m in messages if m['role'] == 'user')
+        content = json.dumps({'optimized_query': user.upper(), 'explanation': 'test', 'search_intent': 'research'})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+                               usage=SimpleNamespace(total_tokens=10))
+
+def test_similarity_hit_is_not_cached_under_new_query(monkeypatch, index):
+    monkeypatch.setattr(search_query, 'similar_queries', index)
+    search_query.query_cache.clear()
+    client = FakeClient()
+
+    search_query.cached_build_search_query("how do plants make food", client)
+    reused = search_query.cached_build_search_query("how does a plant make foods", client)
+    assert client.calls == 1
+    assert reused[0] == "HOW DO PLANTS MAKE FOOD"
+    assert search_query.query_cache.get(search_query._query_cache_key("how does a plant make foods")) is None
+
+    # Once the stored query is gone, the reworded one goes to the model
+    index.clear()
+    search_query.cached_build_search_query("how does a plant make foods", client)
+    assert client.calls == 2
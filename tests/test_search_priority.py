@@ -0,0 +1,102 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import groq_scheduler
+import singleflight
+
+class RecordingClient:
+    def __init__(self):
+        self.order = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, messages, **_):
+        self.order.append(messages[0]['content'])
+        return SimpleNamespace(choices=[], usage=SimpleNamespace(total_tokens=1))
+
+def queue_calls(scheduler, client, calls):
+    """Hold the model, queue (name, priority) calls in order, and return their threads"""
+    scheduler._budget('m').blocked_until = time.monotonic() + 0.3
+    threads = []
+    for name, priority in calls:
+        thread = threading.Thread(target=scheduler.create, args=(client,),
+                                  kwargs={'priority': priority, 'model': 'm',
+                                          'messages': [{'role': 'user', 'content': name}]})
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.02)
+    return threads
+
+def test_background_call_waits_behind_interactive():
+    scheduler = groq_scheduler.GroqScheduler(limits={'m': (1000, 10 ** 9)})
+    client = RecordingClient()
+    threads = queue_calls(scheduler, client, [
+        ('background', groq_scheduler.Priority(groq_scheduler.PRIORITY_BACKGROUND)),
+        ('interactive', groq_scheduler.PRIORITY_INTERACTIVE),
+    ])
+    for thread in threads:
+        thread.join()
+    assert client.order == ['interactive', 'background']
+
+def test_raised_priority_moves_queued_call_ahead():
+    scheduler = groq_scheduler.GroqScheduler(limits={'m': (1000, 10 ** 9)})
+    client = RecordingClient()
+    flight = groq_scheduler.Priority(groq_scheduler.PRIORITY_BACKGROUND)
+    threads = queue_calls(scheduler, client, [
+        ('joined background', flight),
+        ('other interactive', groq_scheduler.PRIORITY_INTERACTIVE),
+    ])
+    scheduler.raise_priority(flight, groq_scheduler.PRIORITY_INTERACTIVE)
+    for thread in threads:
+        thread.join()
+    # Same level now, so the call that queued first goes first
+    assert client.order == ['joined background', 'other interactive']
+
+def test_joining_caller_sees_the_leaders_state():
+    flights = singleflight.SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    joined = []
+
+    def lead(emit):
+        started.set()
+        release.wait()
+        return 'result'
+
+    leader = threading.Thread(target=flights.do, args=('q', lead), kwargs={'state': 'leader state'})
+    leader.start()
+    started.wait()
+    joiner = threading.Thread(target=flights.do, args=('q', lead), kwargs={'state': 'own state', 'on_join': joined.append})
+    joiner.start()
+    time.sleep(0.05)
+    release.set()
+    leader.join()
+    joiner.join()
+    assert joined == ['leader state']
+
+def test_interactive_search_raises_background_flight(monkeypatch):
+    import app
+
+    started, release = threading.Event(), threading.Event()
+    seen = {}
+
+    def fake_process_query(user_query, on_event=None):
+        seen['priority'] = groq_scheduler._priority.get()
+        started.set()
+        release.wait()
+        return {'status': 'completed'}
+
+    monkeypatch.setattr(app, 'process_query', fake_process_query)
+    background = threading.Thread(target=app.run_background_search, args=("tides and the moon",))
+    background.start()
+    started.wait()
+    assert seen['priority'].value == groq_scheduler.PRIORITY_BACKGROUND
+
+    interactive = threading.Thread(target=app.run_search, args=("Tides and the Moon",))
+    interactive.start()
+    deadline = time.monotonic() + 2
+    while seen['priority'].value != groq_scheduler.PRIORITY_INTERACTIVE and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    background.join()
+    interactive.join()
+    assert seen['priority'].value == groq_scheduler.PRIORITY_INTERACTIVE
@@ -0,0 +1,69 @@
+import pytest
+
+import groq_scheduler
+import summarize_page_content
+from benchmarks.fake_groq import FakeGroq
+
+def sentences(topic, count):
+    return ' '.join(f"The {topic} sample number {i} was measured at noon." for i in range(count))
+
+@pytest.fixture
+def client(monkeypatch):
+    # Unthrottled scheduler and an empty cache, so every compression reaches the fake
+    monkeypatch.setattr(groq_scheduler, 'scheduler',
+                        groq_scheduler.GroqScheduler(limits={summarize_page_content.SUMMARY_MODEL: (10 ** 6, 10 ** 9)}))
+    summarize_page_content.summary_cache.clear()
+    return FakeGroq(latency=0)
+
+def test_chunks_fit_the_budget():
+    text = sentences('river', 40)
+    chunks = summarize_page_content.split_into_chunks(text, 200)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    assert ' '.join(chunks) == text
+
+def test_map_compresses_each_chunk(client):
+    text = sentences('river', 40)
+    chunks = summarize_page_content.split_into_chunks(text, 200)
+
+    summaries = summarize_page_content.summary(text, None, client, chunk_tokens=50)
+    assert len(summaries) == len(chunks)
+    assert client.calls == len(chunks)
+
+def test_num_chunks_is_a_minimum(client):
+    text = sentences('lake', 20)
+    assert len(summarize_page_content.summary(text, None, client)) == 1
+    assert len(summarize_page_content.summary(text, 2, client)) >= 2
+
+def test_reduce_compresses_until_it_fits(client):
+    summaries = [sentences(f"soil{i}", 2) for i in range(6)]
+    combined = ' '.join(summaries)
+    # Groups of two fit a 60-token chunk, so one reduce level makes three calls
+    reduced = summarize_page_content.reduce_summaries(summaries, client, max_chars=len(combined) // 2,
+                                                      chunk_tokens=60)
+    assert client.calls == 3
+    assert len(reduced) <= len(combined) // 2
+
+def test_reduce_skips_failed_chunks_and_short_input(client):
+    summaries = ['short one.', '[Error in chunk 2 - skipped]', 'short two.']
+    assert summarize_page_content.reduce_summaries(summaries, client) == 'short one. short two.'
+    assert client.calls == 0
+
+def test_short_document_is_summarized_in_one_call(client):
+    text = sentences('glacier', 5)
+    assert len(text) <= summarize_page_content.FINAL_INPUT_CHARS
+
+    result = summarize_page_content.map_reduce_summarize(text, client)
+    assert client.calls == 1
+    assert 'glacier' in result['brief_description']
+
+def test_long_document_maps_then_summarizes(client):
+    text = sentences('ocean', 300)
+    chunks = summarize_page_content.split_into_chunks(
+        text, summarize_page_content.CHUNK_TOKENS * summarize_page_content.CHARS_PER_TOKEN)
+    assert len(chunks) > 1
+
+    result = summarize_page_content.map_reduce_summarize(text, client)
+    assert 'brief_description' in result
+    # One call per chunk, at least one reduce call, and the final JSON summary
+    assert client.calls >= len(chunks) + 2